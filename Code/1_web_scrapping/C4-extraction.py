@@ -9,11 +9,9 @@ This version:   September 30th, 2023
 """
 
 import pandas as pd
-import requests
 import time
-from datetime import datetime
 import os
-import re
+import sys
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.support import expected_conditions as EC
@@ -21,21 +19,50 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 
+# Making the shared speechdb modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from speechdb import canal4, dedup, discovery, metrics
+from speechdb.htmlstore import HtmlStore
+from speechdb.manifest import CrawlManifest
+
+# Timings, counts, bytes fetched and HTTP statuses of every stage (JSON lines) and a Prometheus
+# snapshot, in Data/metrics/
+metrics.configure(os.getcwd() + "\\..\\..\\Data\\metrics\\c4_extraction.jsonl")
+
 ##============================##
 ## EXTRACTING SPEECHES URLs   ##
 ##============================##
 
+# Discovery backend: "http" enumerates the links over plain HTTP (WordPress REST API,
+# sitemaps or listing pages, see speechdb.discovery) and stops at the links we already
+# have. "selenium" drives Chrome through the pagination widget, it is also used as a
+# fallback when every HTTP backend fails.
+DISCOVERY = "http"
+
 # Local path to chromium binary
 bin_path = "C:/Users/ctoruno/Documents/Chromium/chrome.exe"
 
-# Opening website from webdriver  
-driver   = webdriver.Chrome()
+# The webdriver is only opened if we fall back to Selenium
+driver = None
+action = None
+wait   = None
+
+def start_driver():
+
+    """
+    Opens the Chrome webdriver used by url_extract.
+    """
+
+    global driver, action, wait
 
-# Create action chain object
-action = ActionChains(driver)
+    # Opening website from webdriver  
+    driver = webdriver.Chrome()
 
-# Defining a waiting period for elements to be clickable
-wait = WebDriverWait(driver, 10)
+    # Create action chain object
+    action = ActionChains(driver)
+
+    # Defining a waiting period for elements to be clickable
+    wait = WebDriverWait(driver, 10)
 
 # Defining a function to extract URLs from a dynamic page
 def url_extract(base_url, npages, target):
@@ -96,95 +123,92 @@ def url_extract(base_url, npages, target):
 
     return links
 
-# Extacting speeches given by Rosario Murillo
-romu_url = "https://www.canal4.com.ni/rosario-murillo/"
-driver.get(romu_url)
-romu_links = url_extract(base_url = romu_url, npages = 150, target = "romu")
+# Links we already have
+path2links  = os.getcwd() + "\\..\\..\\Data\\"
+known_links = discovery.load_known_links(path2links)
+
+romu_links = None
+rmdo_links = None
+if DISCOVERY == "http":
+    romu_links = discovery.discover_links("romu", known = known_links)
+    rmdo_links = discovery.discover_links("rmdo", known = known_links | set(romu_links or []))
+
+if romu_links is None or rmdo_links is None:
+    start_driver()
+
+if romu_links is None:
+    # Extacting speeches given by Rosario Murillo
+    romu_url = "https://www.canal4.com.ni/rosario-murillo/"
+    driver.get(romu_url)
+    romu_links = url_extract(base_url = romu_url, npages = 150, target = "romu")
 
-# Extacting speeches given by Rosario Murillo & Daniel Ortega
-rmdo_url = "https://www.canal4.com.ni/discurso-daniel-y-rosario/"
-driver.get(rmdo_url)
-rmdo_links = url_extract(base_url = rmdo_url, npages = 28, target = "rmdo")
+if rmdo_links is None:
+    # Extacting speeches given by Rosario Murillo & Daniel Ortega
+    rmdo_url = "https://www.canal4.com.ni/discurso-daniel-y-rosario/"
+    driver.get(rmdo_url)
+    rmdo_links = url_extract(base_url = rmdo_url, npages = 28, target = "rmdo")
 
-# Saving links as a CSV file
-all_links = romu_links + rmdo_links
+if driver is not None:
+    driver.quit()
+
+# Saving links as a CSV file, links found in previous runs are kept
+all_links = list(dict.fromkeys(romu_links + rmdo_links))
 path2data = os.getcwd() + "\\..\\..\\Data\\rmdo_links.csv"
+if os.path.exists(path2data):
+    all_links = list(dict.fromkeys(all_links + pd.read_csv(path2data).iloc[:, 0].tolist()))
 df = pd.DataFrame(all_links)
 df.to_csv(path2data, index = False, encoding = "utf-8")
 
+# Speeches to extract: new links plus every link we already had (the crawl
+# manifest skips the ones that were already fetched)
+all_links = list(dict.fromkeys(all_links + sorted(known_links)))
+
 
 ##============================##
 ## EXTRACTING SPEECH CONTENT  ##
 ##============================##
 
-# Defining headers
-agent   = ["Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) ",
-           "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/",
-           "96.0.4664.110 Safari/537.36"]
-headers = {
-    "User-Agent": "".join(agent)
+# Fetching settings: number of threads, maximum requests in flight against
+# canal4.com.ni and requests-per-second budget. Set FETCH_MODE to "sequential"
+# to go back to one request every two seconds.
+FETCH_MODE     = "concurrent"
+FETCH_SETTINGS = {
+    "max_workers" : 16,
+    "per_host"    : 8,
+    "rate"        : 8.0
 }
 
-def extract_content(url_list):
-    """
-    Takes a list of URLs and returns a dataframe with the content extracted
-    from the URL.
-
-    Title, date, content and URL.
-    """
-
-    results = []
-
-    for url_link in url_list:
-        
-        time.sleep(2)
-
-        # Fetching source code
-        response = requests.get(url_link, headers = headers)
-
-        # Parsening code
-        soup = BeautifulSoup(response.text, "lxml")
-
-        # Retrieving information
-        headline = soup.find("h1").text
-        headline = re.sub("\n", "", headline)
-
-        date = (soup
-                .find("span", class_ = "posted-on")
-                .find("time")
-                .get("datetime"))
-        date = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S%z").date()
-
-        body = (soup
-                .find("div", class_ = "entry-content clearfix")
-                .find_all("p"))
-        
-        content = [p.text for p in body]
-        content = " ".join(content)
-
-        # Defining dictionary entry
-        speech = {
-            "headline" : headline,
-            "date"     : date,
-            "content"  : content,
-            "url"      : url_link
-        } 
-        
-        # Appending to main list
-        results.append(speech)
-
-    # Converting to Data Frame
-    data = pd.DataFrame(results)
+# Crawl manifest: every page is recorded as soon as it is fetched, so an interrupted
+# run resumes where it stopped and a refresh only fetches new speeches. Set
+# REVALIDATE to True to re-check known pages with conditional GETs (304 if unchanged).
+path2manifest = os.getcwd() + "\\..\\..\\Data\\c4_manifest.sqlite"
+REVALIDATE    = False
 
-    return data
+# Raw HTML store: every fetched page is saved before parsing so the data can be
+# rebuilt offline after a parser change with Code/1_web_scrapping/replay.py
+path2store = os.getcwd() + "\\..\\..\\Data\\html_store"
 
 # Applying function to extract data
-data = extract_content(all_links)
+with CrawlManifest(path2manifest) as manifest, HtmlStore(path2store) as store:
+    data = canal4.extract_content(all_links, 
+                                  mode       = FETCH_MODE, 
+                                  manifest   = manifest, 
+                                  revalidate = REVALIDATE, 
+                                  store      = store,
+                                  **FETCH_SETTINGS)
+    print(manifest.summary())
+
+# Dropping near-duplicate speeches (e.g. joint speeches listed in both feeds under different
+# URLs): one canonical record is kept per transcript. Canal 4 has its own MinHash index
+# (Data/dedup/canal4) and only new speeches are hashed; speeches also published by Radio
+# Nicaragua are kept and reported in Data/dedup/canal4/matches.csv
+data = dedup.deduplicate(data, os.getcwd() + "\\..\\..\\Data\\dedup", "canal4", key = "url", text = "content")
 
 # Saving data
 path2data = os.getcwd() + "\\..\\..\\Data\\master_data.csv"
 data.to_csv(path2data, 
             index    = False, 
             encoding = "utf-8")
+metrics.save()
 # path2data = os.getcwd() + "\\..\\..\\Data\\master_data.xlsx"
 # data.to_excel(path2data)
\ No newline at end of file
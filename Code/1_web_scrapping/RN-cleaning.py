@@ -6,78 +6,66 @@ Created on Mon Feb 28 16:01:19 2022
 @author: carlostorunopaniagua
 """
 
-import pandas as pd
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+import os
+import sys
+from itertools import islice
 #from collections import Counter
-from gensim.corpora.dictionary import Dictionary
-from gensim import models
 
-# Importing data
-master_data = pd.read_csv("Data/master.csv")
+# Making the shared speechdb modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from speechdb import dtm, metrics, preprocess, topics
 
-# Tokenizing speeches
-speeches = list(master_data["speech"]) 
-tokenized_sps = [[token for token in tk_speech 
-                  # Removing stopwords and punctuation 
-                  if token.isalpha() and token not in stopwords.words("spanish")] 
-                         # Tokenizing individual speeches
-                         for tk_speech in [word_tokenize(speech.lower()) 
-                                for speech in speeches]]
+# Importing data: speeches are streamed from the CSV file, never held in memory at once
+speeches = preprocess.CsvSpeeches("Data/master.csv", column = "speech")
 
-# Counter(tokenized_sps).most_common(5)
-
-# Bigrams and Trigrams
-bigram_phrases = models.Phrases(tokenized_sps, min_count = 5, threshold = 20)
-trigram_phrases = models.Phrases(bigram_phrases[tokenized_sps], threshold = 20)
+# Worker processes for the preprocessing, only when run as a script (platforms that spawn workers
+# import this file again in every one of them)
+processes = os.cpu_count() if __name__ == "__main__" else 1
 
-bigram = models.phrases.Phraser(bigram_phrases)
-trigram = models.phrases.Phraser(trigram_phrases)
+# Timings, counts (speeches, tokens) and peak memory of every stage, in Data/metrics/
+if __name__ == "__main__":
+    metrics.configure(os.path.join("Data", "metrics", "rn_cleaning.jsonl"))
 
-def make_bigrams(texts):
-    return[bigram[doc] for doc in texts]
+# Tokenizing speeches, removing stopwords and punctuation
+pipeline = preprocess.Pipeline(words = preprocess.spanish_stopwords())
+tokenized_sps = preprocess.StreamedCorpus(speeches, pipeline, processes = processes)
 
-def make_trigrams(texts):
-    return[trigram[bigram[doc]] for doc in texts]
+# Counter(tokenized_sps).most_common(5)
 
-data_bigrams = make_bigrams(tokenized_sps)
-data_bigrams_trigrams = make_trigrams(data_bigrams)
+# Bigrams and Trigrams: frozen phrase models learned from the streamed speeches once per version
+# of master.csv and saved in Data/phrases/ (later runs only load them)
+bigram, trigram = preprocess.load_phrasers(os.path.join("Data", "phrases"), tokenized_sps, speeches.version,
+                                           levels = 2, min_count = 5, threshold = 20)
 
-print (data_bigrams_trigrams[3][0:25])
+data_bigrams_trigrams = preprocess.StreamedCorpus(speeches, pipeline.with_phrases(bigram, trigram),
+                                                  processes = processes)
 
+# Preview of the fourth speech: only the first four speeches go through the pipeline, in this
+# process, and the list is materialized (no worker pool is started for it)
+preview = list(pipeline.with_phrases(bigram, trigram)(islice(speeches, 4)))
+print (preview[3][0:25])
 
-# TF-IDF Removal
-id2word = Dictionary(data_bigrams_trigrams)
-gcorpus = [id2word.doc2bow(tkdoc) for tkdoc in data_bigrams_trigrams]
 
-tfidf = models.TfidfModel(gcorpus, id2word = id2word)
+# Counting terms once: document-term matrix of the speeches (with phrases), shared by the
+# TF-IDF filter and the LDA model through zero-copy gensim corpora
+doc_term = dtm.DTM.from_tokens(data_bigrams_trigrams)
 
-#Filter low value words and also words missing in tfidf models.
+# TF-IDF Removal: low value words (TF-IDF weight below low_value, or 0 for words used in every
+# speech) are dropped from every speech at once; top keeps only the best weighted words of a speech
 low_value = 0.025
-
-for i in range(0, len(gcorpus)):
-    bow = gcorpus[i]
-    low_value_words = [] #reinitialize to be safe. You can skip this.
-    tfidf_ids = [id for id, value in tfidf[bow]]
-    bow_ids = [id for id, value in bow]
-    low_value_words = [id for id, value in tfidf[bow] if value < low_value]
-    words_missing_in_tfidf = [id for id in bow_ids if id not in tfidf_ids] # The words with tf-idf socre 0 will be missing
-
-    new_bow = [b for b in bow if b[0] not in low_value_words and b[0] not in words_missing_in_tfidf]  
-
-#reassign        
-gcorpus[i] = new_bow
+top       = None
 
 # Creating a gensim corpus
-dictionary = Dictionary(tokenized_sps)
-gcorpus = [dictionary.doc2bow(doc) for doc in tokenized_sps]
-
-# LDA model
-LDA_model = models.ldamodel.LdaModel(corpus = gcorpus,
-                                     id2word = dictionary,
-                                     num_topics = 8,
-                                     random_state = 100,
-                                     update_every = 1,
-                                     chunksize = 100,
-                                     passes = 10,
-                                     alpha = "auto")
+gcorpus, dictionary = topics.corpus(doc_term, low_value = low_value, top = top)
+
+# LDA model: number of topics, alpha and passes chosen by a parallel sweep (see speechdb/topics.py)
+# on the same document-term matrix and low_value, keeping the model with the best coherence
+if __name__ == "__main__":
+    dtm_folder    = os.path.join("Data", "dtm_rn")
+    topics_folder = os.path.join("Data", "topics_rn")
+    doc_term.save(dtm_folder)
+    report = topics.sweep(dtm_folder, topics_folder, low_value = low_value, top = top)
+    print(report.to_string(index = False))
+
+    LDA_model = topics.load_models(topics_folder)["all"]
+    metrics.save()
@@ -7,59 +7,70 @@ Created on Sat Feb 19 13:28:09 2022
 """
 
 # Libraries needed
-import pandas as pd
-# import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
+import os
+import sys
+
+# Making the shared speechdb modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from speechdb import dedup, metrics, radionicaragua
+from speechdb.fetch import Fetcher
+from speechdb.htmlstore import HtmlStore
+
+# Timings, counts, bytes fetched and HTTP statuses of every stage (JSON lines) and a Prometheus
+# snapshot, in Data/metrics/
+metrics.configure("Data/metrics/rn_extraction.jsonl")
 
 # Header definition
 headers = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36"
 }
 
-# Setting up a Selenium webdriver
-driver = webdriver.Chrome(executable_path = '/Users/carlostorunopaniagua/Documents/GitHub/chromedriver_mac64')
+# Raw HTML store: every article is saved before parsing so the data can be rebuilt
+# offline with Code/1_web_scrapping/replay.py
+path2store = "Data/html_store"
 
-# Getting speeches links from root pages
-article_links = []
-for page in range(1,26):
-    driver.get(f'https://radionicaragua.com.ni/category/discurso/page/{page}/')
-    content = driver.page_source
-    soup = BeautifulSoup(content)
+# Extraction mode: "http" fetches category pages and articles concurrently over plain
+# HTTP, "selenium" loads every page through the driver pool. With DRIVERS > 0 the
+# driver pool is also used as a fallback for the pages the HTTP mode could not get.
+MODE           = "http"
+DRIVERS        = 0
+FETCH_SETTINGS = {
+    "max_workers" : 16,
+    "per_host"    : 8,
+    "rate"        : 8.0
+}
 
-    articlelist = soup.findAll("article")
-    for article in articlelist:
-        for caption in article.findAll("figcaption"):  
-            for atags in caption.findAll("a", href=True):
-                print(atags["href"])
-                article_links.append(atags["href"])
+# Setting up a pool of Selenium webdrivers (only opened if used)
+driver_pool = None
+if MODE == "selenium" or DRIVERS > 0:
+    driver_pool = radionicaragua.DriverPool(
+        size            = max(DRIVERS, 1),
+        executable_path = '/Users/carlostorunopaniagua/Documents/GitHub/chromedriver_mac64'
+    )
+
+fetcher = Fetcher(headers = headers, **FETCH_SETTINGS) if MODE == "http" else None
+
+# Getting speeches links from root pages
+article_links = radionicaragua.discover_links(npages = 25, fetcher = fetcher, driver_pool = driver_pool)
+print(f"{len(article_links)} speeches found")
 
 # Extracting information from individual links
-speeches_list = []
-for link in article_links:
-    driver.get(link)
-    content = driver.page_source
-    soup = BeautifulSoup(content)
+with HtmlStore(path2store) as store:
+    master_data = radionicaragua.extract_speeches(article_links, 
+                                                  mode        = MODE, 
+                                                  fetcher     = fetcher, 
+                                                  driver_pool = driver_pool, 
+                                                  store       = store)
+
+if fetcher is not None:
+    fetcher.close()
+if driver_pool is not None:
+    driver_pool.close()
 
-    article_title = soup.find("h1", class_ = "title-to-share entry-title mb-2 pb-4").text.strip()
-    article_date = soup.find("div", class_ = "d-flex entry-date justify-content-end").text.strip()
-    article_content = []
-    prgphs = soup.select(".entry-content p+ p")
-    for p in prgphs:
-        # article_content = article_content + p + " "
-        article_content.extend(p.stripped_strings)
-    article_content = " ".join(article_content)
-        
-    
-    speech = {
-        "title"  : article_title,
-        "date"   : article_date,
-        "speech" : article_content,
-        "link"   : link
-        }
-    
-    speeches_list.append(speech)
+# Dropping transcripts published twice by Radio Nicaragua (Data/dedup/radionicaragua);
+# transcripts also published by Canal 4 are kept and reported in its matches.csv
+master_data = dedup.deduplicate(master_data, "Data/dedup", "radionicaragua", key = "link", text = "speech")
 
 # Saving data into a dataframe    
-master_data = pd.DataFrame(speeches_list)
 master_data.to_csv("Data/master.csv", index = False, encoding = "utf-8")
+metrics.save()
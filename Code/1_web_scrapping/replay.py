@@ -0,0 +1,59 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Replay extraction
+Description:    Rebuilds the master datasets of the extraction scripts (Data/master_data.csv for Canal 4 and
+                Data/master.csv for Radio Nicaragua) from the raw HTML store alone. No network access is
+                needed, so parser fixes can be applied to the whole archive in seconds. Near-duplicates are
+                dropped with the MinHash index of every source (Data/dedup/<source>), which keeps its decisions.
+                Data/master_data.csv is only rewritten when the store holds every page finished in the crawl
+                manifest (Data/c4_manifest.sqlite), so a partial store never replaces the full dataset.
+"""
+
+import os
+import sys
+
+# Making the shared speechdb modules importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from speechdb import canal4, dedup, metrics, radionicaragua
+from speechdb.htmlstore import HtmlStore
+from speechdb.manifest import CrawlManifest
+
+# The parsing of the store is spread over a process pool: worker processes import this script
+# when they are spawned (Windows, macOS), so it only runs as the main program
+if __name__ == "__main__":
+
+    path2data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Data")
+
+    # Timings and counts of every stage (JSON lines) and a Prometheus snapshot, in Data/metrics/
+    metrics.configure(os.path.join(path2data, "metrics", "replay.jsonl"))
+
+    with HtmlStore(os.path.join(path2data, "html_store")) as store:
+
+        # Canal 4 speeches. Pages crawled before the store existed are missing from it until
+        # C4-extraction.py fetches them again
+        unstored = []
+        if os.path.exists(os.path.join(path2data, "c4_manifest.sqlite")):
+            with CrawlManifest(os.path.join(path2data, "c4_manifest.sqlite")) as manifest:
+                unstored = store.missing(manifest.done())
+
+        if unstored:
+            print(f"Canal 4: {len(unstored)} pages of the crawl manifest are missing from the store, "
+                  f"master_data.csv is left as it is (run C4-extraction.py to add them to the store)")
+        else:
+            data = canal4.replay(store)
+            data = dedup.deduplicate(data, os.path.join(path2data, "dedup"), "canal4", key = "url", text = "content")
+            print(f"Canal 4: {len(data)} speeches rebuilt from the store")
+            if len(data):
+                data.to_csv(os.path.join(path2data, "master_data.csv"),
+                            index    = False,
+                            encoding = "utf-8")
+
+        # Radio Nicaragua speeches
+        master_data = radionicaragua.replay(store)
+        master_data = dedup.deduplicate(master_data, os.path.join(path2data, "dedup"), "radionicaragua",
+                                        key = "link", text = "speech")
+        print(f"Radio Nicaragua: {len(master_data)} speeches rebuilt from the store")
+        if len(master_data):
+            master_data.to_csv(os.path.join(path2data, "master.csv"), index = False, encoding = "utf-8")
+
+    metrics.save()
@@ -1,207 +1,374 @@
-from dash import Dash, html, dash_table, dcc, callback, Output, Input, no_update
+from dash import Dash, html, dash_table, dcc, callback, ctx, Output, Input, State, no_update
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
 import pandas as pd
-import plotly.express as px
 from wordcloud import WordCloud
-import requests
-import json
+import hmac
+import io
+import os
+import time
+from functools import cached_property, lru_cache
+from urllib.parse import urlencode
+from flask import Response, abort, g, request, send_file
+from PIL import Image
+from speechdb import dtm, export, figures, metrics, publish, search, sentiment, snapshot, static, topics
+from speechdb.speechindex import SpeechIndex
 
 ##============================##
 ##      DATA & Classes        ##
 ##============================##
 
-# Reading data
-master_data = pd.read_csv("https://raw.githubusercontent.com/ctoruno/Nicaragua-dictators-speech/main/Data/speech_data.csv")
-master_data["date"] = pd.to_datetime(master_data["date"], format = "%Y-%m-%d")
-
-response = requests.get("https://raw.githubusercontent.com/ctoruno/Nicaragua-dictators-speech/main/Data/tklem_speeches.json")
-tklem_speeches = json.loads(response.text)
-
-with open("assets/LDAvis_daniel.html", 'r') as file:
-    Daniel_LDA = file.read()
-with open("assets/LDAvis_rosario.html", 'r') as file:
-    Rosario_LDA = file.read()
+# Reading data from the local, versioned data snapshot bundled with the app (Data/snapshot).
+# If missing, it is downloaded from GitHub or, when no snapshot is published there, built from
+# the published speech_data.csv and tklem_speeches.json (local copies if present). Set
+# SPEECHDB_REFRESH to a number of seconds to check GitHub for new versions in the background
+# (used from the next worker boot).
+DATA_DIR        = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data")
+DATA_REMOTE     = "https://raw.githubusercontent.com/ctoruno/Nicaragua-dictators-speech/main/Data/"
+SNAPSHOT_ROOT   = os.environ.get("SPEECHDB_SNAPSHOT", os.path.join(DATA_DIR, "snapshot"))
+SNAPSHOT_REMOTE = DATA_REMOTE + "snapshot/"
+
+def published_file(name):
+    path = os.path.join(DATA_DIR, name)
+    return path if os.path.exists(path) else DATA_REMOTE + name
+
+def build_from_published(root):
+    publish.from_legacy(root, published_file("speech_data.csv"), published_file("tklem_speeches.json"))
+
+data_snapshot = snapshot.load(SNAPSHOT_ROOT, remote = SNAPSHOT_REMOTE, fallback = build_from_published)
+
+# Derived artifacts (figures, exports, search indexes, word counts, sentiment, topic mixtures) are
+# built by speechdb/publish.py and published with the snapshot: workers only open them, each one
+# when it is first needed. An artifact missing from the snapshot is built then, under the snapshot
+# lock (publish.open_artifact), instead of building every artifact at boot
+
+if os.environ.get("SPEECHDB_REFRESH"):
+    snapshot.start_refresh(SNAPSHOT_ROOT, SNAPSHOT_REMOTE, interval = float(os.environ["SPEECHDB_REFRESH"]))
+
+# Speeches (data_snapshot.speeches) and lemmatized tokens (data_snapshot.tokens) are loaded
+# lazily, the Data Preview tab only needs the aggregates cached for this data version
+
+# LDAvis visualizations: served on demand from /topics/ (precompressed in a cache folder, cached by
+# the browsers) when the Topic Modelling tab is opened, instead of being inlined in the layout
+LDA_FILES = {
+    "daniel" : "assets/LDAvis_daniel.html",
+    "rosario": "assets/LDAvis_rosario.html"
+}
+LDA_VERSIONS = {name: static.fingerprint(path) for name, path in LDA_FILES.items()}
+for path in LDA_FILES.values():
+    try:
+        static.precompress(path)
+    except OSError as err:
+        print(f"Not able to precompress {path}: {err}")
 
 # Initializing the app
 app = Dash(__name__,
            external_stylesheets = [dbc.themes.SPACELAB, "/assets/styles.css"])
 server = app.server
 
-# Defining the SpeechData class
-class SpeechData:
-    def __init__(self, df):
-        self.df = df
-
-    def barPlot_nspeeches(self):
-        grouped_data = (
-            self.df
-            .groupby("spoke_person")
-            .size()
-            .reset_index(name = "count")
-        )
-        fig = px.bar(
-            grouped_data, 
-            x    = "spoke_person", 
-            y    = "count", 
-            labels    = {"spoke_person": "Spoke Person", 
-                        "count"       : "<i>Number of speeches</i>"},
-            color_discrete_sequence = ["#CBDFBD"]
-        )
-        fig.update_layout(
-            title        = "<b>Total Number of Speeches by Spoke Person</b>",
-            title_font   = dict(
-                size     = 16, 
-                family   = "Open Sans"
-            ),
-            title_x        = 0.5,
-            font_color     = "#201E1F",
-            plot_bgcolor   = "#FFFFFF",
-            xaxis          = dict(
-                title      = dict(text = None),
-                fixedrange = True
-            ),
-            yaxis          = dict(
-                dtick      = 200,
-                gridcolor  = "#3F3B3D", 
-                gridwidth  = 0.5, 
-                griddash   = "dash", 
-                fixedrange = True,
-                titlefont  = dict(family = "Open Sans"),
-                autorangeoptions = dict(include = 1900),
-            ),
-            font = dict(family = "Open Sans")
-        )
-        return fig
-
-    def barPlot_speechlen(self):
-        grouped_data = (
-            self.df
-            .groupby("spoke_person")
-            .nwords
-            .mean()
-            .reset_index(name = "mean")
-        )
-        fig = px.bar(
-            grouped_data, 
-            x      = "spoke_person", 
-            y      = "mean", 
-            labels = {"spoke_person": "Spoke Person", 
-                      "mean"       : "<i>Average speech length (in words)</i>"},
-            color_discrete_sequence = ["#F19C79"]
+# Latency histograms of every route and of every Dash callback (named after its outputs). They are
+# only exposed, in the Prometheus text format at /metrics, when SPEECHDB_METRICS_TOKEN is set and
+# the scraper sends it as a bearer token. Every worker process keeps its own metrics
+@server.before_request
+def start_timer():
+    g.start = time.perf_counter()
+
+@server.after_request
+def record_latency(response):
+    if "start" not in g:
+        return response
+    seconds = time.perf_counter() - g.start
+    route   = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("http_request_seconds", seconds, route = route, method = request.method,
+                    status = response.status_code)
+    if route == "/_dash-update-component":
+        callback = (request.get_json(silent = True) or {}).get("output", "unknown")
+        metrics.observe("dash_callback_seconds", seconds, callback = callback, status = response.status_code)
+    return response
+
+METRICS_TOKEN = os.environ.get("SPEECHDB_METRICS_TOKEN")
+
+if METRICS_TOKEN:
+    @server.route("/metrics")
+    def metrics_page():
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            abort(401)
+        return Response(metrics.render(), mimetype = "text/plain; version=0.0.4")
+
+# Data exports (csv.gz, parquet, jsonl.gz) are cached files of the current data version, served
+# from /download?format=...&speaker=...&start=YYYY-MM-DD&end=YYYY-MM-DD
+exporter = export.Exporter(data_snapshot)
+
+@server.route("/download")
+def download_data():
+    fmt = request.args.get("format", "csv.gz")
+    try:
+        path = exporter.path(
+            fmt,
+            speakers = request.args.getlist("speaker"),
+            start    = request.args.get("start"),
+            end      = request.args.get("end")
         )
-        fig.update_layout(
-            title         = "<b>Average speech length by Spoke Person</b>",
-            title_font    = dict(
-                size      = 16, 
-                family    = "Open Sans"
-            ),
-            title_x        = 0.5,
-            font_color     = "#201E1F",
-            plot_bgcolor   = "#FFFFFF",
-            xaxis          = dict(
-                title      = dict(text = None),
-                fixedrange = True
-            ),
-            yaxis          = dict(
-                dtick      = 500,
-                gridcolor  = "#3F3B3D", 
-                gridwidth  = 0.5, 
-                griddash   = "dash", 
-                fixedrange = True,
-                titlefont  = dict(family = "Open Sans"),
-                autorangeoptions = dict(include = 3100),
-            ),
-            font = dict(family = "Open Sans")
-            )
-        return fig
+    except ValueError as err:
+        abort(400, str(err))
+    return send_file(
+        path,
+        mimetype      = export.FORMATS[fmt],
+        as_attachment = True,
+        download_name = os.path.basename(path),
+        max_age       = 3600
+    )
+
+@server.route("/wordcloud/<speaker>.png")
+def wordcloud_image(speaker):
+    try:
+        png = wordcloud_png(speaker, request.args.get("start") or None, request.args.get("end") or None)
+    except ValueError as err:
+        abort(400, str(err))
+    # The URL carries the data version, so the image never changes
+    return Response(png, mimetype = "image/png",
+                    headers = {"Cache-Control": f"public, max-age={static.MAX_AGE}, immutable"})
+
+@server.route("/topics/<name>.html")
+def topic_visualization(name):
+    if name not in LDA_FILES:
+        abort(404)
+    return static.send_static(LDA_FILES[name], etag = LDA_VERSIONS[name])
+
+# Defining the SpeechData class: aggregates and figures of the whole corpus are served from the
+# cache materialized for the current data version (speechdb/figures.py). Selections of speakers
+# and dates are answered by an in-memory index (speechdb/speechindex.py), built on first use, and
+# the figures of the last selections are kept in an LRU cache
+class SpeechData:
+    def __init__(self, cache, index_path, maxsize = 256):
+        self.agg        = cache["aggregates"]
+        self.figures    = cache["figures"]
+        self.index_path = index_path
+        self.select     = lru_cache(maxsize = maxsize)(self._select)
+
+    @cached_property
+    def index(self):
+        return SpeechIndex.from_parquet(self.index_path)
+
+    def _select(self, speakers, start, end):
+        agg = self.index.aggregate(speakers, start, end)
+        return figures.render(self.figures, agg)
+
+    def filtered(self, speakers = None, start = None, end = None):
+        if speakers is None and start is None and end is None:
+            return self.figures
+        return self.select(None if speakers is None else tuple(sorted(speakers)), start, end)
+
+    def barPlot_nspeeches(self, speakers = None, start = None, end = None):
+        return self.filtered(speakers, start, end)["nspeeches"]
+
+    def barPlot_speechlen(self, speakers = None, start = None, end = None):
+        return self.filtered(speakers, start, end)["speechlen"]
     
-    def lineChart_sp(self):
-        grouped_data = (
-            self.df
-            .groupby([self.df["date"].dt.to_period("Q"), "spoke_person"])
-            .spoke_person
-            .size()
-            .reset_index(name = "count")
-        )
-        grouped_data["date4plot"] = pd.PeriodIndex(grouped_data["date"], freq = "Q").strftime('%B, %Y')
-        # grouped_data = grouped_data.set_index("date4plot")
-        
-        fig = px.line(
-            grouped_data, 
-            x = grouped_data.index, 
-            y = "count",
-            color  = "spoke_person",
-            labels = {"date4plot"    : "Yearly Quarter", 
-                      "count"        : "Number of speeches",
-                      "spoke_person" : "Spoke Person"},
-            custom_data   = ["date4plot", "spoke_person"],
-            color_discrete_sequence = ["#667761", "#a44a3f"]
-        )
-        fig.update_layout(
-            title = "<b>Total number of speeches over time</b>",
-            title_font    = dict(
-                size      = 16, 
-                family    = "Open Sans"
-            ),
-            title_x        = 0.5,
-            font_color     = "#201E1F",
-            plot_bgcolor   = "#FFFFFF",
-            xaxis          = dict(
-                tickangle  = 45,
-                fixedrange = True,
-                title      = dict(text = "Yearly Quarter", font = dict(family = "Open Sans"), standoff = 40),
-                showticklabels = False
-            ),
-            yaxis          = dict(
-                dtick      = 20,
-                gridcolor  = "#3F3B3D", 
-                gridwidth  = 0.5, 
-                griddash   = "dash", 
-                fixedrange = True,
-                titlefont  = dict(family = "Open Sans"),
-                autorangeoptions = dict(include = 110)
-            ),
-            font = dict(family = "Open Sans")
-            )
-        fig.update_traces(
-            hovertemplate = "Date: %{customdata[0]}<br>Total speeches: %{y}"
-        )
-        return fig
+    def lineChart_sp(self, speakers = None, start = None, end = None):
+        return self.filtered(speakers, start, end)["timeline"]
     
     def totalSpeeches(self):
-        nrows = len(self.df)
+        nrows = self.agg["nspeeches"]
         nss = f"The data explored in this app covers a total of {nrows} speeches given by President Daniel Ortega and his wife and Vice-President Rosario Murillo."
         return nss
 
     def datesRange(self):
-        minDate = self.df.date.dt.to_period("M").min().strftime('%B, %Y')
-        maxDate = self.df.date.dt.to_period("M").max().strftime('%B, %Y')
+        minDate = pd.Period(self.agg["first_month"], freq = "M").strftime('%B, %Y')
+        maxDate = pd.Period(self.agg["last_month"], freq = "M").strftime('%B, %Y')
         drange = f"Data covers a period of time starting from {minDate} to {maxDate}."
         return drange
 
+# Word clouds are generated on demand from the document-term matrix (speechdb/dtm.py): the term
+# counts of the selected speeches are summed and passed to generate_from_frequencies. The layout
+# is computed at half resolution and scaled up, which is four times faster
 class Tokenized:
-    def __init__(self, ls):
-        self.ls = ls
+    def __init__(self, dtm):
+        self.dtm = dtm
 
-    def WCplot(self):
-        all_tokens = [token for speech in self.ls for token in speech]
-        combined_tokens = " ".join(all_tokens)
+    def WCplot(self, speaker = None, start = None, end = None):
         wcloud = WordCloud(
-            width    = 1000, 
-            height   = 500, 
+            width    = 500, 
+            height   = 250, 
+            scale    = 2,
             colormap = "twilight",
             relative_scaling = 0.45,
             background_color = "white"
-        ).generate(combined_tokens)
+        ).generate_from_frequencies(self.dtm.frequencies(speaker, start, end))
         return wcloud
 
+SPEAKER_NAMES = {
+    "Daniel" : "Daniel Ortega",
+    "Rosario": "Rosario Murillo"
+}
+SPEAKER_COLORS = {
+    "Daniel" : "#667761",
+    "Rosario": "#a44a3f"
+}
+
+# Full-text search (speechdb/search.py): the index of the current data version is memory-mapped
+# on the first query, and the pages of the last queries are kept in an LRU cache
+SEARCH_PAGE_SIZE = 10
+
+@lru_cache(maxsize = 1)
+def search_index():
+    return publish.open_artifact(data_snapshot, search.load)
+
+@lru_cache(maxsize = 256)
+def search_page(query, page):
+    return search_index().search(query, page = page, page_size = SEARCH_PAGE_SIZE)
+
+def search_figure(quarterly):
+    speakers = sorted({row["spoke_person"] for row in quarterly})
+    return {
+        "data": [
+            {
+                "type"  : "bar",
+                "name"  : SPEAKER_NAMES.get(sp, sp),
+                "x"     : [row["quarter"] for row in quarterly if row["spoke_person"] == sp],
+                "y"     : [row["hits"] for row in quarterly if row["spoke_person"] == sp],
+                "marker": {"color": SPEAKER_COLORS.get(sp)},
+                "hovertemplate": "Quarter: %{x}<br>Hits: %{y}<extra></extra>"
+            }
+            for sp in speakers
+        ],
+        "layout": {
+            "title"       : {"text": "<b>Hits over time</b>", "x": 0.5, "font": {"size": 16, "family": "Open Sans"}},
+            "barmode"     : "stack",
+            "font"        : {"family": "Open Sans", "color": "#201E1F"},
+            "plot_bgcolor": "#FFFFFF",
+            "xaxis"       : {"type": "category", "fixedrange": True, "tickangle": 45},
+            "yaxis"       : {"gridcolor": "#3F3B3D", "gridwidth": 0.5, "griddash": "dash", "fixedrange": True}
+        }
+    }
+
+# Topic prevalence (speechdb/topics.py): topic mixture of every speech, inferred with the LDA
+# models of every speaker. Read when the Topic Modelling tab is first opened
+@lru_cache(maxsize = 1)
+def topic_table():
+    try:
+        return topics.load_table(data_snapshot)
+    except FileNotFoundError:
+        return None, {}
+
+NUMBER_WORDS = ["no", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
+
+def topics_text():
+    # Number of topics of the models chosen by the sweep (speechdb/topics.py)
+    _, terms = topic_table()
+    if not all(speaker in terms for speaker in SPEAKER_NAMES):
+        return ""
+    ntopics = [len(terms[speaker]) for speaker in SPEAKER_NAMES]
+    ntopics = [NUMBER_WORDS[n] if n < len(NUMBER_WORDS) else str(n) for n in ntopics]
+    return (f"The charts of topic prevalence over time use the LDA models chosen by a sweep over the number of topics "
+            f"(keeping the most coherent one): **{ntopics[0]}** topics for the President and **{ntopics[1]}** for the "
+            f"Vice President, inferred for every speech of the current data.")
+
+def topics_figure(speaker):
+    table, terms = topic_table()
+    rows = topics.prevalence(table, speaker) if table is not None else pd.DataFrame(columns = ["period", "topic", "weight"])
+    return {
+        "data": [
+            {
+                "type"  : "scatter",
+                "mode"  : "lines",
+                "name"  : f"Topic {topic + 1}: " + ", ".join(terms[speaker][topic][:3]),
+                "x"     : [str(period) for period in rows.loc[rows["topic"] == topic, "period"]],
+                "y"     : rows.loc[rows["topic"] == topic, "weight"].tolist(),
+                "hovertemplate": "Quarter: %{x}<br>Mean weight: %{y:.2f}<extra></extra>"
+            }
+            for topic in sorted(rows["topic"].unique())
+        ],
+        "layout": {
+            "title"       : {"text": "<b>Topic prevalence over time</b>", "x": 0.5, "font": {"size": 16, "family": "Open Sans"}},
+            "font"        : {"family": "Open Sans", "color": "#201E1F"},
+            "plot_bgcolor": "#FFFFFF",
+            "legend"      : {"orientation": "h", "y": -0.3},
+            "xaxis"       : {"type": "category", "fixedrange": True, "tickangle": 45},
+            "yaxis"       : {"gridcolor": "#3F3B3D", "gridwidth": 0.5, "griddash": "dash", "fixedrange": True}
+        }
+    }
+
+# Sentiment (speechdb/sentiment.py): per-speech and quarterly lexicon scores computed offline for
+# this data version. Read when the Sentiment Analysis tab is first opened
+@lru_cache(maxsize = 1)
+def sentiment_tables():
+    return publish.open_artifact(data_snapshot, sentiment.load)
+
+SENTIMENT_LAYOUT = {
+    "font"        : {"family": "Open Sans", "color": "#201E1F"},
+    "plot_bgcolor": "#FFFFFF",
+    "yaxis"       : {"gridcolor": "#3F3B3D", "gridwidth": 0.5, "griddash": "dash", "fixedrange": True}
+}
+
+def sentiment_timeline():
+    quarterly = sentiment_tables()[1]
+    return {
+        "data": [
+            {
+                "type"  : "scatter",
+                "mode"  : "lines",
+                "name"  : SPEAKER_NAMES.get(sp, sp),
+                "x"     : rows["period"].tolist(),
+                "y"     : rows["score"].tolist(),
+                "customdata": rows["nspeeches"].tolist(),
+                "line"  : {"color": SPEAKER_COLORS.get(sp)},
+                "hovertemplate": "Quarter: %{x}<br>Mean score: %{y:.3f}<br>Speeches: %{customdata}<extra></extra>"
+            }
+            for sp, rows in quarterly.groupby("spoke_person")
+        ],
+        "layout": dict(
+            SENTIMENT_LAYOUT,
+            title = {"text": "<b>Sentiment score over time</b>", "x": 0.5, "font": {"size": 16, "family": "Open Sans"}},
+            xaxis = {"type": "category", "fixedrange": True, "tickangle": 45}
+        )
+    }
+
+def sentiment_speakers():
+    means = sentiment_tables()[0].groupby("spoke_person")[["positive", "negative"]].mean()
+    return {
+        "data": [
+            {
+                "type"  : "bar",
+                "name"  : name,
+                "x"     : [SPEAKER_NAMES.get(sp, sp) for sp in means.index],
+                "y"     : means[column].tolist(),
+                "marker": {"color": color},
+                "hovertemplate": "%{x}<br>" + name + ": %{y:.1%}<extra></extra>"
+            }
+            for column, name, color in [("positive", "Positive lemmas", "#CBDFBD"), ("negative", "Negative lemmas", "#F19C79")]
+        ],
+        "layout": dict(
+            SENTIMENT_LAYOUT,
+            title   = {"text": "<b>Share of positive and negative lemmas by Spoke Person</b>", "x": 0.5,
+                       "font": {"size": 16, "family": "Open Sans"}},
+            barmode = "group",
+            xaxis   = {"fixedrange": True},
+            yaxis   = dict(SENTIMENT_LAYOUT["yaxis"], tickformat = ".0%")
+        )
+    }
+
 # Initializing classes
-data4app   = SpeechData(master_data)
-# daniel_wc  = Tokenized(tklem_speeches["Daniel"]).WCplot()
-# daniel_wc.to_file('assets/daniel_wc.png')
-# rosario_wc = Tokenized(tklem_speeches["Rosario"]).WCplot()
-# rosario_wc.to_file('assets/rosario_wc.png')
+data4app   = SpeechData(publish.open_artifact(data_snapshot, figures.load), data_snapshot.file("speeches.parquet"))
+
+@lru_cache(maxsize = 1)
+def tokenized():
+    return Tokenized(publish.open_artifact(data_snapshot, dtm.load))
+
+@lru_cache(maxsize = 64)
+def wordcloud_png(speaker, start, end):
+    if not tokenized().dtm.rows(speaker, start, end):
+        image = Image.new("RGB", (1000, 500), "white")
+    else:
+        image = tokenized().WCplot(speaker, start, end).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format = "PNG", compress_level = 3)
+    return buffer.getvalue()
+
+def wordcloud_url(speaker, start = None, end = None):
+    query = urlencode([(key, value) for key, value in [("start", start), ("end", end)] if value] +
+                      [("v", data_snapshot.version)])
+    return f"/wordcloud/{speaker}.png?{query}"
 
 ##============================##
 ##          APP LAYOUT        ##
@@ -235,7 +402,7 @@ app.layout = dbc.Container([
     dmc.Space(h = 22),
     dbc.Row(
         dbc.Col(
-            dbc.Tabs([
+            dbc.Tabs(id = "main-tabs", children = [
                 dbc.Tab([
                     dmc.Space(h = 22),
                     dbc.Row([
@@ -302,6 +469,27 @@ app.layout = dbc.Container([
                         )
                     ]),
                     dmc.Space(h = 32),
+                    dbc.Row([
+                        dbc.Col(
+                            dmc.MultiSelect(
+                                label = "Spoke Person",
+                                data  = [{"value": sp, "label": SPEAKER_NAMES.get(sp, sp)} for sp in data4app.agg["speakers"]],
+                                value = list(data4app.agg["speakers"]),
+                                id    = "filter-speakers"
+                            )
+                        ),
+                        dbc.Col(
+                            dmc.DateRangePicker(
+                                label     = "Time Range",
+                                minDate   = data4app.agg["first_date"],
+                                maxDate   = data4app.agg["last_date"],
+                                value     = [data4app.agg["first_date"], data4app.agg["last_date"]],
+                                clearable = False,
+                                id        = "filter-dates"
+                            )
+                        )
+                    ]),
+                    dmc.Space(h = 22),
                     # dmc.Divider(variant = "solid"),
                     # dmc.Space(h = 15),
                     dcc.Markdown(
@@ -326,7 +514,7 @@ app.layout = dbc.Container([
                         className = "text-justify ptext"
                     ),
                     dcc.Graph(
-                        id     = "nspeeches_sp",
+                        id     = "timeline_sp",
                         figure = data4app.lineChart_sp(),
                         config = {"modeBarButtonsToRemove": removedButtons} 
                     ),
@@ -339,7 +527,7 @@ app.layout = dbc.Container([
                         className = "text-justify ptext"
                     ),
                     dcc.Graph(
-                        id     = "nspeeches_sp",
+                        id     = "speechlen_sp",
                         figure = data4app.barPlot_speechlen(),
                         config = {"modeBarButtonsToRemove": removedButtons} 
                     ),
@@ -360,13 +548,13 @@ app.layout = dbc.Container([
                         ]),
                         dmc.TabsPanel(
                             html.Div([
-                                html.Img(src = "assets/daniel_wc.png", width = "90%")
+                                html.Img(src = wordcloud_url("Daniel"), width = "90%", id = "wc-daniel")
                             ]), 
                             value = "DOwc"
                         ),
                         dmc.TabsPanel(
                             html.Div([
-                                html.Img(src = "assets/rosario_wc.png", width = "90%")
+                                html.Img(src = wordcloud_url("Rosario"), width = "90%", id = "wc-rosario")
                             ]), 
                             value = "RMwc"
                         )
@@ -388,10 +576,10 @@ app.layout = dbc.Container([
                         to discover underlying themes in a collection of text documents (such as our speech transcripts) by identifying common patterns 
                         and grouping words into topics.
 
-                        The LDA model was configured to identify four overarching topics in the President's speeches while only three broad topics in 
-                        the Vice President's. This adjustment aimed to mitigate topic overlap, as depicted in the graph below. However, it should be 
-                        noted that the likelihood of overlap in their speeches remains considerable. As such, these findings should be interpreted 
-                        with caution. Additionally, we suggest using a medium grade relevance metric (λ = 0.6). 
+                        The interactive visualizations below come from LDA models configured to identify four overarching topics in the President's 
+                        speeches while only three broad topics in the Vice President's. This adjustment aimed to mitigate topic overlap, as depicted in 
+                        the graph below. However, it should be noted that the likelihood of overlap in their speeches remains considerable. As such, 
+                        these findings should be interpreted with caution. Additionally, we suggest using a medium grade relevance metric (λ = 0.6). 
 
                         Under these assumptions, the following highlights arise:
 
@@ -414,13 +602,14 @@ app.layout = dbc.Container([
                         """,
                         className = "text-justify ptext"
                     ),
+                    dcc.Markdown(id = "topics-models", className = "text-justify ptext"),
                     dmc.Space(h = 32),
                     dbc.Tabs([
                         dbc.Tab(
                             [
                                 html.Div(
                                     html.Iframe(
-                                        srcDoc = Daniel_LDA,
+                                        id     = "LDA-daniel",
                                         width  = "800vw",
                                         height = "900px",
                                         style = {                                        
@@ -430,6 +619,10 @@ app.layout = dbc.Container([
                                         }
                                     ),
                                     style = {"width": "100%"}
+                                ),
+                                dcc.Graph(
+                                    id     = "topics-daniel",
+                                    config = {"modeBarButtonsToRemove": removedButtons}
                                 )
                             ],
                             style = {"width": "100%", "overflow": "hidden", "textAlign": "center"},
@@ -442,7 +635,7 @@ app.layout = dbc.Container([
                             [
                                 html.Div(
                                     html.Iframe(
-                                        srcDoc = Rosario_LDA,
+                                        id     = "LDA-rosario",
                                         width  = "800vw",
                                         height = "900px",
                                         style = {                                        
@@ -452,6 +645,10 @@ app.layout = dbc.Container([
                                         }
                                     ),
                                     style = {"width": "100%"}
+                                ),
+                                dcc.Graph(
+                                    id     = "topics-rosario",
+                                    config = {"modeBarButtonsToRemove": removedButtons}
                                 )
                             ],
                             style = {"width": "100%", "overflow": "hidden", "textAlign": "center"},
@@ -465,16 +662,94 @@ app.layout = dbc.Container([
                     label = "Topic Modelling",
                     labelClassName = "tablab",
                     activeLabelClassName = "active-tab",
-                    id = "tab-topic"
+                    id = "tab-topic",
+                    tab_id = "tab-topic"
                 ),
                 dbc.Tab([
                     dmc.Space(h = 22),
-                    html.P("UNDER DEVELOPMENT.")
+                    dcc.Markdown(
+                        """
+                        Below, you can find a basic lexicon-based sentiment analysis of the speeches. Every lemma of a speech 
+                        is looked up in a Spanish sentiment lexicon, where words have a polarity between -1 (e.g. _guerra_, 
+                        _odio_) and 1 (e.g. _paz_, _esperanza_). The score of a speech is the sum of the polarities of its 
+                        lemmas divided by its number of lemmas. Lexicon methods ignore context, irony and negations, so the 
+                        trends are more informative than the level of the scores.
+                        """,
+                        className = "text-justify ptext"
+                    ),
+                    dmc.Space(h = 32),
+                    dcc.Graph(
+                        id     = "sentiment-timeline",
+                        config = {"modeBarButtonsToRemove": removedButtons}
+                    ),
+                    dcc.Graph(
+                        id     = "sentiment-speakers",
+                        config = {"modeBarButtonsToRemove": removedButtons}
+                    )
                     ],
                     label = "Sentiment Analysis",
                     labelClassName = "tablab",
                     activeLabelClassName = "active-tab",
-                    id = "tab-sentiment"
+                    id = "tab-sentiment",
+                    tab_id = "tab-sentiment"
+                ),
+                dbc.Tab([
+                    dmc.Space(h = 22),
+                    dcc.Markdown(
+                        """
+                        Search the speeches for words or exact phrases. Words are matched against the transcripts and 
+                        their lemmas (e.g. _familia_ also finds _familias_), phrases go between quotes (_"pueblo presidente"_). 
+                        Several words must all appear in a speech; use _OR_ to accept any of them and _-word_ to exclude 
+                        speeches containing a word.
+                        """,
+                        className = "text-justify ptext"
+                    ),
+                    dbc.Row([
+                        dbc.Col(
+                            dmc.TextInput(
+                                placeholder = 'e.g. paz "pueblo presidente" -yanqui',
+                                debounce    = True,
+                                id          = "search-query"
+                            )
+                        ),
+                        dbc.Col(
+                            dmc.Button(
+                                "Search",
+                                variant = "light",
+                                color   = "orange",
+                                radius  = "lg",
+                                id      = "search-bttn"
+                            ),
+                            width = "auto"
+                        )
+                    ]),
+                    dmc.Space(h = 22),
+                    dmc.Text(id = "search-summary", size = "sm", color = "dimmed"),
+                    dcc.Graph(
+                        id     = "search-timeline",
+                        figure = search_figure([]),
+                        config = {"modeBarButtonsToRemove": removedButtons}
+                    ),
+                    dash_table.DataTable(
+                        id           = "search-results",
+                        columns      = [
+                            {"name": "Date",         "id": "date"},
+                            {"name": "Spoke Person", "id": "spoke_person"},
+                            {"name": "Headline",     "id": "headline", "presentation": "markdown"},
+                            {"name": "Hits",         "id": "hits"}
+                        ],
+                        data         = [],
+                        page_action  = "custom",
+                        page_current = 0,
+                        page_size    = SEARCH_PAGE_SIZE,
+                        page_count   = 1,
+                        style_cell   = {"fontFamily": "Open Sans", "textAlign": "left", "whiteSpace": "normal"}
+                    )
+                    ],
+                    label = "Search",
+                    labelClassName = "tablab",
+                    activeLabelClassName = "active-tab",
+                    id = "tab-search"
                 ),
                 dbc.Tab([
                     dmc.Space(h = 22),
@@ -536,12 +811,22 @@ app.layout = dbc.Container([
     dbc.Row(
         dbc.Col([
             html.Div([
-                html.Button(
-                    "Download Data",
-                    # color = "success",
-                    id = "download-data-bttn"
+                html.A(
+                    html.Button(
+                        "Download Data",
+                        # color = "success",
+                        id = "download-data-bttn"
+                    ),
+                    href = "/download?format=csv.gz",
+                    id   = "download-data"
                 ),
-                dcc.Download(id = "download-data")
+                html.P([
+                    "Also available as ",
+                    html.A("Parquet", href = "/download?format=parquet", id = "download-parquet"),
+                    " and ",
+                    html.A("JSON Lines", href = "/download?format=jsonl.gz", id = "download-jsonl"),
+                    "."
+                ], className = "mt-2")
             ])
         ], width = {"size": 4}
         ),
@@ -555,12 +840,89 @@ app.layout = dbc.Container([
 ##============================##
 
 @callback(
-    Output("download-data", "data"),
-    Input("download-data-bttn", "n_clicks"),
-    prevent_initial_call = True,
+    Output("nspeeches_sp", "figure"),
+    Output("timeline_sp", "figure"),
+    Output("speechlen_sp", "figure"),
+    Output("download-data", "href"),
+    Output("download-parquet", "href"),
+    Output("download-jsonl", "href"),
+    Output("wc-daniel", "src"),
+    Output("wc-rosario", "src"),
+    Input("filter-speakers", "value"),
+    Input("filter-dates", "value"),
+    prevent_initial_call = True
+)
+def filter_data(speakers, dates):
+    speakers   = None if not speakers or set(speakers) == set(data4app.agg["speakers"]) else speakers
+    start, end = dates or [None, None]
+    start      = None if start == data4app.agg["first_date"] else start
+    end        = None if end == data4app.agg["last_date"] else end
+
+    # The downloads follow the selection
+    query = urlencode([("speaker", sp) for sp in speakers or []] +
+                      [(key, value) for key, value in [("start", start), ("end", end)] if value])
+    return (
+        data4app.barPlot_nspeeches(speakers, start, end),
+        data4app.lineChart_sp(speakers, start, end),
+        data4app.barPlot_speechlen(speakers, start, end),
+        *[f"/download?format={fmt}" + (f"&{query}" if query else "") for fmt in ["csv.gz", "parquet", "jsonl.gz"]],
+        wordcloud_url("Daniel", start, end),
+        wordcloud_url("Rosario", start, end)
+    )
+
+@callback(
+    Output("search-summary", "children"),
+    Output("search-timeline", "figure"),
+    Output("search-results", "data"),
+    Output("search-results", "page_count"),
+    Output("search-results", "page_current"),
+    Input("search-bttn", "n_clicks"),
+    Input("search-query", "value"),
+    Input("search-results", "page_current"),
+    prevent_initial_call = True
+)
+def run_search(n_clicks, query, page):
+    query = (query or "").strip()
+    if not query:
+        return "", search_figure([]), [], 1, 0
+    page   = page if ctx.triggered_id == "search-results" else 0
+    result = search_page(query, page or 0)
+    rows   = [dict(row, headline = f"[{row['headline']}]({row['url']})") for row in result["results"]]
+    by_speaker = ", ".join(f"{SPEAKER_NAMES.get(sp, sp)}: {n}" for sp, n in result["speakers"].items())
+    summary = f"{result['nhits']} hits in {result['nspeeches']} speeches" + (f" ({by_speaker})." if by_speaker else ".")
+    return summary, search_figure(result["quarterly"]), rows, result["npages"], page or 0
+
+@callback(
+    Output("LDA-daniel", "src"),
+    Output("LDA-rosario", "src"),
+    Output("topics-daniel", "figure"),
+    Output("topics-rosario", "figure"),
+    Output("topics-models", "children"),
+    Input("main-tabs", "active_tab"),
+    State("LDA-daniel", "src")
+)
+def load_topics(active_tab, loaded):
+    # The callback fires on every tab change; the visualizations and figures are only sent the
+    # first time the tab is opened (once the iframes have a source, nothing is sent again)
+    if active_tab != "tab-topic" or loaded:
+        return no_update, no_update, no_update, no_update, no_update
+    return (
+        *[f"/topics/{name}.html?v={LDA_VERSIONS[name]}" for name in ["daniel", "rosario"]],
+        topics_figure("Daniel"),
+        topics_figure("Rosario"),
+        topics_text()
+    )
+
+@callback(
+    Output("sentiment-timeline", "figure"),
+    Output("sentiment-speakers", "figure"),
+    Input("main-tabs", "active_tab")
 )
-def func(n_clicks):
-    return dcc.send_data_frame(master_data.to_csv, "speech_data.csv")
+def load_sentiment(active_tab):
+    # The precomputed tables are only read the first time the tab is opened
+    if active_tab != "tab-sentiment":
+        return no_update, no_update
+    return sentiment_timeline(), sentiment_speakers()
 
 # Run the app
 if __name__ == '__main__':
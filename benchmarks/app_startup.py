@@ -0,0 +1,55 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         App startup benchmark
+Description:    Measures the cold start of a worker: the time it takes to import app.py in a fresh Python
+                process, loading the data from a local snapshot of a synthetic corpus. The import time of the
+                libraries alone (Dash, Plotly, pandas, ...) is reported separately as a baseline.
+
+                python benchmarks/app_startup.py --runs 5 --scale 1
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from synthetic import make_snapshot
+
+LIBRARIES = "import dash, dash_bootstrap_components, dash_mantine_components, plotly.express, pandas, wordcloud"
+TIMER     = "import time; start = time.perf_counter(); {stmt}; print(time.perf_counter() - start)"
+
+
+def cold_start(stmt, env, runs):
+    """
+    Returns the time of every run of `stmt` in a new Python process.
+    """
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", TIMER.format(stmt = stmt)],
+            cwd = ROOT, env = env, capture_output = True, text = True, check = True
+        )
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "App startup benchmark")
+    parser.add_argument("--runs",  type = int,   default = 5)
+    parser.add_argument("--scale", type = float, default = 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_snapshot(folder, args.scale)
+        env = dict(os.environ, SPEECHDB_SNAPSHOT = os.path.join(folder, "snapshot"))
+
+        libraries = cold_start(LIBRARIES, env, args.runs)
+        app       = cold_start("import app", env, args.runs)
+
+    print(f"libraries only  median {statistics.median(libraries):6.3f}s  min {min(libraries):6.3f}s")
+    print(f"import app      median {statistics.median(app):6.3f}s  min {min(app):6.3f}s")
+    print(f"app overhead    median {statistics.median(app) - statistics.median(libraries):6.3f}s")
@@ -0,0 +1,56 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Fetch throughput benchmark
+Description:    Compares the sequential and the concurrent modes of canal4.extract_content against a
+                local stand-in server serving recorded Canal 4 article pages.
+
+                python benchmarks/fetch_throughput.py --pages 200 --latency 0.1
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from speechdb import canal4
+from speechdb.fetch import Fetcher
+from local_server import LocalServer, load_fixtures
+
+
+def run(npages, latency, max_workers, per_host, rate):
+    """
+    Returns a dictionary with the pages per second achieved by each fetch mode.
+    """
+    results = {}
+    with LocalServer(load_fixtures("canal4"), latency = latency) as server:
+        urls = [server.url(f"speech-{i}/") for i in range(npages)]
+
+        # Baseline: bare requests.get without session reuse (the two seconds sleep is left out)
+        start = time.perf_counter()
+        for url in urls:
+            canal4.parse_article(canal4.requests.get(url, headers = canal4.HEADERS).text, url)
+        results["sequential"] = npages / (time.perf_counter() - start)
+
+        # Concurrent mode through the fetch engine
+        with Fetcher(max_workers = max_workers, per_host = per_host, rate = rate) as fetcher:
+            start = time.perf_counter()
+            data  = canal4.extract_content(urls, fetcher = fetcher)
+            results["concurrent"] = len(data) / (time.perf_counter() - start)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Fetch throughput benchmark")
+    parser.add_argument("--pages",       type = int,   default = 200)
+    parser.add_argument("--latency",     type = float, default = 0.1)
+    parser.add_argument("--max-workers", type = int,   default = 16)
+    parser.add_argument("--per-host",    type = int,   default = 16)
+    parser.add_argument("--rate",        type = float, default = None)
+    args = parser.parse_args()
+
+    results = run(args.pages, args.latency, args.max_workers, args.per_host, args.rate)
+    for mode, pps in results.items():
+        print(f"{mode:<12} {pps:8.1f} pages/s")
+    print(f"speed-up     {results['concurrent'] / results['sequential']:8.1f}x")
@@ -0,0 +1,78 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Local stand-in server
+Description:    Threaded HTTP/1.1 server serving the recorded pages in benchmarks/fixtures so the
+                extraction code can be benchmarked without touching the real websites. Any path is
+                answered with one of the recorded pages (picked from a hash of the path) after an
+                artificial delay that mimics the round trip to the real server.
+"""
+
+import os
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(source):
+    """
+    Returns the list of recorded pages (as bytes) for a given source folder.
+    """
+    folder = os.path.join(FIXTURES, source)
+    pages  = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".html"):
+            with open(os.path.join(folder, name), "rb") as file:
+                pages.append(file.read())
+    return pages
+
+
+class LocalServer:
+    """
+    Context manager running the stand-in server on a background thread.
+
+    pages:      list of page bodies to serve.
+    latency:    seconds to wait before answering each request.
+    """
+
+    def __init__(self, pages, latency = 0.1):
+        self.pages   = pages
+        self.latency = latency
+        self.hits    = 0
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}/{path.lstrip('/')}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.hits += 1
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                body = server.pages[zlib.crc32(self.path.encode()) % len(server.pages)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target = self.httpd.serve_forever, daemon = True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,91 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Parse throughput benchmark
+Description:    Measures pages parsed per second per core for the recorded article pages, comparing the
+                original BeautifulSoup code with the lxml parsing stage, on one core and over a process pool.
+                The records of both implementations are checked to be identical.
+
+                python benchmarks/parse_throughput.py --pages 2000 --processes 4
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from speechdb import parsing
+from local_server import load_fixtures
+
+
+def bs4_canal4(source_code, url_link):
+    """
+    Original extract_content parsing code, used as reference.
+    """
+    soup = BeautifulSoup(source_code, "lxml")
+    headline = re.sub("\n", "", soup.find("h1").text)
+    date = soup.find("span", class_ = "posted-on").find("time").get("datetime")
+    date = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S%z").date()
+    body = soup.find("div", class_ = "entry-content clearfix").find_all("p")
+    return {"headline": headline, "date": date, "content": " ".join(p.text for p in body), "url": url_link}
+
+
+def bs4_radionicaragua(source_code, link):
+    """
+    Original RN-extraction.py parsing code, used as reference.
+    """
+    soup = BeautifulSoup(source_code, "lxml")
+    title = soup.find("h1", class_ = "title-to-share entry-title mb-2 pb-4").text.strip()
+    date = soup.find("div", class_ = "d-flex entry-date justify-content-end").text.strip()
+    speech = []
+    for p in soup.select(".entry-content p+ p"):
+        speech.extend(p.stripped_strings)
+    return {"title": title, "date": date, "speech": " ".join(speech), "link": link}
+
+
+REFERENCE = {
+    "canal4"         : bs4_canal4,
+    "radionicaragua" : bs4_radionicaragua
+}
+
+
+def run(source, npages, processes):
+    """
+    Returns the pages per second per core of every implementation for a given source.
+    """
+    fixtures = load_fixtures(source)
+    pages    = [(f"https://example.org/{i}/", fixtures[i % len(fixtures)].decode("utf-8"))
+                for i in range(npages)]
+    results  = {}
+
+    start     = time.perf_counter()
+    reference = [REFERENCE[source](html, url) for url, html in pages]
+    results["bs4, 1 core"] = npages / (time.perf_counter() - start)
+
+    start   = time.perf_counter()
+    records = parsing.parse_batch(pages, source, processes = 1)
+    results["lxml, 1 core"] = npages / (time.perf_counter() - start)
+    assert records == reference, "lxml records differ from the BeautifulSoup ones"
+
+    start   = time.perf_counter()
+    records = parsing.parse_batch(pages, source, processes = processes)
+    results[f"lxml, {processes} cores"] = npages / (time.perf_counter() - start) / processes
+    assert records == reference, "lxml records differ from the BeautifulSoup ones"
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Parse throughput benchmark")
+    parser.add_argument("--pages",     type = int, default = 2000)
+    parser.add_argument("--processes", type = int, default = os.cpu_count())
+    args = parser.parse_args()
+
+    for source in REFERENCE:
+        print(source)
+        for name, pps in run(source, args.pages, args.processes).items():
+            print(f"  {name:<16} {pps:8.1f} pages/s/core")
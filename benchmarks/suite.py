@@ -0,0 +1,353 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Benchmark suite
+Description:    End-to-end benchmarks of the pipeline on synthetic corpora (benchmarks/synthetic.py) at several
+                scales of the real one (1 = ~1,750 speeches): parsing of the recorded pages, extraction through
+                the local stand-in server, tokenization and stopword filtering, lemmatization, the document-term
+                matrix, TF-IDF pruning, LDA training, the Data Preview aggregations, the word clouds and the
+                latency of the Dash callbacks through the Flask test client. Every scale runs in a fresh
+                process, which imports app.py on the synthetic snapshot. Stages whose resources are missing
+                (NLTK data, spaCy model) are reported as skipped.
+
+                Every case is timed `repeat` times (first, median and minimum seconds). The results are saved
+                in benchmarks/results/<commit>.json, one entry per scale, and can be compared with the results
+                of another commit: cases slower than that by more than the tolerance are flagged and the exit
+                status is 1.
+
+                python benchmarks/suite.py --scales 1 10 100 --repeat 5
+                python benchmarks/suite.py --scales 1 --compare HEAD~3
+                python benchmarks/suite.py --scales 1 --cases dtm topics --data /tmp/corpora
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT       = os.path.join(BENCHMARKS, "..")
+RESULTS    = os.path.join(BENCHMARKS, "results")
+sys.path.insert(0, ROOT)
+from synthetic import NSPEECHES, make_snapshot, make_speeches
+
+# Resources that may not be installed: the cases needing them are skipped
+MISSING = (ImportError, LookupError, OSError)
+
+
+##============================##
+##           CASES            ##
+##============================##
+
+# Every case takes the synthetic speeches, the data snapshot and the scale, does its setup
+# and returns the function that is timed.
+
+def parse_pages(source):
+    def case(data, snap, scale):
+        from speechdb import parsing
+        from local_server import load_fixtures
+
+        fixtures = [page.decode("utf-8") for page in load_fixtures(source)]
+        pages    = [(f"https://example.org/{i}/", fixtures[i % len(fixtures)]) for i in range(len(data))]
+        return lambda: parsing.parse_batch(pages, source, processes = 1)
+    return case
+
+
+def fetch_canal4(data, snap, scale):
+    from speechdb import canal4
+    from speechdb.fetch import Fetcher
+    from local_server import LocalServer, load_fixtures
+
+    def run():
+        with LocalServer(load_fixtures("canal4"), latency = 0) as server:
+            with Fetcher(max_workers = 16, per_host = 16, rate = None) as fetcher:
+                urls = [server.url(f"speech-{i}/") for i in range(int(200 * scale))]
+                return canal4.extract_content(urls, fetcher = fetcher)
+    return run
+
+
+def preprocess_pipeline(data, snap, scale):
+    from speechdb import preprocess
+
+    pipeline = preprocess.Pipeline(preprocess.spanish_stopwords())
+    texts    = data["content"].tolist()
+    return lambda: sum(1 for _ in pipeline(texts))
+
+
+def lemmatize_spacy(data, snap, scale):
+    # spaCy is slow: a sample of 100 speeches per unit of scale, without the lemma cache
+    from speechdb import lemmatize
+
+    nlp   = lemmatize.load_model()
+    texts = data["content"].head(int(100 * scale)).tolist()
+    return lambda: lemmatize.lemmatize(texts, nlp)
+
+
+def dtm_build(data, snap, scale):
+    from speechdb import dtm
+
+    return lambda: dtm.build(snap)
+
+
+def dtm_prune(data, snap, scale):
+    from speechdb import dtm
+
+    doc_term = dtm.load(snap)
+    return lambda: doc_term.prune()
+
+
+def topics_lda(data, snap, scale):
+    # One LDA run on the speeches of Rosario Murillo, corpus preparation included
+    from speechdb import dtm, topics
+
+    dtm.load(snap)
+    path   = snap.file(dtm.FOLDER)
+    folder = tempfile.mkdtemp()
+    grid   = {"num_topics": [5], "alpha": ["symmetric"], "passes": [1]}
+
+    def run():
+        topics._corpora.cache_clear()
+        return topics.sweep(path, os.path.join(folder, "topics"), speakers = ("Rosario",), grid = grid,
+                            workers = 1)
+    return run
+
+
+def speechdata_aggregate(data, snap, scale):
+    import app
+
+    return lambda: [app.data4app._select(speakers, "2017-01-01", "2021-12-31")
+                    for speakers in [None, ("Daniel",), ("Rosario",)]]
+
+
+def wordcloud(data, snap, scale):
+    import app
+
+    app.tokenized()
+    return lambda: [app.wordcloud_png.__wrapped__(speaker, None, None) for speaker in ["Daniel", "Rosario"]]
+
+
+def _callback(client, target, values):
+    # Request body of /_dash-update-component for the callback whose outputs include target,
+    # built from /_dash-dependencies, with the given input values
+    for dependency in client.get("/_dash-dependencies").get_json():
+        if target in dependency["output"]:
+            break
+    else:
+        raise KeyError(target)
+    outputs = [dict(zip(["id", "property"], output.rsplit(".", 1)))
+               for output in dependency["output"].strip(".").split("...")]
+    inputs  = [dict(item, value = value) for item, value in zip(dependency["inputs"], values)]
+    return {
+        "output"        : dependency["output"],
+        "outputs"       : outputs,
+        "inputs"        : inputs,
+        "changedPropIds": [f"{inputs[0]['id']}.{inputs[0]['property']}"],
+        "state"         : []
+    }
+
+
+def callback_filter_data(data, snap, scale):
+    # The cached selections are cleared before every request, so the figures are rendered again
+    import app
+
+    client = app.server.test_client()
+    body   = _callback(client, "wc-daniel.src", [["Daniel", "Rosario"], ["2017-01-01", "2021-12-31"]])
+
+    def run():
+        app.data4app.select.cache_clear()
+        response = client.post("/_dash-update-component", json = body)
+        assert response.status_code == 200, response.status_code
+    return run
+
+
+def callback_run_search(data, snap, scale):
+    import app
+
+    client = app.server.test_client()
+    body   = _callback(client, "search-summary.children", [1, "revolución", 0])
+    body["changedPropIds"] = ["search-query.value"]
+
+    def run():
+        app.search_page.cache_clear()
+        response = client.post("/_dash-update-component", json = body)
+        assert response.status_code == 200, response.status_code
+    return run
+
+
+CASES = {
+    "parse.canal4"          : parse_pages("canal4"),
+    "parse.radionicaragua"  : parse_pages("radionicaragua"),
+    "fetch.canal4"          : fetch_canal4,
+    "preprocess.pipeline"   : preprocess_pipeline,
+    "lemmatize.spacy"       : lemmatize_spacy,
+    "dtm.build"             : dtm_build,
+    "dtm.prune"             : dtm_prune,
+    "topics.lda"            : topics_lda,
+    "speechdata.aggregate"  : speechdata_aggregate,
+    "wordcloud.png"         : wordcloud,
+    "callback.filter_data"  : callback_filter_data,
+    "callback.run_search"   : callback_run_search
+}
+
+
+##============================##
+##          RUNNING           ##
+##============================##
+
+def time_case(case, data, snap, scale, repeat):
+    """
+    Returns the first, median and minimum seconds of `repeat` runs of a case, or the
+    reason it was skipped.
+    """
+    try:
+        run   = case(data, snap, scale)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    except MISSING as err:
+        reason = [line.strip() for line in str(err).splitlines() if any(c.isalnum() for c in line)]
+        return {"skipped": f"{type(err).__name__}: {reason[0] if reason else ''}"}
+    return {"first": times[0], "median": statistics.median(times), "min": min(times)}
+
+
+def run_scale(folder, scale, repeat, names):
+    """
+    Runs the cases on the synthetic corpus of a scale saved in folder (written first if
+    missing). Meant to run in its own process: app.py is imported on that snapshot.
+    """
+    from speechdb import snapshot
+
+    root = os.path.join(folder, "snapshot")
+    if os.path.exists(os.path.join(root, "CURRENT")):
+        data = make_speeches(scale)
+    else:
+        data = make_snapshot(folder, scale)
+    os.environ["SPEECHDB_SNAPSHOT"] = root
+    snap = snapshot.load(root)
+
+    results = {}
+    for name in names:
+        results[name] = time_case(CASES[name], data, snap, scale, repeat)
+        print(f"  {name:<22} {_format(results[name])}", file = sys.stderr, flush = True)
+    return results
+
+
+def _format(result):
+    if "skipped" in result:
+        return f"skipped ({result['skipped']})"
+    return f"median {result['median']:9.4f}s  min {result['min']:9.4f}s  first {result['first']:9.4f}s"
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd = ROOT, capture_output = True, text = True,
+                              check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+##============================##
+##          RESULTS           ##
+##============================##
+
+def save_results(commit, results, repeat):
+    """
+    Adds the results of every scale to benchmarks/results/<commit>.json and returns the path.
+    """
+    os.makedirs(RESULTS, exist_ok = True)
+    path = os.path.join(RESULTS, f"{commit}.json")
+    try:
+        with open(path, encoding = "utf-8") as file:
+            saved = json.load(file)
+    except (FileNotFoundError, ValueError):
+        saved = {"commit": commit, "scales": {}}
+    saved.update({
+        "dirty"   : bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "date"    : datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+        "machine" : {"python": platform.python_version(), "platform": platform.platform(),
+                     "processor": platform.processor(), "cpus": os.cpu_count()},
+        "repeat"  : repeat
+    })
+    for scale, cases in results.items():
+        saved["scales"].setdefault(scale, {}).update(cases)
+    with open(path, "w", encoding = "utf-8") as file:
+        json.dump(saved, file, indent = 1)
+    return path
+
+
+def compare(results, reference, tolerance):
+    """
+    Prints the ratio of the median times to those saved for the reference commit and
+    returns the number of cases slower than them by more than tolerance.
+    """
+    path = os.path.join(RESULTS, f"{reference}.json")
+    with open(path, encoding = "utf-8") as file:
+        saved = json.load(file)["scales"]
+
+    print(f"\nCompared with {reference}")
+    slower = 0
+    for scale, cases in results.items():
+        for name, result in cases.items():
+            before = saved.get(scale, {}).get(name, {})
+            if "median" not in result or "median" not in before:
+                continue
+            ratio = result["median"] / before["median"]
+            flag  = "slower" if ratio > 1 + tolerance else ("faster" if ratio < 1 - tolerance else "")
+            slower += flag == "slower"
+            print(f"  x{scale:<6} {name:<22} {before['median']:9.4f}s -> {result['median']:9.4f}s  "
+                  f"{ratio:6.2f}x  {flag}")
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark suite")
+    parser.add_argument("--scales",    type = float, nargs = "+", default = [1])
+    parser.add_argument("--repeat",    type = int,   default = 3)
+    parser.add_argument("--cases",     nargs = "+",  default = None,
+                        help = "cases to run, or prefixes of their names (e.g. callback)")
+    parser.add_argument("--data",      default = None, help = "folder keeping the synthetic corpora between runs")
+    parser.add_argument("--compare",   default = None, help = "commit to compare the results with")
+    parser.add_argument("--tolerance", type = float, default = 0.25)
+    parser.add_argument("--no-save",   action = "store_true")
+    parser.add_argument("--child",     nargs = 2, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    names = [name for name in CASES
+             if args.cases is None or any(name == case or name.startswith(f"{case}.") for case in args.cases)]
+
+    # Child process: runs one scale and writes its results to a json file
+    if args.child:
+        folder, output = args.child
+        results = run_scale(folder, args.scales[0], args.repeat, names)
+        with open(output, "w", encoding = "utf-8") as file:
+            json.dump(results, file)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for scale in args.scales:
+            key    = f"{scale:g}"
+            folder = os.path.join(args.data or tmp, f"scale-{key}")
+            output = os.path.join(tmp, f"results-{key}.json")
+            print(f"x{key} ({int(scale * NSPEECHES)} speeches)", file = sys.stderr, flush = True)
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--scales", str(scale), "--repeat", str(args.repeat),
+                 "--child", folder, output, *(["--cases", *names] if args.cases else [])],
+                cwd = ROOT, check = True
+            )
+            with open(output, encoding = "utf-8") as file:
+                results[key] = json.load(file)
+
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    if not args.no_save:
+        print(f"\nResults saved to {save_results(commit, results, args.repeat)}")
+    if args.compare:
+        reference = _git("rev-parse", "--short", args.compare) or args.compare
+        sys.exit(1 if compare(results, reference, args.tolerance) else 0)
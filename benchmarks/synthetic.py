@@ -0,0 +1,110 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Synthetic corpus
+Description:    Generator of synthetic speech corpora with the shape of the real one (~1,750 speeches, 93% of
+                them by Rosario Murillo, September 2015 to December 2023, ~2,200 and ~2,800 words on average),
+                used by the benchmarks. Speeches are random Spanish text drawn from a small vocabulary with a
+                Zipf-like distribution.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from speechdb import columnar, snapshot
+
+NSPEECHES = 1750
+
+WORDS = """
+nicaragua pueblo paz familias dios bendita hermanos hermanas comunidad trabajo salud educación
+gobierno revolución sandino soberanía dignidad justicia esperanza amor fe alegría victoria patria
+nacional nicaragüense país mundo vida madre tierra hospitales escuelas caminos agua energía
+producción campo cosecha mujeres jóvenes niñas niños seguridad policía ejército derechos pobreza
+igualdad imperio yanqui guerra historia memoria compañeros compañeras héroes mártires gloria
+bendiciones gracias cariño corazón unidad lucha libertad independencia hermandad cristianismo
+socialismo solidaridad municipios departamentos caribe costa norte occidente managua león granada
+masaya matagalpa estelí jinotega chinandega rivas boaco chontales carazo madriz nueva segovia
+jornadas brigadas vacunación protección atención médicos maestros estudiantes universidades
+""".split()
+STOPWORDS = "de la que el en y a los se del las un por con no una su para es al lo como más".split()
+
+
+def _vocabulary(size, seed):
+    """
+    Real-looking words plus generated ones, with Zipf-like probabilities.
+    """
+    rng   = np.random.default_rng(seed)
+    extra = ["".join(rng.choice(list("abcdefghijlmnoprstuv"), size = rng.integers(4, 11))) for _ in range(size)]
+    vocab = STOPWORDS + WORDS + extra
+    probs = 1 / np.arange(1, len(vocab) + 1) ** 1.07
+    return np.array(vocab), probs / probs.sum()
+
+
+def make_speeches(scale = 1, seed = 2023, words_scale = 1.0):
+    """
+    Returns a dataframe like speech_data.csv with NSPEECHES * scale speeches.
+    """
+    rng    = np.random.default_rng(seed)
+    n      = int(NSPEECHES * scale)
+    vocab, probs = _vocabulary(5000, seed)
+
+    speaker = np.where(rng.random(n) < 0.93, "Rosario", "Daniel")
+    dates   = pd.to_datetime(rng.integers(
+        pd.Timestamp("2015-09-01").value // 86400_000_000_000,
+        pd.Timestamp("2023-12-31").value // 86400_000_000_000,
+        size = n
+    ), unit = "D")
+    lengths = np.maximum(50, rng.normal(np.where(speaker == "Daniel", 2800, 2200), 600) * words_scale).astype(int)
+
+    contents = []
+    for length in lengths:
+        words = rng.choice(vocab, size = length, p = probs)
+        contents.append(" ".join(words))
+
+    data = pd.DataFrame({
+        "headline"    : [f"Compañera Rosario Murillo: mensaje {i}" if sp == "Rosario"
+                         else f"Discurso del Comandante Daniel Ortega {i}"
+                         for i, sp in enumerate(speaker)],
+        "date"        : dates,
+        "content"     : contents,
+        "url"         : [f"https://www.canal4.com.ni/speech-{i}/" for i in range(n)],
+        "spoke_person": speaker
+    })
+    data["nwords"] = data["content"].str.split().str.len()
+    return data
+
+
+def make_tokens(data):
+    """
+    Pseudo-lemmatized speeches: lowercased words without stopwords.
+    """
+    stop = set(STOPWORDS)
+    return [[word for word in content.split() if word not in stop] for content in data["content"]]
+
+
+def make_snapshot(folder, scale = 1, seed = 2023, words_scale = 1.0):
+    """
+    Writes speeches.parquet and tokens/ for a synthetic corpus into folder and builds a data
+    snapshot (folder/snapshot) from them. Returns the speech dataframe.
+    """
+    os.makedirs(folder, exist_ok = True)
+    data = make_speeches(scale, seed, words_scale)
+    columnar.write_speeches(data, os.path.join(folder, "speeches.parquet"))
+    columnar.write_tokens(os.path.join(folder, "tokens"), make_tokens(data), data.assign(speech_id = data.index))
+    snapshot.build_snapshot(folder)
+    return data
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Writes a synthetic data snapshot")
+    parser.add_argument("folder")
+    parser.add_argument("--scale", type = float, default = 1)
+    args = parser.parse_args()
+
+    data = make_snapshot(args.folder, args.scale)
+    print(f"{len(data)} synthetic speeches written to {args.folder}")
@@ -0,0 +1,6 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         speechdb
+Description:    Shared building blocks for the extraction scripts, the processing notebooks and the Dash app.
+                Scripts living under Code/ add the repository root to sys.path before importing from here.
+"""
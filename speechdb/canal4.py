@@ -0,0 +1,147 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Canal 4 extraction
+Description:    Fetching and parsing of the speech transcripts published on www.canal4.com.ni.
+                Used by Code/1_web_scrapping/C4-extraction.py
+"""
+
+import time
+from datetime import datetime
+
+import pandas as pd
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from speechdb import metrics
+from speechdb.fetch import HEADERS, Fetcher, FetchResult, record_response
+from speechdb.parsing import parse_batch, parse_canal4 as parse_article
+
+SOURCE  = "canal4"
+COLUMNS = ["headline", "date", "content", "url"]
+
+
+def _sequential_fetch(url_list, headers_for = None):
+    """
+    Original fetching behaviour: one bare request every two seconds.
+    """
+    for url_link in url_list:
+        time.sleep(2)
+        headers = dict(HEADERS, **(headers_for(url_link) if headers_for else {}))
+        try:
+            response = requests.get(url_link, headers = headers)
+        except requests.RequestException as err:
+            record_response(url_link, None, 0, 0)
+            yield FetchResult(url_link, None, None, CaseInsensitiveDict(), 0, repr(err))
+            continue
+        record_response(url_link, response.status_code, len(response.content), response.elapsed.total_seconds())
+        yield FetchResult(url_link, response.status_code, response.text, CaseInsensitiveDict(response.headers),
+                          response.elapsed.total_seconds(), None)
+
+
+def _record(speech):
+    return dict(speech, date = speech["date"].isoformat())
+
+
+def _speech(record):
+    return dict(record, date = datetime.strptime(record["date"], "%Y-%m-%d").date())
+
+
+def extract_content(url_list, mode = "concurrent", fetcher = None, manifest = None,
+                    revalidate = False, store = None, **fetcher_args):
+    """
+    Takes a list of URLs and returns a dataframe with the content extracted
+    from the URL.
+
+    Title, date, content and URL.
+
+    mode = "concurrent" fetches the pages through a Fetcher (pooled connections, per-host
+    concurrency cap and requests-per-second budget, see speechdb.fetch). Extra keyword
+    arguments are passed to the Fetcher. mode = "sequential" keeps the original
+    one-request-every-two-seconds behaviour.
+
+    When a CrawlManifest is given, every parsed page is written to it as soon as it
+    arrives and URLs already finished in a previous run are skipped. With
+    revalidate = True those URLs are requested again with conditional headers, so
+    unchanged pages come back as 304 responses and keep their stored record.
+
+    When an HtmlStore is given, the source code of every page is saved to it before
+    parsing, so the dataset can be rebuilt later with replay(). Finished URLs missing
+    from the store (e.g. crawled before the store was added) are requested again,
+    without conditional headers, so the store covers the whole crawl.
+    """
+
+    if mode not in ("concurrent", "sequential"):
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    url_list    = list(url_list)
+    to_fetch    = manifest.pending(url_list, revalidate) if manifest else url_list
+    headers_for = manifest.conditional_headers if manifest else None
+    if manifest and store is not None:
+        unstored    = set(store.missing(url_list))
+        pending     = set(to_fetch)
+        to_fetch    = [url for url in dict.fromkeys(url_list) if url in pending or url in unstored]
+        headers_for = lambda url: {} if url in unstored else manifest.conditional_headers(url)
+    results     = {}
+
+    own_fetcher = mode == "concurrent" and fetcher is None
+    if own_fetcher:
+        fetcher = Fetcher(**fetcher_args)
+    try:
+        with metrics.stage("extract", source = SOURCE, mode = mode) as stage:
+            if mode == "sequential":
+                responses = _sequential_fetch(to_fetch, headers_for)
+            else:
+                responses = fetcher.iter_fetch(to_fetch, headers_for)
+
+            for res in responses:
+                stage.count(pages = 1)
+                if res.status == 304 and manifest:
+                    manifest.record_not_modified(res.url)
+                    stage.count(not_modified = 1)
+                    continue
+                if res.status != 200:
+                    print(f"Not able to fetch {res.url} ({res.status or res.error})")
+                    if manifest:
+                        manifest.record_failure(res.url, res.status, res.error)
+                    stage.count(failures = 1)
+                    continue
+                stage.count(bytes = len(res.text.encode("utf-8")))
+                if store is not None:
+                    store.put(res.url, res.text, source = SOURCE)
+                try:
+                    speech = parse_article(res.text, res.url)
+                except ValueError as err:
+                    print(f"Not able to parse {res.url}: {err}")
+                    if manifest:
+                        manifest.record_failure(res.url, res.status, "parse error")
+                    stage.count(failures = 1)
+                    continue
+                if manifest:
+                    manifest.record_success(res.url, res.status, res.headers, _record(speech))
+                results[res.url] = speech
+                stage.count(speeches = 1)
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    # Converting to Data Frame, previously finished pages come from the manifest
+    if manifest:
+        speeches = [_speech(record) for record in manifest.records(url_list)]
+    else:
+        speeches = [results[url] for url in url_list if url in results]
+    data = pd.DataFrame(speeches, columns = COLUMNS)
+
+    return data
+
+
+def replay(store, url_list = None, processes = None):
+    """
+    Rebuilds the dataframe returned by extract_content from the pages saved in an
+    HtmlStore, without any network access. Takes every Canal 4 page in the store
+    if no list of URLs is given. Parsing is spread over `processes` worker processes.
+    """
+
+    pages = store.iter_pages(source = SOURCE, urls = url_list)
+    data  = pd.DataFrame(parse_batch(pages, SOURCE, processes = processes), columns = COLUMNS)
+
+    return data
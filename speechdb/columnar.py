@@ -0,0 +1,284 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Columnar storage
+Description:    Compact storage for the speeches and their lemmatized tokens, replacing speech_data.csv and
+                tklem_speeches.json.
+
+                - Speeches go to a Parquet file with typed columns (date32 dates, dictionary-encoded speaker),
+                  sorted by speaker and date, so row-group statistics let readers load a single speaker or
+                  date range without reading the whole file.
+                - Tokens go to a folder with a shared interned vocabulary (vocab.txt), the token ids of every
+                  speech concatenated in an int32 array (ids.npy), the per-speech offsets into that array
+                  (offsets.npy) and the speech metadata (docs.parquet). The arrays are memory-mapped when
+                  read from disk, and nothing is read (or downloaded) before the tokens are first used.
+
+                Until both artifacts are published, they can be written from the published speech_data.csv
+                and tklem_speeches.json (write_legacy).
+"""
+
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+SPEECH_SCHEMA = pa.schema([
+    ("speech_id",    pa.int32()),
+    ("spoke_person", pa.dictionary(pa.int8(), pa.string())),
+    ("date",         pa.date32()),
+    ("headline",     pa.string()),
+    ("nwords",       pa.int32()),
+    ("content",      pa.string()),
+    ("url",          pa.string())
+])
+
+
+def _is_url(path):
+    return str(path).startswith(("http://", "https://"))
+
+
+def _open(path):
+    """
+    Returns something pyarrow/numpy can read: the path itself, or the downloaded bytes of a URL.
+    """
+    if _is_url(path):
+        response = requests.get(path, timeout = 60)
+        response.raise_for_status()
+        return io.BytesIO(response.content)
+    return path
+
+
+def _filters(speakers = None, start = None, end = None):
+    filters = []
+    if speakers is not None:
+        filters.append(("spoke_person", "in", list(speakers)))
+    if start is not None:
+        filters.append(("date", ">=", pd.Timestamp(start).date()))
+    if end is not None:
+        filters.append(("date", "<=", pd.Timestamp(end).date()))
+    return filters or None
+
+
+##============================##
+##          SPEECHES          ##
+##============================##
+
+def write_speeches(df, path, row_group_size = 128):
+    """
+    Writes the speech data (as produced by 1_text_processing.ipynb) to a Parquet file.
+    The speech_id column is taken from the dataframe index if missing.
+    """
+    data = df.copy()
+    if "speech_id" not in data.columns:
+        data["speech_id"] = data.index
+    if "nwords" not in data.columns:
+        data["nwords"] = data["content"].apply(lambda x: len(str(x).split()))
+    data["date"] = pd.to_datetime(data["date"]).dt.date
+    data = data.sort_values(["spoke_person", "date", "speech_id"])
+
+    table = pa.Table.from_pandas(data[SPEECH_SCHEMA.names], schema = SPEECH_SCHEMA, preserve_index = False)
+    pq.write_table(table, path, row_group_size = row_group_size, compression = "zstd")
+
+
+def read_speeches(path, speakers = None, start = None, end = None, columns = None):
+    """
+    Reads the speech data from a Parquet file (local path or URL). Only the row groups
+    of the requested speakers and date range are read. Dates come back as datetime64.
+    """
+    table = pq.read_table(_open(path), columns = columns, filters = _filters(speakers, start, end))
+    data  = table.to_pandas()
+    if "date" in data.columns:
+        data["date"] = pd.to_datetime(data["date"])
+    if "spoke_person" in data.columns:
+        data["spoke_person"] = data["spoke_person"].astype(str)
+    return data
+
+
+def speech_keys(path):
+    """
+    Stable key of every speech of a speeches.parquet file, as a series indexed by speech_id.
+    speech_id is the row position in speech_data.csv and shifts when new speeches are added;
+    the key is a hash of the URL and the text, so it survives data updates and changes
+    when the text of a speech changes.
+    """
+    data = read_speeches(path, columns = ["speech_id", "url", "content"])
+    keys = [hashlib.sha256(f"{url}\0{content}".encode("utf-8")).hexdigest()[:16]
+            for url, content in zip(data["url"].fillna(""), data["content"].fillna(""))]
+    return pd.Series(keys, index = data["speech_id"].to_numpy(), name = "key")
+
+
+##============================##
+##           TOKENS           ##
+##============================##
+
+def write_tokens(path, docs, meta):
+    """
+    Writes lemmatized speeches to a token store folder.
+
+    docs:   list with the list of tokens of every speech.
+    meta:   dataframe aligned with docs, with speech_id, spoke_person and date columns.
+    """
+    os.makedirs(path, exist_ok = True)
+
+    meta = meta[["speech_id", "spoke_person", "date"]].reset_index(drop = True).copy()
+    meta["date"] = pd.to_datetime(meta["date"]).dt.date
+    order = meta.sort_values(["spoke_person", "date", "speech_id"]).index
+
+    vocab   = {}
+    ids     = []
+    offsets = [0]
+    for i in order:
+        ids.extend(vocab.setdefault(token, len(vocab)) for token in docs[i])
+        offsets.append(len(ids))
+
+    with open(os.path.join(path, "vocab.txt"), "w", encoding = "utf-8") as file:
+        file.write("\n".join(vocab))
+    np.save(os.path.join(path, "ids.npy"), np.asarray(ids, dtype = np.int32))
+    np.save(os.path.join(path, "offsets.npy"), np.asarray(offsets, dtype = np.int64))
+    pq.write_table(
+        pa.Table.from_pandas(meta.loc[order], preserve_index = False),
+        os.path.join(path, "docs.parquet")
+    )
+
+
+class TokenStore:
+    """
+    Read access to a token store folder (local path or URL). Documents are sorted by
+    speaker and date, so a speaker or a date range is a contiguous slice of them.
+    """
+
+    FIELDS = ("vocab", "ids", "offsets", "docs")
+
+    def __init__(self, vocab, ids, offsets, docs):
+        self.vocab   = vocab
+        self.ids     = ids
+        self.offsets = offsets
+        self.docs    = docs
+
+    @classmethod
+    def open(cls, path, mmap = True):
+        """
+        Opens a token store folder. The files are only read on first use.
+        """
+        store = cls.__new__(cls)
+        store._source = (path, mmap)
+        return store
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: the fields of a store opened with open()
+        source = self.__dict__.get("_source")
+        if name not in self.FIELDS or source is None:
+            raise AttributeError(name)
+        self.__dict__.update(zip(self.FIELDS, self._read(*source)))
+        return self.__dict__[name]
+
+    @staticmethod
+    def _read(path, mmap):
+        join = (lambda name: f"{path.rstrip('/')}/{name}") if _is_url(path) else (lambda name: os.path.join(path, name))
+        mode = "r" if mmap and not _is_url(path) else None
+
+        source = _open(join("vocab.txt"))
+        if isinstance(source, io.BytesIO):
+            vocab = source.read().decode("utf-8").split("\n")
+        else:
+            with open(source, encoding = "utf-8") as file:
+                vocab = file.read().split("\n")
+
+        ids     = np.load(_open(join("ids.npy")), mmap_mode = mode)
+        offsets = np.load(_open(join("offsets.npy")), mmap_mode = mode)
+        docs    = pq.read_table(_open(join("docs.parquet"))).to_pandas()
+        docs["date"] = pd.to_datetime(docs["date"])
+        return vocab, ids, offsets, docs
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def doc_ids(self, i):
+        """
+        Token ids of the i-th document.
+        """
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def doc(self, i):
+        """
+        Tokens of the i-th document.
+        """
+        return [self.vocab[t] for t in self.doc_ids(i)]
+
+    def select(self, speaker = None, start = None, end = None):
+        """
+        Returns the positions of the documents of a speaker (every speaker if None)
+        within a date range.
+        """
+        mask = np.ones(len(self), dtype = bool)
+        if speaker is not None:
+            mask &= (self.docs["spoke_person"] == speaker).to_numpy()
+        if start is not None:
+            mask &= (self.docs["date"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (self.docs["date"] <= pd.Timestamp(end)).to_numpy()
+        return np.flatnonzero(mask)
+
+    def iter_docs(self, positions = None):
+        """
+        Yields the tokens of the given documents (all of them if None), one at a time.
+        """
+        for i in (range(len(self)) if positions is None else positions):
+            yield self.doc(i)
+
+    def to_nested(self):
+        """
+        Returns the tokens in the layout of the old tklem_speeches.json: a dictionary
+        with the list of lemmatized speeches of every speaker.
+        """
+        return {
+            speaker: list(self.iter_docs(self.select(speaker)))
+            for speaker in self.docs["spoke_person"].unique()
+        }
+
+
+##============================##
+##       LEGACY FILES         ##
+##============================##
+
+def read_speech_csv(path):
+    """
+    Reads speech_data.csv (local path or URL), as saved by 1_text_processing.ipynb: the
+    first column is the row index, kept as speech_id.
+    """
+    data = pd.read_csv(_open(path), index_col = 0)
+    data["date"] = pd.to_datetime(data["date"], format = "%Y-%m-%d")
+    return data.rename_axis("speech_id").reset_index()
+
+
+def write_legacy(folder, speeches_csv, tokens_json):
+    """
+    Writes speeches.parquet and tokens/ into folder from speech_data.csv and
+    tklem_speeches.json (local paths or URLs). The lemmatized speeches of every speaker
+    follow the order of their rows in speech_data.csv.
+    """
+    data   = read_speech_csv(speeches_csv)
+    source = _open(tokens_json)
+    if isinstance(source, io.BytesIO):
+        nested = json.load(source)
+    else:
+        with open(source, encoding = "utf-8") as file:
+            nested = json.load(file)
+
+    docs, meta = [], []
+    for speaker, speeches in nested.items():
+        rows = data.loc[data["spoke_person"] == speaker]
+        if len(rows) != len(speeches):
+            raise ValueError(f"{len(speeches)} lemmatized speeches of {speaker} for {len(rows)} rows "
+                             f"of speech_data.csv")
+        docs.extend(speeches)
+        meta.append(rows)
+
+    os.makedirs(folder, exist_ok = True)
+    write_speeches(data, os.path.join(folder, "speeches.parquet"))
+    write_tokens(os.path.join(folder, "tokens"), docs, pd.concat(meta, ignore_index = True))
@@ -0,0 +1,293 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Near-duplicate detection
+Description:    MinHash signatures of the speech transcripts and LSH banding to find the near-duplicates that the
+                sources publish more than once (joint speeches listed in both Canal 4 feeds, transcripts
+                republished by Radio Nicaragua). Every transcript is shingled into hashed word 5-grams and
+                summarized by `num_perm` minimum hashes; two transcripts whose signatures agree on all the rows
+                of one band land in the same bucket, and only those candidates are compared, so the cost grows
+                linearly with the number of speeches. A candidate is a duplicate if the estimated Jaccard
+                similarity of their shingles is at least `threshold`.
+
+                Every source has its own index, saved in a folder of Data/dedup/ (e.g. Data/dedup/canal4/):
+                    signatures.npy      MinHash signature of every indexed speech (uint64, n x num_perm)
+                    records.parquet     key (URL) of every indexed speech, key of its canonical speech and
+                                        the estimated similarity to it
+                    matches.csv         speeches of the last batch that match a speech of another source
+                    FORMAT              format and options of the index
+                Speeches are only dropped as duplicates of the same source, so the order in which the sources
+                are extracted does not matter; matches across sources are reported in matches.csv and left to
+                the analysis. Every transcript is hashed once and speeches already in the index keep their
+                decision, except while their canonical record is not in the batch: they are then matched again
+                among the speeches of the batch (the longest one of a cluster is kept).
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from speechdb import metrics
+
+FORMAT = 2
+WORDS  = re.compile(r"\w+")
+BASE   = np.uint64(1_000_003)
+EMPTY  = np.uint64(2 ** 64 - 1)
+
+
+def _word_hashes(words):
+    # Polynomial hash of the characters of every word, over their padded UTF-32 codes (padding skipped)
+    codes  = np.array(words).view(np.uint32).reshape(len(words), -1).astype(np.uint64)
+    hashes = np.zeros(len(words), dtype = np.uint64)
+    for column in codes.T:
+        hashes = np.where(column > 0, hashes * BASE + column, hashes)
+    return hashes
+
+
+def shingles(text, size = 5):
+    """
+    Hashes (32 bits) of the distinct word `size`-grams of a text, lowercased.
+    """
+    words = WORDS.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype = np.uint64)
+    hashes = _word_hashes(words)
+    if len(hashes) >= size:
+        grams = np.zeros(len(hashes) - size + 1, dtype = np.uint64)
+        for j in range(size):
+            grams = grams * BASE + hashes[j:len(hashes) - size + 1 + j]
+        hashes = grams
+    return np.unique((hashes >> np.uint64(32)) ^ (hashes & np.uint64(0xFFFFFFFF)))
+
+
+class DedupIndex:
+    """
+    MinHash signatures and LSH buckets of the indexed speeches, with the canonical record of
+    every one of them.
+    """
+
+    def __init__(self, num_perm = 128, bands = 32, shingle = 5, threshold = 0.7, seed = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.options    = {"num_perm": num_perm, "bands": bands, "shingle": shingle, "threshold": threshold,
+                           "seed": seed}
+        self.rows       = num_perm // bands
+        rng             = np.random.default_rng(seed)
+        self.a          = rng.integers(0, EMPTY, size = num_perm, dtype = np.uint64) | np.uint64(1)
+        self.b          = rng.integers(0, EMPTY, size = num_perm, dtype = np.uint64)
+        self.signatures = np.zeros((0, num_perm), dtype = np.uint64)
+        self.records    = pd.DataFrame({"key": pd.Series(dtype = str), "canonical": pd.Series(dtype = str),
+                                        "similarity": pd.Series(dtype = float)})
+        self.buckets    = [{} for _ in range(bands)]
+        self.positions  = {}
+
+    ##============================##
+    ##          STORAGE           ##
+    ##============================##
+
+    @classmethod
+    def open(cls, folder, **options):
+        """
+        Opens the index saved in folder, or a new empty one if there is none or it was
+        built with other options.
+        """
+        index = cls(**options)
+        try:
+            with open(os.path.join(folder, "FORMAT")) as file:
+                info = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return index
+        if info.get("format") != FORMAT or info.get("options") != index.options:
+            return index
+
+        index.signatures = np.load(os.path.join(folder, "signatures.npy"))
+        index.records    = pd.read_parquet(os.path.join(folder, "records.parquet"))
+        for position, signature in enumerate(index.signatures):
+            index._insert(position, signature)
+        index.positions = {key: position for position, key in enumerate(index.records["key"])}
+        return index
+
+    def save(self, folder):
+        parent  = os.path.dirname(os.path.abspath(folder))
+        os.makedirs(parent, exist_ok = True)
+        staging = tempfile.mkdtemp(dir = parent)
+        try:
+            np.save(os.path.join(staging, "signatures.npy"), self.signatures)
+            self.records.to_parquet(os.path.join(staging, "records.parquet"), index = False)
+            with open(os.path.join(staging, "FORMAT"), "w") as file:
+                json.dump({"format": FORMAT, "options": self.options}, file)
+            shutil.rmtree(folder, ignore_errors = True)
+            os.replace(staging, folder)
+        finally:
+            shutil.rmtree(staging, ignore_errors = True)
+
+    ##============================##
+    ##        SIGNATURES          ##
+    ##============================##
+
+    def signature(self, text):
+        """
+        MinHash signature of a text (all values EMPTY if it has no words). The permutations
+        are multiply-shift hashes: the top 32 bits of a * x + b (mod 2^64).
+        """
+        hashes = shingles(text, self.options["shingle"])
+        if not len(hashes):
+            return np.full(len(self.a), EMPTY, dtype = np.uint64)
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) >> np.uint64(32)).min(axis = 1)
+
+    def _bands(self, signature):
+        for band in range(len(self.buckets)):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _insert(self, position, signature):
+        if (signature == EMPTY).all():
+            return
+        for band, key in self._bands(signature):
+            self.buckets[band].setdefault(key, []).append(position)
+
+    def _candidates(self, signature):
+        if (signature == EMPTY).all():
+            return []
+        found = set()
+        for band, key in self._bands(signature):
+            found.update(self.buckets[band].get(key, ()))
+        return sorted(found)
+
+    ##============================##
+    ##          MATCHING          ##
+    ##============================##
+
+    def add(self, keys, texts):
+        """
+        Indexes the speeches not indexed yet and returns, for every key, its canonical key
+        within the batch and the estimated similarity to it (1 for canonical records), as a
+        dataframe.
+        """
+        keys  = list(keys)
+        texts = list(texts)
+        new   = []
+        for i, key in enumerate(keys):
+            if key not in self.positions:
+                self.positions[key] = None
+                new.append(i)
+        # Longest transcripts first: within a batch they become the canonical records
+        new.sort(key = lambda i: -len(texts[i]))
+
+        indexed    = len(self.signatures)
+        signatures = np.zeros((len(new), len(self.a)), dtype = np.uint64)
+        records    = []
+        for n, i in enumerate(new):
+            signature = self.signature(texts[i])
+            position  = indexed + n
+            canonical, similarity = keys[i], 1.0
+
+            candidates = np.array(self._candidates(signature), dtype = np.int64)
+            if len(candidates):
+                old    = candidates[candidates < indexed]
+                pool   = np.concatenate([self.signatures[old], signatures[candidates[candidates >= indexed] - indexed]])
+                scores = (pool == signature).mean(axis = 1)
+                best   = int(np.argmax(scores))
+                if scores[best] >= self.options["threshold"]:
+                    match = int(candidates[best])
+                    match = self.records["canonical"].iat[match] if match < indexed \
+                            else records[match - indexed]["canonical"]
+                    canonical, similarity = match, float(scores[best])
+
+            signatures[n] = signature
+            records.append({"key": keys[i], "canonical": canonical, "similarity": similarity})
+            self._insert(position, signature)
+            self.positions[keys[i]] = position
+
+        if records:
+            self.signatures = np.concatenate([self.signatures, signatures])
+            self.records    = pd.concat([self.records, pd.DataFrame(records)], ignore_index = True)
+        return self._batch(keys, texts)
+
+    def _batch(self, keys, texts):
+        # Records of the batch. Duplicates whose canonical record is not in the batch are matched
+        # again among the canonical records of the batch (longest first, so the longest speech of
+        # a cluster is kept); the index keeps the original decisions for when it comes back
+        batch   = set(keys)
+        records = self.records.iloc[[self.positions[key] for key in keys]].reset_index(drop = True)
+        indexed = self.records["key"].to_numpy(dtype = object)
+        current = dict(zip(indexed, self.records["canonical"]))
+        orphans = [i for i in range(len(keys)) if current[keys[i]] != keys[i] and current[keys[i]] not in batch]
+        orphans.sort(key = lambda i: -len(texts[i]))
+        for i in orphans:
+            position  = self.positions[keys[i]]
+            signature = self.signatures[position]
+            match, similarity = keys[i], 1.0
+            candidates = [c for c in self._candidates(signature)
+                          if c != position and indexed[c] in batch and current[indexed[c]] == indexed[c]]
+            if candidates:
+                scores = (self.signatures[candidates] == signature).mean(axis = 1)
+                best   = int(np.argmax(scores))
+                if scores[best] >= self.options["threshold"]:
+                    match, similarity = indexed[candidates[best]], float(scores[best])
+            current[keys[i]] = match
+            records.loc[i, ["canonical", "similarity"]] = [match, similarity]
+        return records
+
+    def query(self, texts):
+        """
+        Best match of every text among the indexed speeches, without indexing them: the
+        canonical key of the matched speech (None if none reaches the threshold) and the
+        estimated similarity, as a dataframe.
+        """
+        matches = []
+        for text in texts:
+            signature  = self.signature(text)
+            candidates = self._candidates(signature)
+            match, similarity = None, 0.0
+            if candidates:
+                scores = (self.signatures[candidates] == signature).mean(axis = 1)
+                best   = int(np.argmax(scores))
+                if scores[best] >= self.options["threshold"]:
+                    match, similarity = self.records["canonical"].iat[candidates[best]], float(scores[best])
+            matches.append({"match": match, "similarity": similarity})
+        return pd.DataFrame(matches, columns = ["match", "similarity"])
+
+
+def cross_matches(data, folder, source, key = "url", text = "content", **options):
+    """
+    Speeches of data that match a speech of another source indexed in folder: their key,
+    the other source, the key of its canonical speech there and the similarity.
+    """
+    found = []
+    texts = data[text].fillna("").astype(str)
+    for other in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+        if other == source or not os.path.exists(os.path.join(folder, other, "FORMAT")):
+            continue
+        matches = DedupIndex.open(os.path.join(folder, other), **options).query(texts)
+        matched = matches["match"].notna().to_numpy()
+        found.append(matches.loc[matched].assign(key = data[key].to_numpy()[matched], source = other))
+    columns = ["key", "source", "match", "similarity"]
+    return pd.concat(found, ignore_index = True)[columns] if found else pd.DataFrame(columns = columns)
+
+
+def deduplicate(data, folder, source, key = "url", text = "content", **options):
+    """
+    Returns the rows of data that are canonical records among the speeches of the same
+    source (keeps the first row of repeated keys), indexing the new ones in the index of
+    the source (folder/source), which is updated. Matches with the speeches of the other
+    sources indexed in folder are saved in folder/source/matches.csv.
+    """
+    with metrics.stage("dedup", source = source) as stage:
+        path    = os.path.join(folder, source)
+        index   = DedupIndex.open(path, **options)
+        data    = data.drop_duplicates(subset = key)
+        records = index.add(data[key], data[text].fillna("").astype(str))
+        keep    = (records["canonical"] == records["key"]).to_numpy()
+        data    = data.loc[keep]
+
+        matches = cross_matches(data, folder, source, key, text, **options)
+        index.save(path)
+        matches.to_csv(os.path.join(path, "matches.csv"), index = False, encoding = "utf-8")
+        stage.count(speeches = len(keep), duplicates = int((~keep).sum()), cross_source = len(matches))
+    print(f"{(~keep).sum()} near-duplicate speeches removed out of {len(keep)}, "
+          f"{len(matches)} also published by another source (see {os.path.join(path, 'matches.csv')})")
+    return data
@@ -0,0 +1,234 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Canal 4 link discovery
+Description:    Browserless discovery of speech URLs on www.canal4.com.ni. Links are enumerated over plain
+                HTTP through the WordPress REST API, the WordPress sitemaps or the paginated listing pages,
+                fetching several pages in parallel and stopping as soon as we reach links we already know
+                (Data/rmdo_links_*.csv). The Selenium pagination loop in C4-extraction.py remains as a
+                fallback when every backend fails.
+"""
+
+import glob
+import json
+import os
+import re
+
+import pandas as pd
+from lxml import etree, html as lxml_html
+
+from speechdb import metrics
+from speechdb.fetch import Fetcher
+
+BASE_URL = "https://www.canal4.com.ni"
+
+# Listing pages, WordPress category slugs and sitemap slug patterns for every target. Sitemaps
+# do not tell categories apart, so the speeches of a target are picked by their slug: joint
+# speeches name Daniel, messages of Rosario Murillo alone do not
+SOURCES = {
+    "romu": {
+        "listing" : f"{BASE_URL}/rosario-murillo/",
+        "category": "rosario-murillo",
+        "sitemap" : r"^(?!.*(daniel|comandante)).*(rosario-murillo|vicepresidenta)",
+        "npages"  : 150
+    },
+    "rmdo": {
+        "listing" : f"{BASE_URL}/discurso-daniel-y-rosario/",
+        "category": "discurso-daniel-y-rosario",
+        "sitemap" : r"daniel|comandante",
+        "npages"  : 28
+    }
+}
+
+# Slugs of the speeches of any target, for the sitemaps when no target is given
+SITEMAP_PATTERN = r"rosario|daniel|comandante|presidente|vicepresidenta"
+SITEMAP_INDEXES = ["/wp-sitemap.xml", "/sitemap_index.xml", "/sitemap.xml"]
+SITEMAP_NS      = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+def load_known_links(path2data):
+    """
+    Returns the set of links already stored in the Data/rmdo_links*.csv files.
+    """
+    known = set()
+    for path in glob.glob(os.path.join(path2data, "rmdo_links*.csv")):
+        known.update(pd.read_csv(path).iloc[:, 0].dropna())
+    return known
+
+
+def parse_listing(source_code):
+    """
+    Takes the source code of a listing page and returns the article links in it, using
+    the same boxes as the Selenium loop (tg-row > tg-col-control > h3 > a) or, for
+    regular WordPress archives, the article titles.
+    """
+    tree  = lxml_html.fromstring(source_code)
+    links = tree.xpath(
+        "//div[contains(concat(' ', normalize-space(@class), ' '), ' tg-row ')]"
+        "//div[contains(concat(' ', normalize-space(@class), ' '), ' tg-col-control ')]"
+        "//h3//a/@href"
+    )
+    if not links:
+        links = tree.xpath("//article//*[self::h2 or self::h3]//a/@href")
+    return list(dict.fromkeys(links))
+
+
+def _paginate(fetcher, page_urls, parse, known, batch, fetched = ()):
+    """
+    Fetches pages in parallel batches and returns the new links found in them. Stops after
+    the first batch where a page fails, comes back empty or contains a known link. Returns
+    None if not a single page had links. `fetched` holds the responses of pages that were
+    already fetched (e.g. the first one), they are not requested again.
+    """
+    fetched   = {res.url: res for res in fetched}
+    links     = []
+    found_any = False
+    for i in range(0, len(page_urls), batch):
+        stop    = False
+        missing = [url for url in page_urls[i:i + batch] if url not in fetched]
+        results = {**fetched, **{res.url: res for res in fetcher.fetch_all(missing)}}
+        for res in (results[url] for url in page_urls[i:i + batch]):
+            found = parse(res.text) if res.status == 200 else []
+            if not found:
+                stop = True
+            found_any = found_any or bool(found)
+            for link in found:
+                if link in known:
+                    stop = True
+                elif link not in links:
+                    links.append(link)
+        print(f"Discovered {len(links)} new links after {min(i + batch, len(page_urls))} pages")
+        if stop:
+            break
+    return links if found_any else None
+
+
+def discover_rest(fetcher, target, known = (), batch = 8, per_page = 100):
+    """
+    Enumerates the posts of a category through the WordPress REST API. Returns None if
+    the API is not available.
+    """
+    res = fetcher.get(f"{BASE_URL}/wp-json/wp/v2/categories?slug={SOURCES[target]['category']}&_fields=id")
+    if res.status != 200:
+        return None
+    try:
+        categories = json.loads(res.text)
+    except ValueError:
+        return None
+    # Errors come back as a dictionary ({"code": ..., "message": ...}), even with a 200 status
+    if not isinstance(categories, list) or not categories or not isinstance(categories[0], dict) \
+            or "id" not in categories[0]:
+        return None
+
+    posts = f"{BASE_URL}/wp-json/wp/v2/posts?categories={categories[0]['id']}&per_page={per_page}&_fields=link"
+    first = fetcher.get(f"{posts}&page=1")
+    if first.status != 200:
+        return None
+    try:
+        npages = int(first.headers.get("X-WP-TotalPages", 1))
+    except (TypeError, ValueError):
+        return None
+    page_urls = [f"{posts}&page={page}" for page in range(1, npages + 1)]
+
+    def parse(text):
+        try:
+            return [post["link"] for post in json.loads(text)]
+        except (ValueError, KeyError, TypeError):
+            return []
+
+    return _paginate(fetcher, page_urls, parse, set(known), batch, fetched = [first])
+
+
+def _sitemap_locs(text, newest_first = False):
+    try:
+        root = etree.fromstring(text.encode("utf-8"))
+    except (etree.XMLSyntaxError, ValueError):
+        return []
+    entries = [(url.findtext(f"{SITEMAP_NS}loc", "").strip(), url.findtext(f"{SITEMAP_NS}lastmod", ""))
+               for url in root if url.findtext(f"{SITEMAP_NS}loc")]
+    if newest_first:
+        # Entries are listed oldest first; lastmod gives the order when there is one
+        entries = entries[::-1]
+        if all(lastmod for _, lastmod in entries):
+            entries.sort(key = lambda entry: entry[1], reverse = True)
+    return [loc for loc, _ in entries]
+
+
+def discover_sitemap(fetcher, target = None, known = (), pattern = None, batch = 8):
+    """
+    Enumerates the speech links of a target (any target if None) from the WordPress sitemaps,
+    newest first. Child sitemaps of posts are fetched from the newest in parallel batches,
+    their URLs are filtered by `pattern` (by default the slug pattern of the target) and
+    the walk stops at the first known link. Returns None if no sitemap is found.
+    """
+    children = []
+    for index in SITEMAP_INDEXES:
+        res = fetcher.get(BASE_URL + index)
+        if res.status == 200:
+            children = [loc for loc in _sitemap_locs(res.text) if "post" in loc and "page" not in loc]
+            if children:
+                break
+
+    if not children:
+        return None
+
+    # Child sitemaps are numbered from the oldest posts
+    children = children[::-1]
+    regex    = re.compile(pattern or (SOURCES[target]["sitemap"] if target else SITEMAP_PATTERN))
+    known    = set(known)
+    links    = []
+    for i in range(0, len(children), batch):
+        stop = False
+        for res in fetcher.fetch_all(children[i:i + batch]):
+            if stop or res.status != 200:
+                continue
+            for link in _sitemap_locs(res.text, newest_first = True):
+                if not regex.search(link):
+                    continue
+                if link in known:
+                    stop = True
+                    break
+                if link not in links:
+                    links.append(link)
+        if stop:
+            break
+    return links
+
+
+def discover_listing(fetcher, target, known = (), batch = 8):
+    """
+    Walks the paginated listing pages (<listing>/page/N/) in parallel batches.
+    """
+    listing   = SOURCES[target]["listing"]
+    page_urls = [listing] + [f"{listing}page/{page}/" for page in range(2, SOURCES[target]["npages"] + 1)]
+    return _paginate(fetcher, page_urls, parse_listing, set(known), batch)
+
+
+BACKENDS = {
+    "rest"   : discover_rest,
+    "sitemap": discover_sitemap,
+    "listing": discover_listing
+}
+
+
+def discover_links(target, known = (), backends = ("rest", "sitemap", "listing"), fetcher = None):
+    """
+    Returns the speech links for a target ("romu" or "rmdo") that are not in `known`, newest
+    first, using the first backend that works. Returns None if every backend failed, in
+    which case the Selenium loop is the last resort.
+    """
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = Fetcher()
+    try:
+        with metrics.stage("discover", source = "canal4", target = target) as stage:
+            for backend in backends:
+                links = BACKENDS[backend](fetcher, target, known = known)
+                if links is not None:
+                    print(f"Found {len(links)} new links for {target} through the {backend} backend")
+                    stage.labels["backend"] = backend
+                    stage.count(links = len(links))
+                    return links
+    finally:
+        if own_fetcher:
+            fetcher.close()
+    return None
@@ -0,0 +1,357 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Document-term matrix
+Description:    Per-speech term counts, counted once per data version and shared by every consumer (word
+                clouds, TF-IDF, topic models, trend queries). The counts are a CSR matrix (one row per speech,
+                one column per term) stored as memory-mappable arrays in a folder (dtm/ in the snapshot):
+                    indptr.npy      start of every row in indices/data (int32, or int64 for huge corpora)
+                    indices.npy     term ids (int32)
+                    data.npy        counts (int32)
+                    vocab.txt       terms
+                    docs.parquet    speech_id, spoke_person and date of every row
+                Rows follow the token store order (speaker, then date), so a speaker and date range selection
+                is a contiguous block of rows. Blocks are views of the arrays and convert to gensim corpora
+                (Sparse2Corpus) and dictionaries without copying the counts.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import sparse
+
+from speechdb import metrics
+
+FOLDER = "dtm"
+FORMAT = 2
+META   = ["speech_id", "spoke_person", "date"]
+
+
+def _index_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+def _block_order(docs):
+    """
+    Row order putting the documents of every speaker (in order of first appearance) in a
+    contiguous block sorted by date, keeping the order of ties. None if they already are.
+    """
+    speakers = pd.factorize(docs["spoke_person"])[0]
+    order    = np.lexsort((docs["date"].to_numpy(), speakers))
+    return None if np.array_equal(order, np.arange(len(order))) else order
+
+
+class DTM:
+    """
+    Document-term matrix: CSR arrays, vocabulary and the metadata of every document. When the
+    documents have a speaker and a date, the rows of every speaker must be contiguous and
+    sorted by date (ValueError otherwise), as built by from_ids and from_tokens.
+    """
+
+    def __init__(self, indptr, indices, data, vocab, docs = None):
+        self.indptr  = indptr
+        self.indices = indices
+        self.data    = data
+        self.vocab   = list(vocab)
+        self.docs    = docs if docs is not None else pd.DataFrame(index = range(len(indptr) - 1))
+
+        # Block of rows of every speaker and their dates, for the selections
+        self.blocks = {}
+        if "spoke_person" in self.docs.columns:
+            if _block_order(self.docs) is not None:
+                raise ValueError("The rows of every speaker must be contiguous and sorted by date")
+            speakers = self.docs["spoke_person"].to_numpy()
+            dates    = self.docs["date"].to_numpy()
+            for speaker in pd.unique(speakers):
+                rows = np.flatnonzero(speakers == speaker)
+                self.blocks[speaker] = (rows[0], dates[rows[0]:rows[-1] + 1])
+
+    ##============================##
+    ##     BUILDING & STORAGE     ##
+    ##============================##
+
+    @classmethod
+    def from_ids(cls, docs_ids, vocab, docs = None):
+        """
+        Builds the matrix from the token ids of every document (any iterable, consumed once).
+        When docs has the speaker and date of every document, the rows are ordered by
+        speaker (in order of first appearance) and date, along with docs.
+        """
+        indptr, indices, data = [0], [], []
+        for ids in docs_ids:
+            terms, counts = np.unique(np.asarray(ids, dtype = np.int64), return_counts = True)
+            indices.append(terms.astype(np.int32))
+            data.append(counts.astype(np.int32))
+            indptr.append(indptr[-1] + len(terms))
+        indptr  = np.asarray(indptr, dtype = _index_dtype(indptr[-1]))
+        indices = np.concatenate(indices) if indices else np.zeros(0, np.int32)
+        data    = np.concatenate(data) if data else np.zeros(0, np.int32)
+
+        order = _block_order(docs) if docs is not None and "spoke_person" in docs.columns else None
+        if order is not None:
+            lengths   = np.diff(indptr)[order]
+            starts    = np.repeat(indptr[:-1][order], lengths)
+            indptr    = np.concatenate([[0], np.cumsum(lengths)]).astype(indptr.dtype)
+            positions = starts + np.arange(indptr[-1]) - np.repeat(indptr[:-1], lengths)
+            indices, data = indices[positions], data[positions]
+            docs = docs.iloc[order].reset_index(drop = True)
+        return cls(indptr, indices, data, vocab, docs)
+
+    @classmethod
+    def from_tokens(cls, docs_tokens, docs = None):
+        """
+        Builds the matrix from the tokens of every document (any iterable, e.g. a
+        preprocess.StreamedCorpus, consumed once), interning the vocabulary on the way.
+        Rows are reordered by speaker and date like from_ids: use docs (e.g. its speech_id)
+        to match rows with documents, not the position of the tokens in docs_tokens.
+        """
+        vocab = {}
+        ids   = ([vocab.setdefault(token, len(vocab)) for token in tokens] for tokens in docs_tokens)
+        dtm   = cls.from_ids(ids, [], docs)
+        dtm.vocab = list(vocab)
+        return dtm
+
+    @classmethod
+    def from_token_store(cls, tokens):
+        """
+        Builds the matrix of a columnar.TokenStore, with its vocabulary and document order.
+        """
+        docs = tokens.docs[META].reset_index(drop = True)
+        return cls.from_ids((tokens.doc_ids(i) for i in range(len(tokens))), tokens.vocab, docs)
+
+    @classmethod
+    def open(cls, path, mmap = True):
+        mode    = "r" if mmap else None
+        indptr  = np.load(os.path.join(path, "indptr.npy"), mmap_mode = mode)
+        indices = np.load(os.path.join(path, "indices.npy"), mmap_mode = mode)
+        data    = np.load(os.path.join(path, "data.npy"), mmap_mode = mode)
+        with open(os.path.join(path, "vocab.txt"), encoding = "utf-8") as file:
+            vocab = file.read().split("\n")
+        docs = pq.read_table(os.path.join(path, "docs.parquet")).to_pandas()
+        if "date" in docs.columns:
+            docs["date"] = pd.to_datetime(docs["date"])
+        return cls(indptr, indices, data, vocab, docs)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok = True)
+        np.save(os.path.join(path, "indptr.npy"), np.asarray(self.indptr))
+        np.save(os.path.join(path, "indices.npy"), np.asarray(self.indices))
+        np.save(os.path.join(path, "data.npy"), np.asarray(self.data))
+        with open(os.path.join(path, "vocab.txt"), "w", encoding = "utf-8") as file:
+            file.write("\n".join(self.vocab))
+        docs = self.docs.copy()
+        if "date" in docs.columns:
+            docs["date"] = pd.to_datetime(docs["date"]).dt.date
+        pq.write_table(pa.Table.from_pandas(docs, preserve_index = False), os.path.join(path, "docs.parquet"))
+
+    ##============================##
+    ##         SELECTIONS         ##
+    ##============================##
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @cached_property
+    def term_ids(self):
+        return {term: i for i, term in enumerate(self.vocab)}
+
+    @property
+    def matrix(self):
+        """
+        The counts as a scipy CSR matrix (documents x terms), over the same arrays.
+        """
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), shape = (len(self), len(self.vocab)),
+                                 copy = False)
+
+    def rows(self, speaker = None, start = None, end = None):
+        """
+        Row ranges [lo, hi) of the documents of a speaker (every speaker if None) within a date range.
+        """
+        if not self.blocks:
+            return [(0, len(self))] if len(self) and start is None and end is None else []
+        ranges = []
+        for sp, (first, dates) in self.blocks.items():
+            if speaker is not None and sp != speaker:
+                continue
+            lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side = "left")
+            hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side = "right")
+            if hi > lo:
+                ranges.append((first + lo, first + hi))
+        return ranges
+
+    def block(self, lo, hi):
+        """
+        Rows lo to hi as a new DTM sharing the arrays (only the row pointers are copied).
+        """
+        indptr = np.asarray(self.indptr[lo:hi + 1])
+        a, b   = indptr[0], indptr[-1]
+        return DTM(indptr - a, self.indices[a:b], self.data[a:b], self.vocab,
+                   self.docs.iloc[lo:hi].reset_index(drop = True))
+
+    def select(self, speaker = None, start = None, end = None, compact = False):
+        """
+        The documents of a speaker (every speaker if None) within a date range. With
+        compact, only the terms used by those documents are kept (the counts are copied).
+        """
+        ranges = self.rows(speaker, start, end)
+        if len(ranges) == 1:
+            selected = self.block(*ranges[0])
+        else:
+            rows = np.concatenate([np.arange(lo, hi) for lo, hi in ranges]) if ranges else np.zeros(0, np.int64)
+            matrix = self.matrix[rows]
+            selected = DTM(matrix.indptr, matrix.indices, matrix.data, self.vocab,
+                           self.docs.iloc[rows].reset_index(drop = True))
+        return selected.compact() if compact else selected
+
+    def compact(self):
+        """
+        A copy without the terms that appear in no document.
+        """
+        used = np.unique(self.indices)
+        return DTM(np.asarray(self.indptr), np.searchsorted(used, self.indices).astype(np.int32),
+                   np.asarray(self.data), [self.vocab[i] for i in used], self.docs)
+
+    ##============================##
+    ##         CONSUMERS          ##
+    ##============================##
+
+    def counts(self, speaker = None, start = None, end = None):
+        """
+        Total count of every term over the documents of a speaker and date range.
+        """
+        total = np.zeros(len(self.vocab), dtype = np.int64)
+        for lo, hi in self.rows(speaker, start, end):
+            a, b   = self.indptr[lo], self.indptr[hi]
+            total += np.bincount(self.indices[a:b], weights = self.data[a:b], minlength = len(self.vocab)).astype(np.int64)
+        return total
+
+    def frequencies(self, speaker = None, start = None, end = None, top = 200):
+        """
+        Dictionary with the `top` most frequent terms of a selection and their counts.
+        """
+        total = self.counts(speaker, start, end)
+        top   = min(top, int(np.count_nonzero(total)))
+        if top == 0:
+            return {}
+        best = np.argpartition(-total, top - 1)[:top]
+        best = best[np.argsort(-total[best], kind = "stable")]
+        return {self.vocab[i]: int(total[i]) for i in best}
+
+    def document_frequencies(self):
+        """
+        Number of documents containing every term.
+        """
+        return np.bincount(self.indices, minlength = len(self.vocab))
+
+    def tfidf(self):
+        """
+        TF-IDF weights of the counts as a CSR matrix over the same rows and terms, with the
+        defaults of gensim's TfidfModel: count * log2(ndocs / document frequency), every
+        document normalized to unit length.
+        """
+        idf     = np.log2(len(self) / np.maximum(self.document_frequencies(), 1))
+        weights = np.asarray(self.data, dtype = np.float64) * idf[self.indices]
+        rows    = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        norms   = np.sqrt(np.bincount(rows, weights = weights ** 2, minlength = len(self)))
+        weights = weights / np.where(norms > 0, norms, 1)[rows]
+        return sparse.csr_matrix((weights, self.indices, self.indptr), shape = (len(self), len(self.vocab)),
+                                 copy = False)
+
+    def prune(self, low_value = 0.025, top = None):
+        """
+        Copy without the low value terms of every document: those with a TF-IDF weight below
+        `low_value` (terms in every document weigh 0 and are always dropped) and, with `top`,
+        all but the `top` highest weighted terms of each document (ties keep the lowest term id).
+        """
+        weights = self.tfidf().data
+        keep    = weights > 1e-12
+        if low_value is not None:
+            keep &= weights >= low_value
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        if top is not None:
+            order = np.lexsort((-weights, rows))
+            rank  = np.empty(len(order), dtype = np.int64)
+            rank[order] = np.arange(len(order)) - np.asarray(self.indptr)[rows[order]]
+            keep &= rank < top
+        lengths = np.bincount(rows[keep], minlength = len(self))
+        indptr  = np.concatenate([[0], np.cumsum(lengths)]).astype(np.asarray(self.indptr).dtype)
+        return DTM(indptr, np.asarray(self.indices)[keep], np.asarray(self.data)[keep], self.vocab, self.docs)
+
+    def trend(self, term, freq = "Q", speaker = None):
+        """
+        Occurrences of a term per period (e.g. quarter) and speaker, as a dataframe.
+        """
+        t = self.term_ids.get(term)
+        if t is None:
+            return pd.DataFrame(columns = ["period", "spoke_person", "count"])
+        found = np.flatnonzero(np.asarray(self.indices) == t)
+        rows  = np.searchsorted(np.asarray(self.indptr), found, side = "right") - 1
+        hits  = self.docs.iloc[rows].assign(count = np.asarray(self.data)[found])
+        if speaker is not None:
+            hits = hits.loc[hits["spoke_person"] == speaker]
+        return (
+            hits
+            .groupby([hits["date"].dt.to_period(freq).rename("period"), "spoke_person"])["count"]
+            .sum()
+            .reset_index()
+        )
+
+    def to_gensim(self):
+        """
+        Returns a gensim corpus (Sparse2Corpus over the same arrays) and a Dictionary
+        with the vocabulary and document frequencies of the matrix.
+        """
+        from gensim.corpora import Dictionary
+        from gensim.matutils import Sparse2Corpus
+
+        dictionary = Dictionary()
+        dictionary.token2id = dict(self.term_ids)
+        dictionary.dfs      = dict(enumerate(self.document_frequencies().tolist()))
+        dictionary.cfs      = dict(enumerate(np.bincount(self.indices, weights = self.data,
+                                                         minlength = len(self.vocab)).astype(np.int64).tolist()))
+        dictionary.num_docs = len(self)
+        dictionary.num_pos  = int(np.sum(self.data, dtype = np.int64))
+        dictionary.num_nnz  = len(self.indices)
+        return Sparse2Corpus(self.matrix, documents_columns = False), dictionary
+
+
+def build(snap):
+    """
+    Builds the document-term matrix of a data snapshot from its token store. Returns the folder.
+    """
+    target  = snap.file(FOLDER)
+    staging = tempfile.mkdtemp(dir = snap.path)
+    try:
+        with metrics.stage("dtm") as stage:
+            doc_term = DTM.from_token_store(snap.tokens)
+            doc_term.save(staging)
+            stage.count(speeches = len(doc_term), tokens = int(doc_term.data.sum()), terms = len(doc_term.vocab))
+        with open(os.path.join(staging, "FORMAT"), "w") as file:
+            json.dump({"format": FORMAT, "version": snap.version}, file)
+        shutil.rmtree(target, ignore_errors = True)
+        os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+    return target
+
+
+def load(snap):
+    """
+    Opens the document-term matrix of a data snapshot, building it first if it is missing
+    or was built by another version of this module.
+    """
+    try:
+        with open(os.path.join(snap.file(FOLDER), "FORMAT")) as file:
+            info = json.load(file)
+        if info.get("format") == FORMAT and info.get("version") == snap.version:
+            return DTM.open(snap.file(FOLDER))
+    except (FileNotFoundError, ValueError):
+        pass
+    build(snap)
+    return DTM.open(snap.file(FOLDER))
@@ -0,0 +1,209 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Data exports
+Description:    Export files of the speech data (csv.gz, Parquet and gzipped JSONL), built once per data
+                version and saved in the exports/ folder of the snapshot, so downloads are served as plain
+                files instead of being serialized on every click. Exports can be filtered by speaker and
+                date range (unknown speakers are rejected, file names are built from known speakers only);
+                filtered exports are built on first request (reading only the matching row groups of
+                speeches.parquet) and cached as well, within a number and a size limit. Cached
+                filtered exports are dropped least recently requested first, and never within a grace period
+                of their last request, so a file is not removed while it is being sent.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from functools import cached_property
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from speechdb import columnar
+
+FORMATS = {
+    "csv.gz"  : "text/csv",
+    "parquet" : "application/vnd.apache.parquet",
+    "jsonl.gz": "application/x-ndjson"
+}
+
+
+def _write_csv(table, path):
+    data = table.to_pandas()
+    data["date"] = pd.to_datetime(data["date"]).dt.strftime("%Y-%m-%d")
+    with gzip.open(path, "wt", encoding = "utf-8", newline = "") as file:
+        data.to_csv(file, index = False)
+
+
+def _write_parquet(table, path):
+    pq.write_table(table, path, compression = "zstd")
+
+
+def _write_jsonl(table, path):
+    data = table.to_pandas()
+    data["date"] = pd.to_datetime(data["date"]).dt.strftime("%Y-%m-%d")
+    with gzip.open(path, "wt", encoding = "utf-8") as file:
+        data.to_json(file, orient = "records", lines = True, force_ascii = False)
+
+
+WRITERS = {
+    "csv.gz"  : _write_csv,
+    "parquet" : _write_parquet,
+    "jsonl.gz": _write_jsonl
+}
+
+
+def _date(value):
+    if value in (None, ""):
+        return None
+    try:
+        return pd.Timestamp(value).date().isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def export_name(fmt, speakers = None, start = None, end = None):
+    """
+    File name of an export, e.g. speech_data_Rosario_2019-01-01_2020-12-31.csv.gz.
+    """
+    parts = ["speech_data"]
+    if speakers:
+        parts.append("+".join(re.sub(r"[^A-Za-z0-9-]", "", speaker) for speaker in sorted(speakers)))
+    if start or end:
+        parts.extend([start or "start", end or "end"])
+    return "_".join(parts) + "." + fmt
+
+
+class Exporter:
+    """
+    Builds and caches the exports of a data snapshot. At most `max_files` filtered exports
+    and `max_bytes` of them are kept (least recently requested first out, but none requested
+    in the last `grace` seconds); the full exports are always kept.
+    """
+
+    def __init__(self, snap, folder = None, max_files = 64, max_bytes = 512 * 2 ** 20, grace = 600):
+        self.snap      = snap
+        self.folder    = folder or snap.file("exports")
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.grace     = grace
+        self.lock      = threading.Lock()
+        self.building  = {}
+        try:
+            os.makedirs(self.folder, exist_ok = True)
+        except OSError:
+            self.folder = tempfile.mkdtemp(prefix = f"exports-{snap.version}-")
+
+    @cached_property
+    def speakers(self):
+        """
+        Speakers of the snapshot (only the spoke_person column is read).
+        """
+        table = pq.read_table(self.snap.file("speeches.parquet"), columns = ["spoke_person"])
+        return set(table.column("spoke_person").to_pylist())
+
+    def path(self, fmt = "csv.gz", speakers = None, start = None, end = None):
+        """
+        Returns the path of an export, building it if needed. Raises ValueError for
+        unknown formats or speakers and invalid dates.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        speakers = sorted(set(speakers)) if speakers else None
+        # File names drop the characters of the speakers other than letters, digits and dashes:
+        # only speakers of the data are accepted, so two filters never share a file
+        unknown = set(speakers or ()) - self.speakers
+        if unknown:
+            raise ValueError(f"Unknown speaker: {', '.join(sorted(unknown))}")
+        start, end = _date(start), _date(end)
+
+        path     = os.path.join(self.folder, export_name(fmt, speakers, start, end))
+        filtered = bool(speakers or start or end)
+        if os.path.exists(path):
+            if filtered:
+                self._touch(path)
+            return path
+
+        # Concurrent requests for the same export wait for a single build
+        with self.lock:
+            lock = self.building.setdefault(path, threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                self._build(path, fmt, speakers, start, end)
+        with self.lock:
+            self.building.pop(path, None)
+
+        if filtered:
+            self._prune(keep = path)
+        return path
+
+    @staticmethod
+    def _touch(path):
+        # The modification time of a filtered export is the time of its last request
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _build(self, path, fmt, speakers, start, end):
+        # The full Parquet export is the snapshot file itself
+        if fmt == "parquet" and not (speakers or start or end):
+            try:
+                os.link(self.snap.file("speeches.parquet"), path)
+            except OSError:
+                shutil.copyfile(self.snap.file("speeches.parquet"), path)
+            return
+
+        table = pq.read_table(
+            self.snap.file("speeches.parquet"),
+            filters = columnar._filters(speakers, start, end)
+        )
+        fd, tmp = tempfile.mkstemp(dir = self.folder, suffix = ".tmp")
+        os.close(fd)
+        try:
+            WRITERS[fmt](table, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _prune(self, keep = None):
+        full     = {export_name(fmt) for fmt in FORMATS}
+        filtered = []
+        for name in os.listdir(self.folder):
+            if name in full or name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except OSError:     # removed by another worker
+                continue
+            filtered.append((stat.st_mtime, stat.st_size, os.path.join(self.folder, name)))
+        filtered.sort()
+
+        nfiles = len(filtered)
+        nbytes = sum(size for _, size, _ in filtered)
+        recent = time.time() - self.grace
+        for mtime, size, path in filtered:
+            if nfiles <= self.max_files and nbytes <= self.max_bytes:
+                break
+            if mtime > recent:
+                # Requested in the grace period, possibly still being sent (and so is every newer file)
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            nfiles -= 1
+            nbytes -= size
+
+    def build_all(self):
+        """
+        Builds the full exports in every format (run after building a new snapshot).
+        """
+        return {fmt: self.path(fmt) for fmt in FORMATS}
@@ -0,0 +1,164 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Concurrent fetch engine
+Description:    Thread pool fetcher used by the extraction scripts. A single requests session keeps a pool of
+                keep-alive connections, while every host gets its own concurrency cap and requests-per-second
+                budget so we stay polite with the source websites.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from speechdb import metrics
+
+# Defining default headers
+agent   = ["Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) ",
+           "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/",
+           "96.0.4664.110 Safari/537.36"]
+HEADERS = {
+    "User-Agent": "".join(agent)
+}
+
+# Outcome of a single request. Status is None when the request never got an answer. Headers are
+# case-insensitive, servers send ETag as well as Etag or etag
+FetchResult = namedtuple("FetchResult", ["url", "status", "text", "headers", "elapsed", "error"])
+
+
+def record_response(url, status, nbytes, elapsed):
+    """
+    Records a request in the metrics registry: responses per host and HTTP status ("error"
+    when there was no answer), bytes received and latency.
+    """
+    host = urlsplit(url).netloc
+    metrics.inc("fetch_responses_total", host = host, status = status or "error")
+    metrics.inc("fetch_bytes_total", nbytes, host = host)
+    metrics.observe("fetch_seconds", elapsed, host = host)
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `burst` requests.
+    A rate of None disables the limiter.
+    """
+
+    def __init__(self, rate, burst = 1):
+        self.rate   = rate
+        self.burst  = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp  = time.monotonic()
+        self.lock   = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now         = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp  = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Fetcher:
+    """
+    Fetches URLs concurrently over pooled keep-alive connections.
+
+    max_workers:    number of threads doing requests.
+    per_host:       maximum number of requests in flight against the same host.
+    rate:           requests-per-second budget per host (None for no limit).
+    """
+
+    def __init__(self, headers = None, max_workers = 16, per_host = 4, rate = 4.0, burst = 1,
+                 timeout = 30, retries = 3, backoff = 1.0):
+        self.max_workers = max_workers
+        self.per_host    = per_host
+        self.rate        = rate
+        self.burst       = burst
+        self.timeout     = timeout
+
+        # One session for every thread, its connection pool is sized to the number of workers
+        retry = Retry(
+            total            = retries,
+            backoff_factor   = backoff,
+            status_forcelist = [429, 500, 502, 503, 504],
+            allowed_methods  = ["GET", "HEAD"],
+            respect_retry_after_header = True
+        )
+        adapter = HTTPAdapter(pool_connections = 8, pool_maxsize = max_workers, max_retries = retry)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS if headers is None else headers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._hosts = {}
+        self._lock  = threading.Lock()
+
+    def _host_limits(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.per_host),
+                                     RateLimiter(self.rate, self.burst))
+            return self._hosts[host]
+
+    def get(self, url, headers = None):
+        """
+        Fetches a single URL honouring the per-host limits. Never raises, errors are
+        returned within the FetchResult.
+        """
+        slots, limiter = self._host_limits(url)
+        with slots:
+            limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers = headers, timeout = self.timeout)
+            except requests.RequestException as err:
+                record_response(url, None, 0, time.perf_counter() - start)
+                return FetchResult(url, None, None, CaseInsensitiveDict(), time.perf_counter() - start, repr(err))
+        elapsed = time.perf_counter() - start
+        record_response(url, response.status_code, len(response.content), elapsed)
+        return FetchResult(url, response.status_code, response.text, CaseInsensitiveDict(response.headers),
+                           elapsed, None)
+
+    def iter_fetch(self, urls, headers_for = None):
+        """
+        Takes a list of URLs and yields a FetchResult for each one of them as soon as
+        they are completed. `headers_for` is an optional callable returning extra
+        headers for a given URL.
+        """
+        with ThreadPoolExecutor(max_workers = self.max_workers) as pool:
+            futures = [
+                pool.submit(self.get, url, headers_for(url) if headers_for else None)
+                for url in urls
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def fetch_all(self, urls, headers_for = None):
+        """
+        Same as iter_fetch but returns the results in the same order as the input URLs.
+        """
+        urls    = list(urls)
+        results = {res.url: res for res in self.iter_fetch(urls, headers_for)}
+        return [results[url] for url in urls]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
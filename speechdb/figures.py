@@ -0,0 +1,272 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Aggregates & figures
+Description:    Aggregates and Plotly figures of the Data Preview tab, materialized once per data version.
+                The counts and mean length of the speeches per speaker, the number of speeches per quarter
+                and the date range are computed from the speech data, the figures are built from them and
+                everything is saved as JSON (figures.json) in the snapshot version folder. App workers only
+                read that file, so building the layout does not depend on the number of speeches.
+"""
+
+import json
+import os
+
+import pandas as pd
+import plotly.express as px
+
+CACHE_FILE   = "figures.json"
+CACHE_FORMAT = 2
+
+
+##============================##
+##         AGGREGATES         ##
+##============================##
+
+def aggregate(df):
+    """
+    Computes the aggregates used by the Data Preview tab from the speech data.
+    """
+    speakers = (
+        df
+        .groupby("spoke_person")
+        .agg(count = ("nwords", "size"), mean_nwords = ("nwords", "mean"))
+    )
+    quarters = (
+        df
+        .groupby([df["date"].dt.to_period("Q"), "spoke_person"])
+        .size()
+        .reset_index(name = "count")
+    )
+    months = df["date"].dt.to_period("M")
+    return {
+        "nspeeches"  : int(len(df)),
+        "first_date" : str(df["date"].min().date()),
+        "last_date"  : str(df["date"].max().date()),
+        "first_month": str(months.min()),
+        "last_month" : str(months.max()),
+        "speakers"   : {
+            speaker: {"count": int(row["count"]), "mean_nwords": float(row["mean_nwords"])}
+            for speaker, row in speakers.iterrows()
+        },
+        "quarterly"  : [
+            {"quarter": str(row["date"]), "spoke_person": row["spoke_person"], "count": int(row["count"])}
+            for _, row in quarters.iterrows()
+        ]
+    }
+
+
+##============================##
+##          FIGURES           ##
+##============================##
+
+def barPlot_nspeeches(agg):
+    grouped_data = pd.DataFrame(
+        [(speaker, values["count"]) for speaker, values in agg["speakers"].items()],
+        columns = ["spoke_person", "count"]
+    )
+    fig = px.bar(
+        grouped_data,
+        x    = "spoke_person",
+        y    = "count",
+        labels    = {"spoke_person": "Spoke Person",
+                    "count"       : "<i>Number of speeches</i>"},
+        color_discrete_sequence = ["#CBDFBD"]
+    )
+    fig.update_layout(
+        title        = "<b>Total Number of Speeches by Spoke Person</b>",
+        title_font   = dict(
+            size     = 16,
+            family   = "Open Sans"
+        ),
+        title_x        = 0.5,
+        font_color     = "#201E1F",
+        plot_bgcolor   = "#FFFFFF",
+        xaxis          = dict(
+            title      = dict(text = None),
+            fixedrange = True
+        ),
+        yaxis          = dict(
+            dtick      = 200,
+            gridcolor  = "#3F3B3D",
+            gridwidth  = 0.5,
+            griddash   = "dash",
+            fixedrange = True,
+            titlefont  = dict(family = "Open Sans"),
+            autorangeoptions = dict(include = 1900),
+        ),
+        font = dict(family = "Open Sans")
+    )
+    return fig
+
+
+def barPlot_speechlen(agg):
+    grouped_data = pd.DataFrame(
+        [(speaker, values["mean_nwords"]) for speaker, values in agg["speakers"].items()],
+        columns = ["spoke_person", "mean"]
+    )
+    fig = px.bar(
+        grouped_data,
+        x      = "spoke_person",
+        y      = "mean",
+        labels = {"spoke_person": "Spoke Person",
+                  "mean"       : "<i>Average speech length (in words)</i>"},
+        color_discrete_sequence = ["#F19C79"]
+    )
+    fig.update_layout(
+        title         = "<b>Average speech length by Spoke Person</b>",
+        title_font    = dict(
+            size      = 16,
+            family    = "Open Sans"
+        ),
+        title_x        = 0.5,
+        font_color     = "#201E1F",
+        plot_bgcolor   = "#FFFFFF",
+        xaxis          = dict(
+            title      = dict(text = None),
+            fixedrange = True
+        ),
+        yaxis          = dict(
+            dtick      = 500,
+            gridcolor  = "#3F3B3D",
+            gridwidth  = 0.5,
+            griddash   = "dash",
+            fixedrange = True,
+            titlefont  = dict(family = "Open Sans"),
+            autorangeoptions = dict(include = 3100),
+        ),
+        font = dict(family = "Open Sans")
+        )
+    return fig
+
+
+def lineChart_sp(agg):
+    grouped_data = pd.DataFrame(agg["quarterly"], columns = ["quarter", "spoke_person", "count"])
+    grouped_data["date4plot"] = pd.PeriodIndex(grouped_data["quarter"], freq = "Q").strftime('%B, %Y')
+
+    fig = px.line(
+        grouped_data,
+        x = grouped_data.index,
+        y = "count",
+        color  = "spoke_person",
+        labels = {"date4plot"    : "Yearly Quarter",
+                  "count"        : "Number of speeches",
+                  "spoke_person" : "Spoke Person"},
+        custom_data   = ["date4plot", "spoke_person"],
+        color_discrete_sequence = ["#667761", "#a44a3f"]
+    )
+    fig.update_layout(
+        title = "<b>Total number of speeches over time</b>",
+        title_font    = dict(
+            size      = 16,
+            family    = "Open Sans"
+        ),
+        title_x        = 0.5,
+        font_color     = "#201E1F",
+        plot_bgcolor   = "#FFFFFF",
+        xaxis          = dict(
+            tickangle  = 45,
+            fixedrange = True,
+            title      = dict(text = "Yearly Quarter", font = dict(family = "Open Sans"), standoff = 40),
+            showticklabels = False
+        ),
+        yaxis          = dict(
+            dtick      = 20,
+            gridcolor  = "#3F3B3D",
+            gridwidth  = 0.5,
+            griddash   = "dash",
+            fixedrange = True,
+            titlefont  = dict(family = "Open Sans"),
+            autorangeoptions = dict(include = 110)
+        ),
+        font = dict(family = "Open Sans")
+        )
+    fig.update_traces(
+        hovertemplate = "Date: %{customdata[0]}<br>Total speeches: %{y}"
+    )
+    return fig
+
+
+FIGURES = {
+    "nspeeches": barPlot_nspeeches,
+    "speechlen": barPlot_speechlen,
+    "timeline" : lineChart_sp
+}
+
+
+def render(templates, agg):
+    """
+    Figures of other aggregates (e.g. those of a speaker and date range selection), built by
+    filling the cached figures with their values instead of going through Plotly Express.
+    """
+    speakers = list(agg["speakers"])
+    figs = {}
+    for name, value in [("nspeeches", "count"), ("speechlen", "mean_nwords")]:
+        trace = dict(templates[name]["data"][0],
+                     x = speakers,
+                     y = [agg["speakers"][speaker][value] for speaker in speakers])
+        figs[name] = dict(templates[name], data = [trace])
+
+    quarters  = [row["quarter"] for row in agg["quarterly"]]
+    date4plot = list(pd.PeriodIndex(quarters, freq = "Q").strftime('%B, %Y')) if quarters else []
+    traces = []
+    for trace in templates["timeline"]["data"]:
+        if trace["name"] not in agg["speakers"]:
+            continue
+        rows = [i for i, row in enumerate(agg["quarterly"]) if row["spoke_person"] == trace["name"]]
+        traces.append(dict(trace,
+                           x = rows,
+                           y = [agg["quarterly"][i]["count"] for i in rows],
+                           customdata = [[date4plot[i], trace["name"]] for i in rows]))
+    figs["timeline"] = dict(templates["timeline"], data = traces)
+    return figs
+
+
+##============================##
+##           CACHE            ##
+##============================##
+
+def materialize(df, version):
+    """
+    Returns the aggregates of the speech data and the JSON of every figure, keyed by the
+    data version.
+    """
+    agg = aggregate(df)
+    return {
+        "format"    : CACHE_FORMAT,
+        "version"   : version,
+        "aggregates": agg,
+        "figures"   : {name: json.loads(build(agg).to_json()) for name, build in FIGURES.items()}
+    }
+
+
+def build(snap):
+    """
+    Materializes the aggregates and figures of a data snapshot into its folder
+    (run after building a new snapshot). Returns the cache.
+    """
+    cache = materialize(snap.speeches, snap.version)
+    tmp   = snap.file(CACHE_FILE + ".tmp")
+    with open(tmp, "w", encoding = "utf-8") as file:
+        json.dump(cache, file)
+    os.replace(tmp, snap.file(CACHE_FILE))
+    return cache
+
+
+def load(snap):
+    """
+    Returns the cached aggregates and figures of a data snapshot. They are only computed
+    (and saved, if the folder is writable) when missing or built for another data version
+    or cache format.
+    """
+    try:
+        with open(snap.file(CACHE_FILE), encoding = "utf-8") as file:
+            cache = json.load(file)
+        if cache.get("version") == snap.version and cache.get("format") == CACHE_FORMAT:
+            return cache
+    except (FileNotFoundError, ValueError):
+        pass
+
+    try:
+        return build(snap)
+    except OSError:
+        return materialize(snap.speeches, snap.version)
@@ -0,0 +1,164 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Raw HTML store
+Description:    Content-addressed store for the pages fetched by the extraction scripts. Every page is
+                compressed (zstd when the zstandard package is installed, gzip otherwise) and saved under
+                its SHA-256, while a SQLite index maps each URL to the hash of its latest version. This
+                allows rebuilding the datasets after a parser change without touching the network.
+"""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url        TEXT PRIMARY KEY,
+    source     TEXT,
+    sha256     TEXT NOT NULL,
+    fetched_at TEXT NOT NULL
+)
+"""
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level = 10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel = 6), ".gz"
+
+
+def _decompress(data, ext):
+    if ext == ".zst":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to read .zst blobs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class HtmlStore:
+    """
+    Raw HTML store living in a folder: objects/<2 chars>/<sha256>.<zst|gz> plus index.sqlite.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok = True)
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread = False)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.root, "objects", digest[:2], digest + ext)
+
+    def _find_blob(self, digest):
+        for ext in (".zst", ".gz"):
+            path = self._blob_path(digest, ext)
+            if os.path.exists(path):
+                return path, ext
+        return None, None
+
+    def put(self, url, html, source = None):
+        """
+        Stores the source code of a page and points the URL to it. Returns its SHA-256.
+        """
+        data   = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+
+        if self._find_blob(digest)[0] is None:
+            blob, ext = _compress(data)
+            path      = self._blob_path(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+
+            # Writing to a temporary file first so readers never see half-written blobs
+            fd, tmp = tempfile.mkstemp(dir = os.path.dirname(path))
+            with os.fdopen(fd, "wb") as file:
+                file.write(blob)
+            os.replace(tmp, path)
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO pages VALUES (?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET "
+                "source = excluded.source, sha256 = excluded.sha256, fetched_at = excluded.fetched_at",
+                (url, source, digest, datetime.now(timezone.utc).isoformat(timespec = "seconds"))
+            )
+            self.conn.commit()
+        return digest
+
+    def get_blob(self, digest):
+        """
+        Returns the source code stored under a given SHA-256.
+        """
+        path, ext = self._find_blob(digest)
+        if path is None:
+            raise KeyError(digest)
+        with open(path, "rb") as file:
+            return _decompress(file.read(), ext).decode("utf-8")
+
+    def digest(self, url):
+        """
+        Returns the SHA-256 of the latest version of a URL, None if it was never stored.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, url):
+        """
+        Returns the source code of the latest version of a URL, None if it was never stored.
+        """
+        digest = self.digest(url)
+        return self.get_blob(digest) if digest else None
+
+    def urls(self, source = None):
+        """
+        Returns the stored URLs, in the order they were first stored.
+        """
+        with self.lock:
+            if source is None:
+                rows = self.conn.execute("SELECT url FROM pages ORDER BY rowid").fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT url FROM pages WHERE source = ? ORDER BY rowid", (source,)
+                ).fetchall()
+        return [row[0] for row in rows]
+
+    def missing(self, urls):
+        """
+        Returns the given URLs that were never stored, in their order.
+        """
+        with self.lock:
+            stored = {row[0] for row in self.conn.execute("SELECT url FROM pages").fetchall()}
+        return [url for url in dict.fromkeys(urls) if url not in stored]
+
+    def iter_pages(self, source = None, urls = None):
+        """
+        Yields (url, source code) pairs for the given URLs (every stored URL of `source`
+        if None). URLs missing from the store are skipped.
+        """
+        for url in (self.urls(source) if urls is None else urls):
+            html = self.get(url)
+            if html is not None:
+                yield url, html
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
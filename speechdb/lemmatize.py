@@ -0,0 +1,132 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Lemmatization
+Description:    Batched spaCy lemmatization with a per-speech cache. Only the components needed for lemmas,
+                is_stop and is_alpha are kept (parser and NER are disabled), speeches are processed through
+                nlp.pipe with a configurable number of processes and batch size, and the lemmas of every speech
+                are cached under a hash of its text and the model version. Adding ten new speeches costs ten
+                speeches of work.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+import spacy
+
+from speechdb import metrics
+
+DISABLED = ["parser", "ner"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lemmas (
+    key    TEXT PRIMARY KEY,
+    lemmas TEXT NOT NULL
+)
+"""
+
+
+def load_model(name = "es_core_news_sm"):
+    """
+    Loads a spaCy model without the components we do not use.
+    """
+    return spacy.load(name, disable = DISABLED)
+
+
+def model_version(nlp):
+    """
+    Returns an identifier of the model (language, name and version), part of every cache key.
+    """
+    return f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}"
+
+
+def speech_key(text, version):
+    return hashlib.sha256(f"{version}\0{text}".encode("utf-8")).hexdigest()
+
+
+class LemmaCache:
+    """
+    SQLite cache mapping speech keys to their list of lemmas.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """
+        Returns a dictionary with the cached lemmas of the given keys.
+        """
+        found = {}
+        keys  = list(set(keys))
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows  = self.conn.execute(
+                f"SELECT key, lemmas FROM lemmas WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update({key: json.loads(lemmas) for key, lemmas in rows})
+        return found
+
+    def put_many(self, items):
+        """
+        Stores (key, lemmas) pairs.
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO lemmas VALUES (?, ?)",
+            [(key, json.dumps(lemmas, ensure_ascii = False)) for key, lemmas in items]
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM lemmas").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def doc_lemmas(doc):
+    """
+    Lowercased lemmas of the alphabetic, non-stopword tokens of a spaCy Doc.
+    """
+    return [token.lemma_.lower() for token in doc if not token.is_stop and token.is_alpha]
+
+
+def lemmatize(texts, nlp, cache = None, exclude = (), n_process = 1, batch_size = 64):
+    """
+    Takes a list of speeches and returns their lists of lemmas, in the same order.
+
+    cache:      LemmaCache, only the speeches missing from it are processed.
+    exclude:    lemmas to remove from the results (e.g. preprocess.ADDED_STOPWORDS[speaker]).
+                They are removed after the cache, so the same cache serves every speaker.
+    """
+    texts   = ["" if text is None else str(text) for text in texts]
+    version = model_version(nlp)
+    keys    = [speech_key(text, version) for text in texts]
+    found   = cache.get_many(keys) if cache is not None else {}
+
+    # Processing the speeches we have not seen before (each distinct text only once)
+    missing = {key: text for key, text in zip(keys, texts) if key not in found}
+    with metrics.stage("lemmatize", model = version) as stage:
+        batch = []
+        docs  = nlp.pipe(missing.values(), n_process = n_process, batch_size = batch_size)
+        for key, doc in zip(missing.keys(), docs):
+            found[key] = doc_lemmas(doc)
+            batch.append((key, found[key]))
+            stage.count(speeches = 1, tokens = len(doc), lemmas = len(found[key]))
+            if cache is not None and len(batch) >= batch_size:
+                cache.put_many(batch)
+                batch = []
+        if cache is not None and batch:
+            cache.put_many(batch)
+        stage.count(cached = len(texts) - len(missing))
+
+    exclude = set(exclude)
+    return [[lemma for lemma in found[key] if lemma not in exclude] for key in keys]
@@ -0,0 +1,172 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Crawl manifest
+Description:    SQLite manifest recording, for every URL we have tried to fetch, its status, fetch time,
+                ETag/Last-Modified validators, a hash of the parsed content and the parsed record itself.
+                Every outcome is committed as soon as it arrives, so an interrupted crawl resumes where it
+                stopped and later runs only fetch new URLs (or revalidate old ones with conditional GETs).
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from requests.structures import CaseInsensitiveDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url           TEXT PRIMARY KEY,
+    status        TEXT NOT NULL,
+    http_status   INTEGER,
+    fetched_at    TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    content_hash  TEXT,
+    record        TEXT,
+    error         TEXT
+)
+"""
+
+DONE  = "done"
+ERROR = "error"
+
+
+def content_hash(record):
+    """
+    Returns the SHA-256 of a parsed record (a JSON-serializable dictionary).
+    """
+    payload = json.dumps(record, sort_keys = True, ensure_ascii = False, default = str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec = "seconds")
+
+
+class CrawlManifest:
+    """
+    On-disk record of a crawl. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread = False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        """
+        Returns the manifest entry for a URL as a dictionary, or None if it was never fetched.
+        """
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM pages WHERE url = ?", (url,))
+            row    = cursor.fetchone()
+            if row is None:
+                return None
+            entry = dict(zip([col[0] for col in cursor.description], row))
+        if entry["record"] is not None:
+            entry["record"] = json.loads(entry["record"])
+        return entry
+
+    def done(self):
+        """
+        Returns the set of URLs that were fetched and parsed successfully.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT url FROM pages WHERE status = ?", (DONE,)).fetchall()
+        return {row[0] for row in rows}
+
+    def pending(self, urls, revalidate = False):
+        """
+        Takes a list of URLs and returns the ones that still have to be requested. With
+        revalidate = True finished URLs are requested again (conditionally, see
+        conditional_headers).
+        """
+        if revalidate:
+            return list(dict.fromkeys(urls))
+        finished = self.done()
+        return [url for url in dict.fromkeys(urls) if url not in finished]
+
+    def conditional_headers(self, url):
+        """
+        Returns the If-None-Match/If-Modified-Since headers for a finished URL.
+        """
+        entry = self.get(url)
+        if entry is None or entry["status"] != DONE:
+            return {}
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _write(self, query, params):
+        with self.lock:
+            self.conn.execute(query, params)
+            self.conn.commit()
+
+    def record_success(self, url, http_status, headers, record):
+        """
+        Stores a parsed record along with the validators sent by the server (header names
+        in any case).
+        """
+        headers = CaseInsensitiveDict(headers)
+        self._write(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+            (url, DONE, http_status, _now(), headers.get("ETag"), headers.get("Last-Modified"),
+             content_hash(record), json.dumps(record, ensure_ascii = False, default = str))
+        )
+
+    def record_not_modified(self, url):
+        """
+        Refreshes the fetch time of a URL that answered 304 Not Modified.
+        """
+        self._write("UPDATE pages SET fetched_at = ?, http_status = 304 WHERE url = ?", (_now(), url))
+
+    def record_failure(self, url, http_status, error):
+        """
+        Stores a failed attempt. A previously finished URL keeps its record.
+        """
+        entry = self.get(url)
+        if entry is not None and entry["status"] == DONE:
+            return
+        self._write(
+            "INSERT OR REPLACE INTO pages (url, status, http_status, fetched_at, error) VALUES (?, ?, ?, ?, ?)",
+            (url, ERROR, http_status, _now(), error)
+        )
+
+    def records(self, urls = None):
+        """
+        Returns the parsed records of the finished URLs, in the order given by `urls`
+        (every finished URL if None).
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, record FROM pages WHERE status = ? ORDER BY rowid", (DONE,)
+            ).fetchall()
+        stored = {url: json.loads(record) for url, record in rows}
+        if urls is None:
+            return list(stored.values())
+        return [stored[url] for url in dict.fromkeys(urls) if url in stored]
+
+    def summary(self):
+        """
+        Returns the number of URLs by status.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM pages GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,310 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Pipeline metrics
+Description:    Lightweight instrumentation of the scraping, processing and modelling stages and of the app. A
+                process-wide registry keeps counters (e.g. responses per HTTP status, bytes fetched), gauges and
+                latency histograms with fixed buckets, and renders them in the Prometheus text format.
+
+                Stages are timed with stage(), which records their duration, their counts (pages, tokens, ...),
+                the rate of every count per second and their memory: the resident set size is sampled while
+                the stage runs, and its peak and its increase over the start of the stage are reported. The
+                RSS is read with psutil if it is installed (any platform, counting the live worker processes
+                of a pool) or else from /proc (Linux, this process only). When a log file is set (configure(path), or the SPEECHDB_METRICS environment
+                variable) every stage is appended to it as a JSON line, and save() writes the Prometheus
+                snapshot next to it (<log>.prom).
+
+                    with metrics.stage("parse", source = "canal4") as st:
+                        records = parse_batch(pages, "canal4")
+                        st.count(pages = len(records))
+
+                Metrics are kept per process: worker processes of a pool only report through the stages
+                of their parent.
+"""
+
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from datetime import datetime, timezone
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PREFIX   = "speechdb_"
+BUCKETS  = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+INTERVAL = 0.05
+
+
+def current_rss():
+    """
+    Resident set size in bytes of this process and, with psutil, of its live child
+    processes (None where it cannot be read).
+    """
+    if psutil is not None:
+        process = psutil.Process()
+        total   = process.memory_info().rss
+        for child in process.children(recursive = True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """
+    Samples the RSS every `interval` seconds in a background thread, from start() to
+    stop(), and keeps the first and the largest values.
+    """
+
+    def __init__(self, interval = INTERVAL):
+        self.interval = interval
+        self.start    = current_rss()
+        self.peak     = self.start
+        self.done     = threading.Event()
+        self.thread   = None
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self.done.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if self.start is not None:
+            self.thread = threading.Thread(target = self._run, name = "rss-sampler", daemon = True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        if self.thread is not None:
+            self.thread.join()
+            self._sample()
+
+    @property
+    def delta(self):
+        return None if self.start is None else self.peak - self.start
+
+
+##============================##
+##          REGISTRY          ##
+##============================##
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra = ()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class Registry:
+    """
+    Counters, gauges and histograms, by name and labels.
+    """
+
+    def __init__(self, buckets = BUCKETS):
+        self.buckets    = tuple(buckets)
+        self.counters   = {}
+        self.gauges     = {}
+        self.histograms = {}
+        self.lock       = threading.Lock()
+
+    def inc(self, name, value = 1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            histogram = self.histograms[key]
+            position  = bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                histogram["buckets"][position] += 1
+            histogram["sum"]   += value
+            histogram["count"] += 1
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self.lock:
+            counters   = sorted(self.counters.items())
+            gauges     = sorted(self.gauges.items())
+            histograms = sorted((key, dict(value, buckets = list(value["buckets"])))
+                                for key, value in self.histograms.items())
+
+        lines, typed = [], set()
+        for kind, items in [("counter", counters), ("gauge", gauges)]:
+            for (name, labels), value in items:
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    typed.add(name)
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                typed.add(name)
+            # Buckets are cumulative, the last one (+Inf) holds every observation
+            totals = [*itertools.accumulate(histogram["buckets"]), histogram["count"]]
+            for bound, total in zip(self.buckets + (math.inf,), totals):
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} "
+                             f"{total}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+LOG      = os.environ.get("SPEECHDB_METRICS")
+
+inc     = REGISTRY.inc
+observe = REGISTRY.observe
+render  = REGISTRY.render
+
+
+def configure(path):
+    """
+    Sets the JSON lines file the stages are appended to (None to stop logging).
+    """
+    global LOG
+    LOG = path
+
+
+def save(path = None):
+    """
+    Writes the Prometheus snapshot of the registry to path (by default next to the log
+    file, <log>.prom). Returns the path, None if there is no log file.
+    """
+    path = path or (LOG and os.path.splitext(LOG)[0] + ".prom")
+    if path is None:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+    with open(path + ".tmp", "w", encoding = "utf-8") as file:
+        file.write(render())
+    os.replace(path + ".tmp", path)
+    return path
+
+
+##============================##
+##           STAGES           ##
+##============================##
+
+class Stage:
+    """
+    Counts of a running stage (pages, speeches, tokens, bytes, ...).
+    """
+
+    def __init__(self, name, labels):
+        self.name   = name
+        self.labels = labels
+        self.counts = {}
+
+    def count(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+
+@contextmanager
+def stage(name, **labels):
+    """
+    Times a stage and records its duration, counts, rates, peak RSS and RSS increase in
+    the registry and, if a log file is set, as a JSON line. A stage left by an exception is recorded
+    with the name of the exception as its status; a generator closed before it was
+    exhausted, as "closed".
+    """
+    current = Stage(name, labels)
+    status  = "ok"
+    sampler = RssSampler()
+    start   = time.perf_counter()
+    try:
+        with sampler:
+            yield current
+    except GeneratorExit:
+        status = "closed"
+        raise
+    except BaseException as err:
+        status = type(err).__name__
+        raise
+    finally:
+        _record(current, status, time.perf_counter() - start, sampler)
+
+
+def timed(name, counts = None, **labels):
+    """
+    Decorator running a function as a stage. `counts` takes the result of the function and
+    returns the counts of the stage as a dictionary.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name, **labels) as current:
+                result = function(*args, **kwargs)
+                if counts is not None:
+                    current.count(**counts(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def _record(current, status, seconds, sampler):
+    labels = dict(current.labels, stage = current.name)
+    observe("stage_seconds", seconds, **labels, status = status)
+    for key, value in current.counts.items():
+        inc(f"stage_{key}_total", value, **labels)
+    if sampler.peak is not None:
+        REGISTRY.set("stage_peak_rss_bytes", sampler.peak, **labels)
+        REGISTRY.set("stage_rss_delta_bytes", sampler.delta, **labels)
+
+    if LOG is None:
+        return
+    entry = {
+        "time"     : datetime.now(timezone.utc).isoformat(timespec = "milliseconds"),
+        "pid"      : os.getpid(),
+        "stage"    : current.name,
+        **{key: value for key, value in current.labels.items() if key != "stage"},
+        "status"   : status,
+        "seconds"  : round(seconds, 6),
+        "counts"   : current.counts,
+        "rates"    : {f"{key}_per_second": round(value / seconds, 3) if seconds else None
+                      for key, value in current.counts.items()},
+        "peak_rss" : sampler.peak,
+        "rss_delta": sampler.delta
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(LOG)), exist_ok = True)
+    with open(LOG, "a", encoding = "utf-8") as file:
+        file.write(json.dumps(entry, ensure_ascii = False, default = str) + "\n")
@@ -0,0 +1,142 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         HTML parsing stage
+Description:    Selective parsers for the article pages of Canal 4 and Radio Nicaragua. Instead of building a
+                BeautifulSoup tree over the whole page, the page is parsed with lxml and only the nodes we
+                need (headline, date and body paragraphs) are picked with XPath. parse_batch fans a batch of
+                stored pages out across a process pool.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from lxml import etree, html as lxml_html
+
+from speechdb import metrics
+
+
+class ParseError(ValueError):
+    """
+    Raised when a page is not HTML or does not have the structure of an article. Being a ValueError,
+    it is caught along with malformed dates.
+    """
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# XPath expressions reproducing the selectors of the original BeautifulSoup code
+C4_HEADLINE = etree.XPath("(//h1)[1]")
+C4_DATE     = etree.XPath(f"(//span[{_has_class('posted-on')}]//time)[1]/@datetime")
+C4_BODY     = etree.XPath("(//div[@class = 'entry-content clearfix'])[1]")
+
+RN_TITLE    = etree.XPath("(//h1[@class = 'title-to-share entry-title mb-2 pb-4'])[1]")
+RN_DATE     = etree.XPath("(//div[@class = 'd-flex entry-date justify-content-end'])[1]")
+RN_BODY     = etree.XPath(f"//*[{_has_class('entry-content')}]//p[preceding-sibling::*[1][self::p]]")
+
+
+def _tree(source_code, url):
+    # lxml raises its own errors (e.g. "Document is empty") for empty or garbage pages
+    try:
+        return lxml_html.fromstring(source_code)
+    except etree.LxmlError as err:
+        raise ParseError(f"Not an HTML page: {url} ({err})") from err
+
+
+def _first(nodes, what, url):
+    if not nodes:
+        raise ParseError(f"No {what} found in {url}")
+    return nodes[0]
+
+
+def parse_canal4(source_code, url_link):
+    """
+    Takes the source code of a Canal 4 article and returns a dictionary with its
+    headline, date, content and URL.
+    """
+    tree = _tree(source_code, url_link)
+
+    headline = _first(C4_HEADLINE(tree), "headline", url_link).text_content()
+    headline = re.sub("\n", "", headline)
+
+    date = _first(C4_DATE(tree), "date", url_link)
+    date = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S%z").date()
+
+    body    = _first(C4_BODY(tree), "content", url_link)
+    content = " ".join(p.text_content() for p in body.iter("p"))
+
+    return {
+        "headline" : headline,
+        "date"     : date,
+        "content"  : content,
+        "url"      : url_link
+    }
+
+
+def parse_radionicaragua(source_code, link):
+    """
+    Takes the source code of a Radio Nicaragua article and returns a dictionary with
+    its title, date, speech and link.
+    """
+    tree = _tree(source_code, link)
+
+    title = _first(RN_TITLE(tree), "title", link).text_content().strip()
+    date  = _first(RN_DATE(tree), "date", link).text_content().strip()
+
+    # Same as BeautifulSoup's stripped_strings over every selected paragraph
+    speech = " ".join(
+        text.strip()
+        for p in RN_BODY(tree)
+        for text in p.itertext()
+        if text.strip()
+    )
+
+    return {
+        "title"  : title,
+        "date"   : date,
+        "speech" : speech,
+        "link"   : link
+    }
+
+
+PARSERS = {
+    "canal4"         : parse_canal4,
+    "radionicaragua" : parse_radionicaragua
+}
+
+
+def _parse_page(task):
+    source, url, source_code = task
+    try:
+        return PARSERS[source](source_code, url)
+    except ValueError as err:
+        print(f"Not able to parse {url}: {err}")
+        return None
+
+
+def _tasks(pages, source, stage):
+    for url, source_code in pages:
+        stage.count(pages = 1)
+        yield source, url, source_code
+
+
+def parse_batch(pages, source, processes = None, chunksize = 16):
+    """
+    Takes an iterable of (url, source code) pairs and returns the list of parsed records,
+    in the same order. Pages that can not be parsed are left out. The work is spread over
+    `processes` worker processes (all cores if None, no pool if 1).
+    """
+    with metrics.stage("parse", source = source) as stage:
+        tasks = _tasks(pages, source, stage)
+
+        if processes == 1:
+            records = [record for record in map(_parse_page, tasks) if record is not None]
+        else:
+            with ProcessPoolExecutor(max_workers = processes or os.cpu_count()) as pool:
+                records = pool.map(_parse_page, tasks, chunksize = chunksize)
+                records = [record for record in records if record is not None]
+        stage.count(records = len(records))
+    return records
@@ -0,0 +1,271 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Text preprocessing
+Description:    Streaming preprocessing shared by RN-cleaning.py and the notebooks. Speeches flow one at a time
+                through lowercase -> tokenize -> stopword filter -> phrase merge, all of them generators, so
+                memory is bounded by the speech being processed (plus the CSV chunk being read) instead of
+                holding the whole corpus several times. StreamedCorpus makes the stream re-iterable for
+                tools that need several passes, such as gensim's Phrases, Dictionary or LdaModel, and can
+                spread the pipeline over a process pool in chunks of speeches.
+
+                Phrase models (bigrams, trigrams, ...) are trained from a streamed corpus, frozen and saved in
+                a folder per data version, so later runs and new speeches only look phrases up:
+                    phrases_<n>.pkl     frozen gensim phrase model of level n (1 for bigrams, 2 for trigrams)
+                    FORMAT              format, data version and training options
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property, lru_cache
+from itertools import islice
+
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+
+from speechdb import metrics
+
+# Speaker-specific stopwords (see 1_text_processing.ipynb)
+ADDED_STOPWORDS = {
+    "Daniel" : frozenset(["és", "é", "multinoticias", "canal", "país", "república", "presidente",
+                          "comandante", "daniel", "ortega", "saavedra"]),
+    "Rosario": frozenset(["és", "é", "multinoticias", "canal", "país", "mañana", "rosario", "murillo",
+                          "vicepresidenta", "república", "año", "edición mediodía"])
+}
+
+
+@lru_cache(maxsize = None)
+def spanish_stopwords(speaker = None):
+    """
+    Returns NLTK's Spanish stopwords as a frozenset (built once), plus the added
+    stopwords of a speaker when one is given.
+    """
+    words = frozenset(stopwords.words("spanish"))
+    if speaker is not None:
+        words = words | ADDED_STOPWORDS[speaker]
+    return words
+
+
+##============================##
+##          SOURCES           ##
+##============================##
+
+class CsvSpeeches:
+    """
+    Re-iterable source of speeches read from a CSV file in chunks of `chunksize` rows.
+    Optionally restricted to the rows where `filter_column` equals `filter_value`.
+    """
+
+    def __init__(self, path, column = "speech", chunksize = 32, filter_column = None, filter_value = None):
+        self.path          = path
+        self.column        = column
+        self.chunksize     = chunksize
+        self.filter_column = filter_column
+        self.filter_value  = filter_value
+
+    @cached_property
+    def version(self):
+        """
+        Content hash of the CSV file, identifying the data version.
+        """
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()[:12]
+
+    def __iter__(self):
+        usecols = [self.column] + ([self.filter_column] if self.filter_column else [])
+        for chunk in pd.read_csv(self.path, usecols = usecols, chunksize = self.chunksize):
+            if self.filter_column:
+                chunk = chunk.loc[chunk[self.filter_column] == self.filter_value]
+            for text in chunk[self.column]:
+                yield "" if pd.isna(text) else str(text)
+
+
+##============================##
+##           STAGES           ##
+##============================##
+
+def lowercase(texts):
+    for text in texts:
+        yield text.lower()
+
+
+def tokenize(texts, language = "spanish"):
+    for text in texts:
+        yield word_tokenize(text, language = language)
+
+
+def keep_alpha(docs):
+    for doc in docs:
+        yield [token for token in doc if token.isalpha()]
+
+
+def remove_stopwords(docs, words):
+    for doc in docs:
+        yield [token for token in doc if token not in words]
+
+
+def merge_phrases(docs, *phrasers):
+    """
+    Applies gensim phrase models in order (bigrams first, then trigrams, ...).
+    """
+    for doc in docs:
+        for phraser in phrasers:
+            doc = phraser[doc]
+        yield doc
+
+
+class Pipeline:
+    """
+    Chains the preprocessing stages. Calling the pipeline on an iterable of texts returns
+    a generator of token lists.
+
+    words:      stopwords to remove (a set), None to keep every token.
+    alpha:      keep only alphabetic tokens.
+    phrasers:   gensim phrase models applied after the stopword filter.
+    lower:      lowercase the texts before tokenizing them (as word_tokenize(speech.lower())),
+                False to keep the original case of the tokens.
+    """
+
+    def __init__(self, words = None, alpha = True, phrasers = (), language = "spanish", lower = True):
+        self.words    = words
+        self.alpha    = alpha
+        self.phrasers = tuple(phrasers)
+        self.language = language
+        self.lower    = lower
+
+    def with_phrases(self, *phrasers):
+        """
+        Returns a copy of the pipeline that also merges phrases.
+        """
+        return Pipeline(self.words, self.alpha, self.phrasers + phrasers, self.language, self.lower)
+
+    def __call__(self, texts):
+        docs = tokenize(lowercase(texts) if self.lower else texts, self.language)
+        if self.alpha:
+            docs = keep_alpha(docs)
+        if self.words is not None:
+            docs = remove_stopwords(docs, self.words)
+        if self.phrasers:
+            docs = merge_phrases(docs, *self.phrasers)
+        return docs
+
+    def map(self, texts, processes = None, chunksize = 64):
+        """
+        Same as calling the pipeline, spread over `processes` worker processes (all cores if
+        None) in chunks of `chunksize` texts. Documents come out in order and only a few
+        chunks per worker are in flight, so memory stays bounded.
+        """
+        processes = processes or os.cpu_count()
+        texts     = iter(texts)
+        with ProcessPoolExecutor(max_workers = processes, initializer = _set_pipeline, initargs = (self,)) as pool:
+            pending = deque()
+            while True:
+                while len(pending) < 2 * processes:
+                    chunk = list(islice(texts, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(pool.submit(_run_pipeline, chunk))
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+
+
+# The pipeline of a worker process, sent once when the pool starts (phrase models can be large)
+_worker_pipeline = None
+
+
+def _set_pipeline(pipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+
+def _run_pipeline(texts):
+    return list(_worker_pipeline(texts))
+
+
+class StreamedCorpus:
+    """
+    Re-iterable corpus: every iteration streams the source through the pipeline again
+    (over `processes` worker processes if not 1, see Pipeline.map).
+    """
+
+    def __init__(self, source, pipeline, processes = 1):
+        self.source    = source
+        self.pipeline  = pipeline
+        self.processes = processes
+
+    def __iter__(self):
+        if self.processes == 1:
+            docs = self.pipeline(iter(self.source))
+        else:
+            docs = self.pipeline.map(iter(self.source), processes = self.processes)
+        # Every pass over the corpus is a stage
+        with metrics.stage("preprocess", processes = self.processes) as stage:
+            for doc in docs:
+                stage.count(speeches = 1, tokens = len(doc))
+                yield doc
+
+
+##============================##
+##          PHRASES           ##
+##============================##
+
+PHRASES_FORMAT = 2
+
+
+def train_phrasers(docs, levels = 2, min_count = 5, threshold = 20, max_vocab_size = 20_000_000):
+    """
+    Learns `levels` phrase models (bigrams, then trigrams, ...) from a re-iterable corpus of
+    token lists, streaming it once per level, and returns them frozen. max_vocab_size
+    bounds the memory used while counting (gensim prunes rare candidates beyond it).
+    """
+    from gensim.models.phrases import Phrases
+
+    phrasers = []
+    for _ in range(levels):
+        phrases = Phrases(merge_phrases(iter(docs), *phrasers), min_count = min_count, threshold = threshold,
+                          max_vocab_size = max_vocab_size)
+        phrasers.append(phrases.freeze())
+    return phrasers
+
+
+def load_phrasers(folder, docs, version, **options):
+    """
+    Returns the frozen phrase models saved in folder for this data version (e.g. the
+    CsvSpeeches.version of the source), training and saving them first if they are
+    missing or were trained for another version or with other options.
+    """
+    from gensim.models.phrases import FrozenPhrases
+
+    info = {"format": PHRASES_FORMAT, "version": version, "options": options}
+    try:
+        with open(os.path.join(folder, "FORMAT")) as file:
+            saved = json.load(file)
+        if saved.get("format") == PHRASES_FORMAT and saved.get("version") == version and saved.get("options") == options:
+            return [FrozenPhrases.load(os.path.join(folder, f"phrases_{level}.pkl"))
+                    for level in range(1, saved["levels"] + 1)]
+    except (FileNotFoundError, ValueError):
+        pass
+
+    phrasers = train_phrasers(docs, **options)
+    parent   = os.path.dirname(os.path.abspath(folder))
+    os.makedirs(parent, exist_ok = True)
+    staging  = tempfile.mkdtemp(dir = parent)
+    try:
+        for level, phraser in enumerate(phrasers, start = 1):
+            phraser.save(os.path.join(staging, f"phrases_{level}.pkl"))
+        with open(os.path.join(staging, "FORMAT"), "w") as file:
+            json.dump(dict(info, levels = len(phrasers)), file)
+        shutil.rmtree(folder, ignore_errors = True)
+        os.replace(staging, folder)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+    return phrasers
@@ -0,0 +1,110 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Data publishing
+Description:    Builds everything the app reads for a data version outside the request path: the data snapshot
+                (from the artifacts in Data/, or from the published speech_data.csv and tklem_speeches.json)
+                and its derived artifacts (aggregates and figures, full exports, search indexes, document-term
+                matrix, sentiment and, when there are LDA models, the topic mixtures of the new speeches).
+                Every artifact is only built when missing or stale, so running it on a complete snapshot is
+                cheap. The derived artifacts are added to the manifest of the snapshot, so they are published
+                and downloaded with the data and the app only opens them; one that is missing anyway is built
+                when the app first needs it (open_artifact). After a data update run, before committing
+                Data/snapshot:
+
+                python -m speechdb.publish Data
+                python -m speechdb.publish Data --legacy
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack
+
+from speechdb import columnar, dtm, export, figures, search, sentiment, snapshot, topics
+
+
+def from_legacy(root, speeches_csv, tokens_json):
+    """
+    Builds a snapshot version in root from speech_data.csv and tklem_speeches.json (local
+    paths or URLs). Returns the version name.
+    """
+    staging = tempfile.mkdtemp()
+    try:
+        columnar.write_legacy(staging, speeches_csv, tokens_json)
+        return snapshot.build_snapshot(staging, root = root)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+
+
+def derived_files():
+    """
+    Files and folders of the derived artifacts in a snapshot version (the full exports
+    only, filtered exports are a cache of the app).
+    """
+    return [figures.CACHE_FILE, *[f"exports/{export.export_name(fmt)}" for fmt in export.FORMATS],
+            search.FOLDER, dtm.FOLDER, sentiment.FOLDER, topics.FOLDER]
+
+
+def derive(snap):
+    """
+    Builds the derived artifacts of a data snapshot that are missing or were built for
+    another version, and adds them to its manifest. Topic mixtures need gensim and the
+    models of a previous version; without them the Topic Modelling figures stay empty.
+    """
+    with snapshot.lock(os.path.dirname(snap.path)):
+        figures.load(snap)
+        export.Exporter(snap).build_all()
+        search.load(snap)
+        dtm.load(snap)
+        sentiment.load(snap)
+        try:
+            topics.load_table(snap)
+        except FileNotFoundError:
+            try:
+                print(f"Topic mixtures of {topics.update(snap)} new speeches")
+            except (FileNotFoundError, ImportError) as err:
+                print(f"No topic mixtures for snapshot {snap.version}: {err}")
+        snap.manifest = snapshot.add_files(snap.path, derived_files())
+
+
+def open_artifact(snap, load):
+    """
+    Opens a derived artifact of a data snapshot with its load function (e.g. search.load).
+    Published artifacts are only opened; a missing or stale one is built by load under the
+    snapshot lock, so the workers of a server build it once. Without write access to the
+    snapshot folder, load runs without the lock.
+    """
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(snapshot.lock(os.path.dirname(snap.path)))
+        except OSError:
+            pass
+        return load(snap)
+
+
+def publish(data_dir, legacy = False):
+    """
+    Builds a new snapshot version in data_dir/snapshot (from the legacy files if asked)
+    with all its derived artifacts. Returns the snapshot.
+    """
+    root = os.path.join(data_dir, "snapshot")
+    if legacy:
+        from_legacy(root, os.path.join(data_dir, "speech_data.csv"), os.path.join(data_dir, "tklem_speeches.json"))
+    else:
+        snapshot.build_snapshot(data_dir, root = root)
+    snap = snapshot.load(root)
+    derive(snap)
+    return snap
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "Builds a data snapshot and its derived artifacts")
+    parser.add_argument("data_dir")
+    parser.add_argument("--legacy", action = "store_true",
+                        help = "build it from speech_data.csv and tklem_speeches.json")
+    args = parser.parse_args()
+
+    snap = publish(args.data_dir, legacy = args.legacy)
+    print(f"Data snapshot {snap.version} published in {snap.path}")
@@ -0,0 +1,190 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Radio Nicaragua extraction
+Description:    Fetching and parsing of the speech transcripts published on radionicaragua.com.ni.
+                Category pages and articles are server-rendered WordPress pages, so they are fetched
+                concurrently over plain HTTP. A pool of Selenium drivers remains available as an opt-in
+                fallback for pages that really need JavaScript.
+                Used by Code/1_web_scrapping/RN-extraction.py
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from lxml import html as lxml_html
+
+from speechdb import metrics
+from speechdb.fetch import Fetcher
+from speechdb.parsing import parse_batch, parse_radionicaragua
+
+SOURCE       = "radionicaragua"
+COLUMNS      = ["title", "date", "speech", "link"]
+CATEGORY_URL = "https://radionicaragua.com.ni/category/discurso/page/{page}/"
+NPAGES       = 25
+
+
+def parse_links(source_code):
+    """
+    Takes the source code of a category page and returns the article links in it.
+    """
+    tree = lxml_html.fromstring(source_code)
+    return tree.xpath("//article//figcaption//a[@href]/@href")
+
+
+parse_article = parse_radionicaragua
+
+
+class DriverPool:
+    """
+    Pool of Chrome webdrivers shared by several threads. Drivers are opened on first use.
+    """
+
+    def __init__(self, size = 2, executable_path = None):
+        self.size            = size
+        self.executable_path = executable_path
+        self.idle            = queue.Queue()
+        self.drivers         = []
+        self.lock            = threading.Lock()
+
+    def _new_driver(self):
+        from selenium import webdriver
+
+        if self.executable_path:
+            driver = webdriver.Chrome(executable_path = self.executable_path)
+        else:
+            driver = webdriver.Chrome()
+        self.drivers.append(driver)
+        return driver
+
+    def page_source(self, url):
+        """
+        Loads a URL in one of the drivers and returns the rendered source code.
+        """
+        try:
+            driver = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                driver = self._new_driver() if len(self.drivers) < self.size else None
+            if driver is None:
+                driver = self.idle.get()
+        try:
+            driver.get(url)
+            return driver.page_source
+        finally:
+            self.idle.put(driver)
+
+    def map(self, urls):
+        """
+        Returns the rendered source code of every URL, using all the drivers in parallel.
+        """
+        with ThreadPoolExecutor(max_workers = self.size) as pool:
+            return list(pool.map(self.page_source, urls))
+
+    def close(self):
+        for driver in self.drivers:
+            driver.quit()
+        self.drivers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def discover_links(npages = NPAGES, fetcher = None, driver_pool = None):
+    """
+    Fetches the category pages concurrently and returns the article links in them, in
+    page order. Pages that can not be fetched over HTTP go through the driver pool,
+    if one is given.
+    """
+    pages = [CATEGORY_URL.format(page = page) for page in range(1, npages + 1)]
+
+    with metrics.stage("discover", source = SOURCE) as stage:
+        if fetcher is None:
+            sources = driver_pool.map(pages)
+        else:
+            sources = []
+            for res in fetcher.fetch_all(pages):
+                if res.status == 200:
+                    sources.append(res.text)
+                elif driver_pool is not None:
+                    sources.append(driver_pool.page_source(res.url))
+                else:
+                    print(f"Not able to fetch {res.url} ({res.status or res.error})")
+                    stage.count(failures = 1)
+
+        links = list(dict.fromkeys(link for source_code in sources for link in parse_links(source_code)))
+        stage.count(pages = len(sources), links = len(links))
+    return links
+
+
+def extract_speeches(links, mode = "http", fetcher = None, driver_pool = None, store = None,
+                     processes = 1, **fetcher_args):
+    """
+    Takes a list of article links and returns a dataframe with their title, date,
+    speech and link.
+
+    mode = "http" fetches the articles concurrently through a Fetcher (extra keyword
+    arguments are passed to it). Articles that fail to download or to parse are loaded
+    again through the driver pool when one is given. mode = "selenium" loads every
+    article through the driver pool. Every page is saved to `store` (an HtmlStore) as
+    soon as it arrives.
+    """
+
+    links = list(dict.fromkeys(links))
+    pages = {}
+
+    def keep(link, source_code):
+        pages[link] = source_code
+        if store is not None:
+            store.put(link, source_code, source = SOURCE)
+
+    if mode not in ("http", "selenium"):
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    with metrics.stage("extract", source = SOURCE, mode = mode) as stage:
+        if mode == "http":
+            own_fetcher = fetcher is None
+            if own_fetcher:
+                fetcher = Fetcher(**fetcher_args)
+            try:
+                for res in fetcher.iter_fetch(links):
+                    if res.status == 200:
+                        keep(res.url, res.text)
+                        stage.count(bytes = len(res.text.encode("utf-8")))
+                    else:
+                        print(f"Not able to fetch {res.url} ({res.status or res.error})")
+                        stage.count(failures = 1)
+            finally:
+                if own_fetcher:
+                    fetcher.close()
+        else:
+            for link, source_code in zip(links, driver_pool.map(links)):
+                keep(link, source_code)
+        stage.count(pages = len(pages))
+
+    # Falling back to the browser for the articles we could not get or parse
+    parsed = {record["link"]: record for record in parse_batch(pages.items(), SOURCE, processes = processes)}
+    missing = [link for link in links if link not in parsed]
+    if missing and mode == "http" and driver_pool is not None:
+        print(f"Loading {len(missing)} articles through Selenium")
+        rendered = dict(zip(missing, driver_pool.map(missing)))
+        for link, source_code in rendered.items():
+            keep(link, source_code)
+        parsed.update({record["link"]: record
+                       for record in parse_batch(rendered.items(), SOURCE, processes = processes)})
+
+    return pd.DataFrame([parsed[link] for link in links if link in parsed], columns = COLUMNS)
+
+
+def replay(store, links = None, processes = None):
+    """
+    Rebuilds the Radio Nicaragua master data from the pages saved in an HtmlStore,
+    without any network access. Parsing is spread over `processes` worker processes.
+    """
+    pages = store.iter_pages(source = SOURCE, urls = links)
+
+    return pd.DataFrame(parse_batch(pages, SOURCE, processes = processes), columns = COLUMNS)
@@ -0,0 +1,345 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Full-text search
+Description:    Inverted indexes over the speeches, built once per data version into the search/ folder of the
+                snapshot and memory-mapped by the app. There are two fields: the lemmas of the token store
+                ("lemma") and the lowercased words of the raw transcripts ("text"), used for exact phrases.
+
+                Every field is stored as numpy arrays:
+                    vocab.txt           terms of the field
+                    term_offsets.npy    position of the postings of every term (int64, nterms + 1)
+                    docs.npy            document of every posting, delta-encoded within each term (int32)
+                    pos_offsets.npy     position of the positions of every posting (int64, npostings + 1)
+                    positions.npy       token positions, delta-encoded within each posting (int32)
+
+                The number of occurrences of a term in a document is the length of its positions. Queries
+                are words (AND), "exact phrases", OR between two items and -word / NOT word exclusions.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from speechdb import columnar, metrics
+
+FOLDER = "search"
+FORMAT = 1
+FIELDS = ["lemma", "text"]
+WORDS  = re.compile(r"\w+")
+QUERY  = re.compile(r'(-?)"([^"]*)"|(\S+)')
+META   = ["speech_id", "spoke_person", "date", "headline", "url"]
+
+
+def tokenize(text):
+    """
+    Lowercased words of a text, as indexed in the "text" field.
+    """
+    return WORDS.findall(str(text).lower())
+
+
+##============================##
+##          BUILDING          ##
+##============================##
+
+def _write_field(path, vocab, terms, docs, positions):
+    """
+    Writes the inverted index of one field from the (term, document, position) of every token.
+    """
+    os.makedirs(path, exist_ok = True)
+    order = np.lexsort((positions, docs, terms))
+    terms, docs, positions = terms[order], docs[order], positions[order]
+
+    # One posting per (term, document)
+    new_posting = np.ones(len(terms), dtype = bool)
+    new_posting[1:] = (terms[1:] != terms[:-1]) | (docs[1:] != docs[:-1])
+    starts = np.flatnonzero(new_posting)
+
+    post_terms = terms[starts]
+    post_docs  = docs[starts]
+    term_offsets = np.searchsorted(post_terms, np.arange(len(vocab) + 1)).astype(np.int64)
+
+    new_term = np.ones(len(starts), dtype = bool)
+    new_term[1:] = post_terms[1:] != post_terms[:-1]
+    doc_deltas = np.where(new_term, post_docs, post_docs - np.roll(post_docs, 1))
+
+    pos_deltas = np.where(new_posting, positions, positions - np.roll(positions, 1))
+    pos_offsets = np.append(starts, len(terms)).astype(np.int64)
+
+    with open(os.path.join(path, "vocab.txt"), "w", encoding = "utf-8") as file:
+        file.write("\n".join(vocab))
+    np.save(os.path.join(path, "term_offsets.npy"), term_offsets)
+    np.save(os.path.join(path, "docs.npy"), doc_deltas.astype(np.int32))
+    np.save(os.path.join(path, "pos_offsets.npy"), pos_offsets)
+    np.save(os.path.join(path, "positions.npy"), pos_deltas.astype(np.int32))
+
+
+def _flatten(docs_ids):
+    """
+    (term, document, position) arrays of a list of token id arrays.
+    """
+    lengths = np.array([len(ids) for ids in docs_ids], dtype = np.int64)
+    terms   = np.concatenate(docs_ids).astype(np.int32) if len(docs_ids) else np.zeros(0, np.int32)
+    docs    = np.repeat(np.arange(len(docs_ids), dtype = np.int32), lengths)
+    starts  = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return terms, docs, (np.arange(len(terms)) - starts).astype(np.int32)
+
+
+@metrics.timed("search")
+def build(snap):
+    """
+    Builds the search indexes of a data snapshot into its search/ folder. Documents follow
+    the order of speeches.parquet. Returns the folder.
+    """
+    speeches = columnar.read_speeches(snap.file("speeches.parquet"), columns = META + ["content"])
+    target   = snap.file(FOLDER)
+    staging  = tempfile.mkdtemp(dir = snap.path)
+    try:
+        # Raw text field
+        vocab, docs_ids = {}, []
+        for content in speeches["content"]:
+            docs_ids.append(np.fromiter((vocab.setdefault(word, len(vocab)) for word in tokenize(content)),
+                                        dtype = np.int32))
+        _write_field(os.path.join(staging, "text"), list(vocab), *_flatten(docs_ids))
+
+        # Lemma field, from the token store (aligned to the speeches through speech_id)
+        if snap.has("tokens"):
+            tokens   = snap.tokens
+            position = dict(zip(tokens.docs["speech_id"], range(len(tokens))))
+            docs_ids = [np.asarray(tokens.doc_ids(position[sid])) if sid in position else np.zeros(0, np.int32)
+                        for sid in speeches["speech_id"]]
+            _write_field(os.path.join(staging, "lemma"), tokens.vocab, *_flatten(docs_ids))
+
+        pq.write_table(pa.Table.from_pandas(speeches[META], preserve_index = False),
+                       os.path.join(staging, "docs.parquet"))
+        with open(os.path.join(staging, "FORMAT"), "w") as file:
+            json.dump({"format": FORMAT, "version": snap.version}, file)
+
+        shutil.rmtree(target, ignore_errors = True)
+        os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+    return target
+
+
+##============================##
+##          QUERYING          ##
+##============================##
+
+def _decode(deltas, lengths):
+    """
+    Prefix sums of delta-encoded values, restarted at the start of every segment.
+    """
+    values = np.cumsum(deltas, dtype = np.int64)
+    if len(lengths) > 1:
+        ends  = np.cumsum(lengths)[:-1]
+        base  = np.concatenate([[0], values[ends - 1]])
+        values -= np.repeat(base, lengths)
+    return values
+
+
+class Field:
+    """
+    Memory-mapped inverted index of one field.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "vocab.txt"), encoding = "utf-8") as file:
+            self.terms = {term: i for i, term in enumerate(file.read().split("\n"))}
+        self.term_offsets = np.load(os.path.join(path, "term_offsets.npy"), mmap_mode = "r")
+        self.docs         = np.load(os.path.join(path, "docs.npy"), mmap_mode = "r")
+        self.pos_offsets  = np.load(os.path.join(path, "pos_offsets.npy"), mmap_mode = "r")
+        self.positions    = np.load(os.path.join(path, "positions.npy"), mmap_mode = "r")
+
+    def postings(self, term):
+        """
+        Documents containing a term (sorted) and the number of occurrences in each.
+        """
+        t = self.terms.get(term)
+        if t is None:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        a, b = self.term_offsets[t], self.term_offsets[t + 1]
+        docs = np.cumsum(self.docs[a:b], dtype = np.int64)
+        return docs, np.diff(self.pos_offsets[a:b + 1]).astype(np.int64)
+
+    def term_positions(self, term, docs):
+        """
+        Positions of a term in the given documents (all of them contain it), as
+        document << 32 | position keys.
+        """
+        t = self.terms[term]
+        a, b = self.term_offsets[t], self.term_offsets[t + 1]
+        p = a + np.searchsorted(np.cumsum(self.docs[a:b], dtype = np.int64), docs)
+        starts  = self.pos_offsets[p]
+        lengths = self.pos_offsets[p + 1] - starts
+        index   = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        return (np.repeat(docs, lengths) << 32) | _decode(self.positions[index], lengths)
+
+    def phrase(self, words):
+        """
+        Documents containing the words in sequence and the number of matches in each.
+        """
+        if not words or any(word not in self.terms for word in words):
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        if len(words) == 1:
+            return self.postings(words[0])
+        docs = self.postings(words[0])[0]
+        for word in words[1:]:
+            docs = np.intersect1d(docs, self.postings(word)[0], assume_unique = True)
+        if not len(docs):
+            return docs, docs
+
+        starts = self.term_positions(words[0], docs)
+        for i, word in enumerate(words[1:], start = 1):
+            starts = starts[np.isin(starts + i, self.term_positions(word, docs), assume_unique = True)]
+        return np.unique(starts >> 32, return_counts = True)
+
+
+def _union(a, b):
+    """
+    Union of two (documents, hits) results; documents in both keep the largest hits.
+    """
+    docs = np.union1d(a[0], b[0])
+    hits = np.zeros(len(docs), dtype = np.int64)
+    for d, h in (a, b):
+        idx = np.searchsorted(docs, d)
+        hits[idx] = np.maximum(hits[idx], h)
+    return docs, hits
+
+
+def _intersect(a, b):
+    docs, ia, ib = np.intersect1d(a[0], b[0], assume_unique = True, return_indices = True)
+    return docs, a[1][ia] + b[1][ib]
+
+
+def parse(query):
+    """
+    Parses a query into groups (ANDed) of items (ORed). Every item is a tuple
+    (negated, kind, words) with kind "term" or "phrase".
+    """
+    groups, join, negate = [], False, False
+    for sign, phrase, word in QUERY.findall(query):
+        if word in ("OR", "|"):
+            join = bool(groups)
+            continue
+        if word in ("AND", "&"):
+            continue
+        if word == "NOT":
+            negate = True
+            continue
+        if phrase:
+            item = (negate or sign == "-", "phrase", tuple(tokenize(phrase)))
+        else:
+            negated = negate or word.startswith("-")
+            words   = tuple(tokenize(word))
+            if not words:
+                continue
+            item = (negated, "phrase" if len(words) > 1 else "term", words)
+        if not item[2]:
+            negate = False
+            continue
+        if join and not item[0] and not groups[-1][0][0]:
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+        join, negate = False, False
+    return groups
+
+
+class SearchIndex:
+    """
+    Search over the indexes of a data snapshot.
+    """
+
+    def __init__(self, path):
+        self.fields = {field: Field(os.path.join(path, field)) for field in FIELDS
+                       if os.path.exists(os.path.join(path, field))}
+        meta = pq.read_table(os.path.join(path, "docs.parquet")).to_pandas()
+        meta["date"]     = pd.to_datetime(meta["date"])
+        self.meta        = meta
+        self.speakers, self.speaker_codes = np.unique(meta["spoke_person"].to_numpy(str), return_inverse = True)
+        self.quarter_codes = (meta["date"].dt.year.to_numpy() - 1970) * 4 + (meta["date"].dt.month.to_numpy() - 1) // 3
+        self.dates         = meta["date"].to_numpy()
+
+    def _item(self, kind, words):
+        if kind == "phrase":
+            return self.fields["text"].phrase(list(words))
+        # Single words match a lemma or a word of the transcripts
+        result = (np.zeros(0, np.int64), np.zeros(0, np.int64))
+        for field in self.fields.values():
+            result = _union(result, field.postings(words[0]))
+        return result
+
+    def match(self, query):
+        """
+        Documents (positions in docs.parquet) matching a query and their number of hits.
+        """
+        result, exclude = None, []
+        for group in parse(query):
+            if group[0][0]:
+                exclude.append(self._item(*group[0][1:])[0])
+                continue
+            matched = (np.zeros(0, np.int64), np.zeros(0, np.int64))
+            for _, kind, words in group:
+                matched = _union(matched, self._item(kind, words))
+            result = matched if result is None else _intersect(result, matched)
+
+        if result is None:
+            if not exclude:
+                return np.zeros(0, np.int64), np.zeros(0, np.int64)
+            result = (np.arange(len(self.meta)), np.zeros(len(self.meta), dtype = np.int64))
+        for docs in exclude:
+            keep   = ~np.isin(result[0], docs)
+            result = (result[0][keep], result[1][keep])
+        return result
+
+    def search(self, query, page = 0, page_size = 10):
+        """
+        Runs a query and returns the number of matching speeches and hits, the hits per
+        speaker and per quarter, and one page of results (most hits first, then newest).
+        """
+        docs, hits = self.match(query)
+        order = np.lexsort((-self.dates[docs].astype(np.int64), -hits))
+        docs, hits = docs[order], hits[order]
+
+        speakers = np.bincount(self.speaker_codes[docs], weights = hits, minlength = len(self.speakers))
+        keys, inverse = np.unique(self.quarter_codes[docs] * len(self.speakers) + self.speaker_codes[docs],
+                                  return_inverse = True)
+        quarters = np.bincount(inverse, weights = hits, minlength = len(keys))
+
+        rows = self.meta.iloc[docs[page * page_size:(page + 1) * page_size]].copy()
+        rows["hits"] = hits[page * page_size:(page + 1) * page_size]
+        rows["date"] = rows["date"].dt.strftime("%Y-%m-%d")
+        return {
+            "nspeeches": int(len(docs)),
+            "nhits"    : int(hits.sum()),
+            "speakers" : {speaker: int(n) for speaker, n in zip(self.speakers, speakers) if n},
+            "quarterly": [{"quarter"     : f"{1970 + key // len(self.speakers) // 4}Q{key // len(self.speakers) % 4 + 1}",
+                           "spoke_person": self.speakers[key % len(self.speakers)],
+                           "hits"        : int(n)}
+                          for key, n in zip(keys, quarters)],
+            "npages"   : max(1, -(-len(docs) // page_size)),
+            "results"  : rows.to_dict("records")
+        }
+
+
+def load(snap):
+    """
+    Opens the search indexes of a data snapshot, building them first if they are missing
+    or were built by another version of this module.
+    """
+    try:
+        with open(os.path.join(snap.file(FOLDER), "FORMAT")) as file:
+            info = json.load(file)
+        if info.get("format") == FORMAT and info.get("version") == snap.version:
+            return SearchIndex(snap.file(FOLDER))
+    except (FileNotFoundError, ValueError):
+        pass
+    build(snap)
+    return SearchIndex(snap.file(FOLDER))
@@ -0,0 +1,153 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Sentiment
+Description:    Lexicon-based sentiment of the speeches, computed offline once per data version into the
+                sentiment/ folder of the snapshot. Every lemma of a Spanish lexicon (sentiment_es.tsv by default)
+                has a polarity between -1 and 1; the scores of all the speeches are a few sparse products of the
+                document-term matrix (speechdb/dtm.py) with the lexicon weights, so no text is processed again.
+                Speeches already scored with the same lexicon in a previous data version are not scored again;
+                they are matched by their key (a hash of the URL and the text, see Snapshot.speech_keys), since
+                speech_id is a row position that shifts when new speeches are added.
+                    speeches.parquet    speech_id, spoke_person, date, key, ntokens and the scores of every speech
+                    quarterly.parquet   number of speeches and mean scores per quarter and speaker
+
+                Scores are shares of the lemmas of a speech: positive and negative (lemmas with a positive or
+                negative polarity) and score (sum of the polarities, between -1 and 1).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from speechdb import dtm, metrics, snapshot
+
+FOLDER  = "sentiment"
+FORMAT  = 2
+LEXICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sentiment_es.tsv")
+SCORES  = ["positive", "negative", "score"]
+
+
+def load_lexicon(path = LEXICON):
+    """
+    Reads a lexicon file: a lemma and its polarity per line, tab separated (# for comments).
+    """
+    lexicon = {}
+    with open(path, encoding = "utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                lemma, polarity = line.split("\t")
+                lexicon[lemma] = float(polarity)
+    return lexicon
+
+
+def lexicon_version(lexicon):
+    return hashlib.sha256(json.dumps(lexicon, sort_keys = True).encode()).hexdigest()[:12]
+
+
+def score(doc_term, lexicon, rows = None):
+    """
+    Sentiment of the documents of a document-term matrix (only `rows` if given), as a
+    dataframe with their metadata.
+    """
+    polarity = np.array([lexicon.get(term, 0.0) for term in doc_term.vocab])
+    matrix   = doc_term.matrix if rows is None else doc_term.matrix[rows]
+    docs     = doc_term.docs if rows is None else doc_term.docs.iloc[rows]
+
+    ntokens  = np.asarray(matrix.sum(axis = 1)).ravel()
+    per_word = np.maximum(ntokens, 1)
+    return docs.reset_index(drop = True).assign(
+        ntokens  = ntokens,
+        positive = matrix @ (polarity > 0).astype(np.float64) / per_word,
+        negative = matrix @ (polarity < 0).astype(np.float64) / per_word,
+        score    = matrix @ polarity / per_word
+    )
+
+
+def trends(table, freq = "Q"):
+    """
+    Number of speeches and mean scores per period (e.g. quarter) and speaker.
+    """
+    periods = pd.to_datetime(table["date"]).dt.to_period(freq)
+    grouped = table.groupby([periods.rename("period"), "spoke_person"])
+    trend   = grouped[SCORES].mean().join(grouped.size().rename("nspeeches")).reset_index()
+    trend["period"] = trend["period"].astype(str)
+    return trend
+
+
+def _previous(snap, version):
+    # Speech scores of the newest other data version scored with the same lexicon
+    root = os.path.dirname(snap.path)
+    for name in reversed(snapshot._versions(root)):
+        folder = os.path.join(root, name, FOLDER)
+        if name == snap.version or not os.path.exists(os.path.join(folder, "FORMAT")):
+            continue
+        with open(os.path.join(folder, "FORMAT")) as file:
+            info = json.load(file)
+        if info.get("format") == FORMAT and info.get("lexicon") == version:
+            return pd.read_parquet(os.path.join(folder, "speeches.parquet"))
+    return None
+
+
+@metrics.timed("sentiment", counts = lambda scored: {"speeches": scored})
+def build(snap, lexicon_path = LEXICON):
+    """
+    Scores the speeches of a data snapshot and saves the tables in its folder. Speeches
+    scored in a previous version with the same lexicon are copied. Returns the number of
+    speeches scored.
+    """
+    lexicon  = load_lexicon(lexicon_path)
+    version  = lexicon_version(lexicon)
+    doc_term = dtm.load(snap)
+    docs     = doc_term.docs.reset_index(drop = True)
+    docs     = docs.assign(key = docs["speech_id"].map(snap.speech_keys))
+
+    known = _previous(snap, version)
+    if known is not None:
+        # Scores of the same speeches (same URL and text), with the metadata of this version
+        known  = known.drop_duplicates("key").set_index("key")[["ntokens"] + SCORES]
+        reused = docs["key"].isin(known.index).to_numpy()
+        rows   = np.flatnonzero(~reused)
+        new    = score(doc_term, lexicon, rows).assign(key = docs["key"].to_numpy()[rows])
+        table  = pd.concat([docs.loc[reused].join(known, on = "key"), new], ignore_index = True)
+    else:
+        new    = score(doc_term, lexicon).assign(key = docs["key"].to_numpy())
+        table  = new
+    table = table.sort_values(["spoke_person", "date", "speech_id"], kind = "stable")
+
+    target  = snap.file(FOLDER)
+    staging = tempfile.mkdtemp(dir = snap.path)
+    try:
+        table.to_parquet(os.path.join(staging, "speeches.parquet"), index = False)
+        trends(table).to_parquet(os.path.join(staging, "quarterly.parquet"), index = False)
+        with open(os.path.join(staging, "FORMAT"), "w") as file:
+            json.dump({"format": FORMAT, "version": snap.version, "lexicon": version}, file)
+        shutil.rmtree(target, ignore_errors = True)
+        os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+    return len(new)
+
+
+def load(snap, lexicon_path = LEXICON):
+    """
+    Returns the per-speech and quarterly sentiment tables of a data snapshot, building
+    them first if they are missing or were built for another version or lexicon.
+    """
+    folder = snap.file(FOLDER)
+    try:
+        with open(os.path.join(folder, "FORMAT")) as file:
+            info = json.load(file)
+        current = (info.get("format") == FORMAT and info.get("version") == snap.version
+                   and info.get("lexicon") == lexicon_version(load_lexicon(lexicon_path)))
+    except (FileNotFoundError, ValueError):
+        current = False
+    if not current:
+        build(snap, lexicon_path)
+    return (pd.read_parquet(os.path.join(folder, "speeches.parquet")),
+            pd.read_parquet(os.path.join(folder, "quarterly.parquet")))
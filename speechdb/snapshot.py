@@ -0,0 +1,285 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Data snapshots
+Description:    Versioned local snapshots of the data artifacts used by the app, so that workers boot from
+                local files instead of downloading and parsing the data from GitHub.
+
+                Data/snapshot/
+                    CURRENT                 name of the version in use
+                    <version>/MANIFEST.json SHA-256 and size of every file in the version
+                    <version>/...           speeches.parquet, tokens/ and the derived artifacts (search/, dtm/, ...)
+
+                The version name is derived from the content of the data files, so every data update gets a new
+                one. Derived artifacts built in a version (see speechdb/publish.py) are added to its manifest,
+                so they are published and downloaded along with the data. Artifacts are loaded lazily on first use. When there is no local snapshot it is downloaded
+                from a remote copy of the folder or, if that fails, built by a fallback (e.g. from the published
+                speech_data.csv, see speechdb/publish.py). An optional background thread checks the remote copy
+                and downloads new versions; workers pick them up on their next boot.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import cached_property
+
+import requests
+
+from speechdb import columnar
+
+ARTIFACTS = ["speeches.parquet", "tokens"]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _list_files(base, artifacts):
+    files = []
+    for artifact in artifacts:
+        path = os.path.join(base, artifact)
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                files.extend(os.path.relpath(os.path.join(folder, name), base) for name in names)
+        elif os.path.exists(path):
+            files.append(artifact)
+    return sorted(file.replace(os.sep, "/") for file in files)
+
+
+def _write_text(path, text):
+    fd, tmp = tempfile.mkstemp(dir = os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding = "utf-8") as file:
+        file.write(text)
+    os.replace(tmp, path)
+
+
+def build_snapshot(data_dir, root = None, artifacts = ARTIFACTS, keep = 2):
+    """
+    Copies the artifacts found in data_dir into a new snapshot version and makes it the
+    current one. Only the last `keep` versions are kept. Returns the version name.
+    """
+    root  = root or os.path.join(data_dir, "snapshot")
+    files = _list_files(data_dir, artifacts)
+    if not files:
+        raise FileNotFoundError(f"None of {artifacts} found in {data_dir}")
+
+    hashes  = {file: _sha256(os.path.join(data_dir, file)) for file in files}
+    version = hashlib.sha256(json.dumps(hashes, sort_keys = True).encode()).hexdigest()[:12]
+    target  = os.path.join(root, version)
+
+    if not os.path.exists(target):
+        os.makedirs(root, exist_ok = True)
+        staging = tempfile.mkdtemp(dir = root)
+        for file in files:
+            os.makedirs(os.path.dirname(os.path.join(staging, file)), exist_ok = True)
+            shutil.copy2(os.path.join(data_dir, file), os.path.join(staging, file))
+        manifest = {
+            "version": version,
+            "created": datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+            "files"  : {file: {"sha256": hashes[file],
+                               "bytes" : os.path.getsize(os.path.join(data_dir, file))}
+                        for file in files}
+        }
+        with open(os.path.join(staging, "MANIFEST.json"), "w", encoding = "utf-8") as file:
+            json.dump(manifest, file, indent = 1)
+        os.replace(staging, target)
+
+    _write_text(os.path.join(root, "CURRENT"), version)
+    _prune(root, version, keep)
+    return version
+
+
+def add_files(path, artifacts):
+    """
+    Adds the files of artifacts built in a snapshot version folder (e.g. search/) to its
+    manifest, replacing their previous entries. The version name does not change.
+    """
+    with open(os.path.join(path, "MANIFEST.json"), encoding = "utf-8") as file:
+        manifest = json.load(file)
+    manifest["files"] = {
+        file: info for file, info in manifest["files"].items()
+        if not any(file == artifact or file.startswith(artifact + "/") for artifact in artifacts)
+    }
+    for file in _list_files(path, artifacts):
+        manifest["files"][file] = {"sha256": _sha256(os.path.join(path, file)),
+                                   "bytes" : os.path.getsize(os.path.join(path, file))}
+    _write_text(os.path.join(path, "MANIFEST.json"), json.dumps(manifest, indent = 1))
+    return manifest
+
+
+def _versions(root):
+    versions = [name for name in os.listdir(root)
+                if os.path.exists(os.path.join(root, name, "MANIFEST.json"))]
+    return sorted(versions, key = lambda name: os.path.getmtime(os.path.join(root, name, "MANIFEST.json")))
+
+
+def _prune(root, current, keep):
+    old = [name for name in _versions(root) if name != current]
+    for name in old[:max(0, len(old) - (keep - 1))]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors = True)
+
+
+def fetch_snapshot(remote, root):
+    """
+    Downloads the current version of a remote snapshot folder (e.g. the raw GitHub URL of
+    Data/snapshot/) into root, checking every file against the manifest. Returns the
+    version name, or None if it was already there.
+    """
+    remote  = remote.rstrip("/") + "/"
+    version = requests.get(remote + "CURRENT", timeout = 30)
+    version.raise_for_status()
+    version = version.text.strip()
+
+    target = os.path.join(root, version)
+    if os.path.exists(os.path.join(target, "MANIFEST.json")):
+        if _current(root) != version:
+            _write_text(os.path.join(root, "CURRENT"), version)
+        return None
+
+    manifest = requests.get(f"{remote}{version}/MANIFEST.json", timeout = 30)
+    manifest.raise_for_status()
+    manifest = manifest.json()
+
+    os.makedirs(root, exist_ok = True)
+    staging = tempfile.mkdtemp(dir = root)
+    for file, info in manifest["files"].items():
+        response = requests.get(f"{remote}{version}/{file}", timeout = 120)
+        response.raise_for_status()
+        if hashlib.sha256(response.content).hexdigest() != info["sha256"]:
+            shutil.rmtree(staging, ignore_errors = True)
+            raise ValueError(f"Checksum mismatch for {file} in snapshot {version}")
+        path = os.path.join(staging, file)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(path, "wb") as out:
+            out.write(response.content)
+    with open(os.path.join(staging, "MANIFEST.json"), "w", encoding = "utf-8") as file:
+        json.dump(manifest, file, indent = 1)
+
+    os.replace(staging, target)
+    _write_text(os.path.join(root, "CURRENT"), version)
+    return version
+
+
+def _current(root):
+    try:
+        with open(os.path.join(root, "CURRENT"), encoding = "utf-8") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class Snapshot:
+    """
+    One version of the data. Every artifact is loaded on first access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "MANIFEST.json"), encoding = "utf-8") as file:
+            self.manifest = json.load(file)
+        self.version = self.manifest["version"]
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def has(self, name):
+        return os.path.exists(self.file(name))
+
+    @cached_property
+    def speeches(self):
+        return columnar.read_speeches(self.file("speeches.parquet"))
+
+    @cached_property
+    def tokens(self):
+        return columnar.TokenStore.open(self.file("tokens"))
+
+    @cached_property
+    def speech_keys(self):
+        return columnar.speech_keys(self.file("speeches.parquet"))
+
+
+@contextmanager
+def lock(root, timeout = 1800):
+    """
+    Exclusive lock on a snapshot folder shared by several processes (e.g. the workers of
+    a server booting together): a lock file created atomically, taken over when it is
+    older than `timeout` seconds.
+    """
+    os.makedirs(root, exist_ok = True)
+    path = os.path.join(root, ".lock")
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > timeout:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.2)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def load(root, remote = None, fallback = None):
+    """
+    Opens the current local snapshot. If there is none, it is downloaded from the remote
+    first (once, later boots are local) or, if there is no remote or the download fails,
+    built by fallback(root).
+    """
+    if _current(root) is None:
+        if remote is None and fallback is None:
+            raise FileNotFoundError(f"No data snapshot in {root}")
+        with lock(root):
+            if _current(root) is None:
+                _obtain(root, remote, fallback)
+    return Snapshot(os.path.join(root, _current(root)))
+
+
+def _obtain(root, remote, fallback):
+    if remote is not None:
+        try:
+            fetch_snapshot(remote, root)
+            return
+        except (requests.RequestException, ValueError) as err:
+            if fallback is None:
+                raise
+            print(f"Not able to download the data snapshot ({err}), building it locally")
+    fallback(root)
+
+
+def start_refresh(root, remote, interval = 3600):
+    """
+    Starts a daemon thread checking the remote snapshot every `interval` seconds and
+    downloading new versions. Errors (e.g. GitHub being unavailable) are only printed.
+    """
+    def refresh():
+        while not stop.is_set():
+            try:
+                version = fetch_snapshot(remote, root)
+                if version:
+                    print(f"Data snapshot {version} downloaded, it will be used from the next worker boot")
+            except (requests.RequestException, ValueError, OSError) as err:
+                print(f"Not able to refresh the data snapshot: {err}")
+            stop.wait(interval)
+
+    stop   = threading.Event()
+    thread = threading.Thread(target = refresh, name = "snapshot-refresh", daemon = True)
+    thread.start()
+    return stop
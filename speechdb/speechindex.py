@@ -0,0 +1,132 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Speech index
+Description:    In-memory index of the speeches for the interactive filters of the app. For every speaker it
+                keeps the speech dates sorted in an array, the prefix sums of their number of words and the
+                position where every quarter starts, so the count, mean length and quarterly counts of any
+                (speaker, date range) selection come from binary searches, without scanning the speeches.
+                The aggregates have the same layout as those of speechdb/figures.py.
+"""
+
+import numpy as np
+import pandas as pd
+
+from speechdb import columnar
+
+COLUMNS = ["spoke_person", "date", "nwords"]
+
+
+def _days(dates):
+    return np.asarray(pd.to_datetime(dates).values.astype("datetime64[D]").astype(np.int64))
+
+
+def _day(value):
+    return int(pd.Timestamp(value).to_datetime64().astype("datetime64[D]").astype(np.int64))
+
+
+def _quarters(days):
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    return months // 3
+
+
+def _month(day):
+    return str(np.datetime64(int(day), "D").astype("datetime64[M]"))
+
+
+def _quarter(quarter):
+    return f"{1970 + quarter // 4}Q{quarter % 4 + 1}"
+
+
+class SpeakerIndex:
+    """
+    Date-sorted arrays of the speeches of one speaker.
+    """
+
+    def __init__(self, days, nwords):
+        order       = np.argsort(days, kind = "stable")
+        self.days   = days[order]
+        self.words  = np.concatenate([[0], np.cumsum(nwords[order], dtype = np.int64)])
+
+        # Quarter of every speech (quarters since 1970) and position of the first speech of each one
+        quarters = _quarters(self.days)
+        self.quarters, starts = np.unique(quarters, return_index = True)
+        self.bounds = np.append(starts, len(self.days))
+
+    def __len__(self):
+        return len(self.days)
+
+    def positions(self, start = None, end = None):
+        """
+        Positions [lo, hi) of the speeches within a date range (days since 1970, inclusive).
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.days, start, side = "left"))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, end, side = "right"))
+        return lo, max(lo, hi)
+
+    def quarterly(self, lo, hi):
+        """
+        Quarters and number of speeches of every quarter between the positions lo and hi.
+        """
+        if lo >= hi:
+            return self.quarters[:0], self.bounds[:0]
+        first = int(np.searchsorted(self.bounds, lo, side = "right")) - 1
+        last  = int(np.searchsorted(self.bounds, hi, side = "left"))
+        edges = np.clip(self.bounds[first:last + 1], lo, hi)
+        return self.quarters[first:last], np.diff(edges)
+
+
+class SpeechIndex:
+    """
+    Index of the speeches of every speaker.
+    """
+
+    def __init__(self, df):
+        days = _days(df["date"])
+        self.speakers = {
+            speaker: SpeakerIndex(days[mask], df["nwords"].to_numpy(np.int64)[mask])
+            for speaker in sorted(df["spoke_person"].unique())
+            for mask in [(df["spoke_person"] == speaker).to_numpy()]
+        }
+
+    @classmethod
+    def from_parquet(cls, path):
+        return cls(columnar.read_speeches(path, columns = COLUMNS))
+
+    def aggregate(self, speakers = None, start = None, end = None):
+        """
+        Aggregates of the speeches of the given speakers (all if None) within a date
+        range, with the layout of figures.aggregate().
+        """
+        start = None if start is None else _day(start)
+        end   = None if end is None else _day(end)
+
+        agg = {"nspeeches": 0, "first_date": None, "last_date": None, "first_month": None, "last_month": None,
+               "speakers": {}, "quarterly": []}
+        first, last = [], []
+        for speaker, index in self.speakers.items():
+            if speakers is not None and speaker not in speakers:
+                continue
+            lo, hi = index.positions(start, end)
+            if lo == hi:
+                continue
+            agg["nspeeches"] += hi - lo
+            agg["speakers"][speaker] = {
+                "count"      : hi - lo,
+                "mean_nwords": float(index.words[hi] - index.words[lo]) / (hi - lo)
+            }
+            first.append(index.days[lo])
+            last.append(index.days[hi - 1])
+            agg["quarterly"].extend(
+                {"quarter": quarter, "spoke_person": speaker, "count": int(count)}
+                for quarter, count in zip(*index.quarterly(lo, hi))
+            )
+
+        agg["quarterly"].sort(key = lambda row: (row["quarter"], row["spoke_person"]))
+        for row in agg["quarterly"]:
+            row["quarter"] = _quarter(int(row["quarter"]))
+        if first:
+            agg["first_date"]  = str(np.datetime64(int(min(first)), "D"))
+            agg["last_date"]   = str(np.datetime64(int(max(last)), "D"))
+            agg["first_month"] = _month(min(first))
+            agg["last_month"]  = _month(max(last))
+        return agg
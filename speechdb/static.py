@@ -0,0 +1,118 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Static resources
+Description:    Serving of the large static pages of the app (e.g. the LDAvis visualizations) outside of the
+                Dash layout. Every file gets precompressed gzip (and brotli, when the brotli package is
+                installed) variants, is addressed through a URL carrying a fingerprint of its content and is
+                served with long-lived cache headers, so browsers download it once per version. The variants
+                are written to a cache folder (SPEECHDB_CACHE, by default in the temporary folder of the
+                system), named after the fingerprint of the file, never next to the file itself.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAX_AGE = 365 * 24 * 3600
+CACHE   = os.environ.get("SPEECHDB_CACHE", os.path.join(tempfile.gettempdir(), "speechdb", "static"))
+
+
+def variant(path, ext, etag = None, cache = CACHE):
+    """
+    Path of a precompressed variant (ext: .gz or .br) of a file in the cache folder.
+    """
+    name, suffix = os.path.splitext(os.path.basename(path))
+    return os.path.join(cache, f"{name}.{etag or fingerprint(path)}{suffix}{ext}")
+
+
+def precompress(path, cache = CACHE):
+    """
+    Writes the .gz (and .br) variants of a file to the cache folder, unless they exist.
+    Returns the encodings available for the file.
+    """
+    encodings = []
+    with open(path, "rb") as file:
+        data = file.read()
+    etag = hashlib.sha256(data).hexdigest()[:12]
+    os.makedirs(cache, exist_ok = True)
+    for encoding, ext, compress in [
+        ("br",   ".br", brotli.compress if brotli is not None else None),
+        ("gzip", ".gz", lambda data: gzip.compress(data, compresslevel = 9, mtime = 0))
+    ]:
+        if compress is None:
+            continue
+        target = variant(path, ext, etag, cache)
+        if not os.path.exists(target):
+            # Written aside and renamed: other workers may be serving the same variant
+            staging = f"{target}.{os.getpid()}.tmp"
+            with open(staging, "wb") as file:
+                file.write(compress(data))
+            os.replace(staging, target)
+        encodings.append(encoding)
+    return encodings
+
+
+def fingerprint(path):
+    """
+    Short hash of the content of a file, used in its URL and as its ETag.
+    """
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()[:12]
+
+
+def _accepted(header):
+    """
+    Encodings of an Accept-Encoding header, without those with q=0.
+    """
+    accepted = set()
+    for item in header.split(","):
+        encoding, _, params = item.partition(";")
+        try:
+            q = float(params.strip()[2:]) if params.strip().startswith("q=") else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def send_static(path, etag = None, cache = CACHE):
+    """
+    Flask response with the best precompressed variant of a file the client accepts,
+    long-lived cache headers and support for If-None-Match.
+    """
+    version = etag or fingerprint(path)
+    # Weak ETag: the compressed variants are equivalent representations of the same file
+    etag = f'W/"{version}"'
+    headers = {
+        "Cache-Control": f"public, max-age={MAX_AGE}, immutable",
+        "ETag"         : etag,
+        "Vary"         : "Accept-Encoding"
+    }
+    if etag[2:] in request.headers.get("If-None-Match", ""):
+        return Response(status = 304, headers = headers)
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    accepted = _accepted(request.headers.get("Accept-Encoding", ""))
+    for encoding, ext in [("br", ".br"), ("gzip", ".gz")]:
+        if encoding in accepted and os.path.exists(variant(path, ext, version, cache)):
+            with open(variant(path, ext, version, cache), "rb") as file:
+                body = file.read()
+            headers["Content-Encoding"] = encoding
+            break
+    else:
+        with open(path, "rb") as file:
+            body = file.read()
+
+    if mimetype.startswith("text/"):
+        mimetype += "; charset=utf-8"
+    return Response(body, content_type = mimetype, headers = headers)
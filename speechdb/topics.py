@@ -0,0 +1,360 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Topic model selection
+Description:    Sweep of LDA models over a grid of number of topics, alpha and passes for every speaker. The
+                runs are spread over a process pool (one single-core LdaModel per run); every worker memory-maps
+                the same saved document-term matrix and builds the pruned corpus of a speaker once. Every run
+                is scored by its u_mass coherence (on the training speeches) and its perplexity (on a held-out
+                share of the speeches). The best model of every speaker and the report of all the runs are
+                saved in a folder (topics/ in the snapshot):
+                    report.csv          parameters, scores and training time of every run
+                    best.json           parameters and scores of the best run of every speaker
+                    <speaker>/model*    best LdaModel of the speaker (gensim files, "all" for the whole corpus)
+                    doc_topics.parquet  topic mixture of every speech (speech_id, spoke_person, date, key, topic,
+                                        weight)
+                    topic_terms.json    top terms of every topic of every speaker
+
+                New data versions do not need a new sweep: update() takes the models of the previous version,
+                infers the topic mixtures of the speeches missing from its table (optionally updating the
+                models online with them) and saves the result in the topics/ folder of the new version.
+                Speeches are matched by their key (a hash of the URL and the text, see Snapshot.speech_keys):
+                speech_id is a row position that shifts when new speeches are added, and a speech whose text
+                changed gets a new key, so its mixture is inferred again.
+
+                python -m speechdb.topics --snapshot Data/snapshot --workers 8
+"""
+
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from speechdb import dtm, metrics, snapshot
+
+FOLDER   = "topics"
+FORMAT   = 2
+TABLE    = "doc_topics.parquet"
+TERMS    = "topic_terms.json"
+COLUMNS  = ["speech_id", "spoke_person", "date", "key", "topic", "weight"]
+SPEAKERS = ["Daniel", "Rosario"]
+GRID     = {
+    "num_topics": [3, 4, 5, 6, 8],
+    "alpha"     : ["symmetric", "auto"],
+    "passes"    : [10]
+}
+
+
+def _name(speaker):
+    return "all" if speaker is None else speaker
+
+
+def corpus(doc_term, speaker = None, low_value = 0.025, top = None):
+    """
+    Gensim corpus and dictionary of the speeches of a speaker (all if None), without their
+    low value TF-IDF terms (see dtm.DTM.prune). The same corpus the sweep trains on.
+    """
+    return doc_term.select(speaker).prune(low_value = low_value, top = top).compact().to_gensim()
+
+
+@lru_cache(maxsize = None)
+def _corpora(path, speaker, low_value, top, holdout):
+    # Built once per worker process and speaker: training and held-out corpora (every n-th speech)
+    from gensim.matutils import Sparse2Corpus
+
+    docs, dictionary = corpus(dtm.DTM.open(path), speaker, low_value, top)
+    matrix = docs.sparse.T.tocsr()
+    step   = round(1 / holdout) if holdout else 0
+    test   = (np.arange(matrix.shape[0]) % step == step - 1) if step > 1 else np.zeros(matrix.shape[0], bool)
+    train  = Sparse2Corpus(matrix[~test], documents_columns = False)
+    test   = Sparse2Corpus(matrix[test], documents_columns = False) if test.any() else train
+    return train, test, dictionary
+
+
+def _run(task):
+    from gensim.models import CoherenceModel, LdaModel
+
+    path, folder, run, speaker, params, low_value, top, holdout, seed = task
+    train, test, dictionary = _corpora(path, speaker, low_value, top, holdout)
+
+    start = time.perf_counter()
+    model = LdaModel(train, id2word = dictionary, random_state = seed, chunksize = 100, update_every = 1, **params)
+    seconds = time.perf_counter() - start
+
+    coherence  = CoherenceModel(model = model, corpus = train, dictionary = dictionary,
+                                coherence = "u_mass").get_coherence()
+    perplexity = 2 ** -model.log_perplexity(test)
+
+    os.makedirs(os.path.join(folder, str(run)))
+    model.save(os.path.join(folder, str(run), "model"))
+    return dict(run = run, speaker = _name(speaker), **params, coherence = float(coherence),
+                perplexity = float(perplexity), seconds = seconds)
+
+
+@metrics.timed("topics.sweep", counts = lambda report: {"runs": len(report)})
+def sweep(path, folder, speakers = (None,), grid = GRID, low_value = 0.025, top = None, holdout = 0.1,
+          seed = 100, workers = None):
+    """
+    Trains an LDA model for every speaker (None for the whole corpus) and combination of the
+    grid, on the document-term matrix saved in `path`, spread over `workers` processes (all
+    cores if None, no pool if 1). The best model of every speaker (highest coherence, then
+    lowest perplexity) and the report are saved in `folder`. Returns the report.
+    """
+    combinations = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    tasks        = list(itertools.product(speakers, combinations))
+
+    parent  = os.path.dirname(os.path.abspath(folder))
+    os.makedirs(parent, exist_ok = True)
+    staging = tempfile.mkdtemp(dir = parent)
+    runs    = os.path.join(staging, "runs")
+    try:
+        tasks = [(path, runs, run, speaker, params, low_value, top, holdout, seed)
+                 for run, (speaker, params) in enumerate(tasks)]
+        if workers == 1:
+            results = list(map(_run, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers = min(workers or os.cpu_count(), len(tasks))) as pool:
+                results = list(pool.map(_run, tasks))
+        for result in results:
+            metrics.observe("lda_run_seconds", result["seconds"], speaker = result["speaker"])
+
+        report = pd.DataFrame(results)
+        report = report.sort_values(["speaker", "coherence", "perplexity"], ascending = [True, False, True],
+                                    kind = "stable")
+        best   = report.groupby("speaker", sort = False).head(1)
+        report["best"] = report["run"].isin(best["run"])
+
+        for row in best.itertuples():
+            os.replace(os.path.join(runs, str(row.run)), os.path.join(staging, row.speaker))
+        shutil.rmtree(runs)
+        report.drop(columns = "run").to_csv(os.path.join(staging, "report.csv"), index = False)
+        with open(os.path.join(staging, "best.json"), "w", encoding = "utf-8") as file:
+            json.dump({row["speaker"]: row for row in best.drop(columns = "run").to_dict("records")}, file,
+                      indent = 1)
+
+        shutil.rmtree(folder, ignore_errors = True)
+        os.replace(staging, folder)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+    return report.drop(columns = "run").reset_index(drop = True)
+
+
+def load_models(folder):
+    """
+    Returns the best LdaModel of every speaker saved by sweep().
+    """
+    from gensim.models import LdaModel
+
+    with open(os.path.join(folder, "best.json"), encoding = "utf-8") as file:
+        best = json.load(file)
+    return {speaker: LdaModel.load(os.path.join(folder, speaker, "model")) for speaker in best}
+
+
+##============================##
+##         INFERENCE          ##
+##============================##
+
+def _bows(model, doc_term):
+    # Counts of the documents with the term ids of the model (terms it does not know are left out)
+    from gensim.matutils import Sparse2Corpus
+    from scipy import sparse
+
+    token2id = model.id2word.token2id
+    lookup   = np.array([token2id.get(term, -1) for term in doc_term.vocab], dtype = np.int64)
+    ids      = lookup[np.asarray(doc_term.indices)]
+    known    = ids >= 0
+    rows     = np.repeat(np.arange(len(doc_term)), np.diff(doc_term.indptr))
+    matrix   = sparse.csr_matrix((np.asarray(doc_term.data)[known], (rows[known], ids[known])),
+                                 shape = (len(doc_term), model.num_terms))
+    return list(Sparse2Corpus(matrix, documents_columns = False))
+
+
+def _keyed(snap):
+    # Document-term matrix of a snapshot with the key of every speech in its metadata
+    doc_term      = dtm.load(snap)
+    doc_term.docs = doc_term.docs.assign(key = doc_term.docs["speech_id"].map(snap.speech_keys).to_numpy())
+    return doc_term
+
+
+def infer(models, doc_term, known = (), online = False):
+    """
+    Topic mixtures of the speeches of a document-term matrix (with a key column in its
+    metadata) whose key is not in `known`, for every speaker with a model. With online,
+    the models are first updated with those speeches. Returns the rows to add to the
+    topic table.
+    """
+    tables = []
+    for speaker, model in models.items():
+        docs = doc_term.select(None if speaker == "all" else speaker)
+        new  = ~docs.docs["key"].isin(known).to_numpy()
+        if not new.any():
+            continue
+        rows = np.flatnonzero(new)
+        bows = [bow for i, bow in enumerate(_bows(model, docs)) if new[i]]
+        if online:
+            model.update(bows)
+
+        gamma, _ = model.inference(bows)
+        weights  = gamma / gamma.sum(axis = 1, keepdims = True)
+        meta     = docs.docs.iloc[rows]
+        tables.append(pd.DataFrame({
+            "speech_id"   : np.repeat(meta["speech_id"].to_numpy(), model.num_topics),
+            "spoke_person": np.repeat(meta["spoke_person"].to_numpy(), model.num_topics),
+            "date"        : np.repeat(meta["date"].to_numpy(), model.num_topics),
+            "key"         : np.repeat(meta["key"].to_numpy(), model.num_topics),
+            "topic"       : np.tile(np.arange(model.num_topics, dtype = np.int16), len(rows)),
+            "weight"      : weights.ravel().astype(np.float32)
+        }))
+    if not tables:
+        return pd.DataFrame(columns = COLUMNS)
+    return pd.concat(tables, ignore_index = True)
+
+
+def prevalence(table, speaker, freq = "Q"):
+    """
+    Mean weight of every topic of a speaker per period (e.g. quarter).
+    """
+    rows = table.loc[table["spoke_person"] == speaker]
+    return (
+        rows
+        .groupby([pd.to_datetime(rows["date"]).dt.to_period(freq).rename("period"), "topic"])["weight"]
+        .mean()
+        .reset_index()
+    )
+
+
+def _save_results(folder, models, table, version):
+    terms = {speaker: [[term for term, _ in model.show_topic(topic, topn = 10)]
+                       for topic in range(model.num_topics)]
+             for speaker, model in models.items()}
+    table = table.sort_values(["spoke_person", "date", "speech_id", "topic"], kind = "stable")
+    table.to_parquet(os.path.join(folder, TABLE), index = False)
+    with open(os.path.join(folder, TERMS), "w", encoding = "utf-8") as file:
+        json.dump(terms, file, ensure_ascii = False)
+    with open(os.path.join(folder, "FORMAT"), "w") as file:
+        json.dump({"format": FORMAT, "version": version}, file)
+
+
+##============================##
+##          SNAPSHOT          ##
+##============================##
+
+def build(snap, speakers = SPEAKERS, **options):
+    """
+    Runs the sweep on the document-term matrix of a data snapshot and saves the results,
+    with the topic mixture of every speech, in its folder. Returns the report.
+    """
+    doc_term = _keyed(snap)
+    target   = snap.file(FOLDER)
+    report   = sweep(snap.file(dtm.FOLDER), target, speakers = speakers, **options)
+    models   = load_models(target)
+    _save_results(target, models, infer(models, doc_term), snap.version)
+    return report
+
+
+def _trained(folder):
+    try:
+        with open(os.path.join(folder, "FORMAT")) as file:
+            return json.load(file).get("format") == FORMAT
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+@metrics.timed("topics.update", counts = lambda added: {"speeches": added})
+def update(snap, online = False):
+    """
+    Brings the topics of a data snapshot up to date without a new sweep: the models of this
+    version (or else of the newest previous one) give the topic mixtures of the speeches
+    missing from their table, and are updated online with them if asked. Returns the number
+    of speeches added. Raises FileNotFoundError if no version has topic models.
+    """
+    root     = os.path.dirname(snap.path)
+    versions = [snap.version] + [name for name in reversed(snapshot._versions(root)) if name != snap.version]
+    sources  = [os.path.join(root, name, FOLDER) for name in versions]
+    source   = next((folder for folder in sources if _trained(folder)), None)
+    if source is None:
+        raise FileNotFoundError(f"No topic models to update snapshot {snap.version}, run topics.build() first")
+
+    doc_term = _keyed(snap)
+    models   = load_models(source)
+    table    = pd.read_parquet(os.path.join(source, TABLE))
+    if "key" not in table.columns:
+        # Tables of earlier versions of this module are keyed by speech_id only
+        table = pd.DataFrame(columns = COLUMNS)
+    # Mixtures of the speeches still in the data (same URL and text), with the metadata of this version
+    docs     = doc_term.docs[["speech_id", "spoke_person", "date", "key"]]
+    table    = table[["key", "topic", "weight"]].drop_duplicates(["key", "topic"]).merge(docs, on = "key")[COLUMNS]
+    new      = infer(models, doc_term, known = set(table["key"]), online = online)
+
+    target  = snap.file(FOLDER)
+    staging = tempfile.mkdtemp(dir = snap.path)
+    try:
+        for name in os.listdir(source):
+            path = os.path.join(source, name)
+            if os.path.isdir(path):
+                shutil.copytree(path, os.path.join(staging, name))
+            elif name in ("report.csv", "best.json"):
+                shutil.copy2(path, staging)
+        if online:
+            for speaker, model in models.items():
+                model.save(os.path.join(staging, speaker, "model"))
+        table = pd.concat([table, new], ignore_index = True) if len(new) else table
+        _save_results(staging, models, table, snap.version)
+        shutil.rmtree(target, ignore_errors = True)
+        os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors = True)
+    return new["speech_id"].nunique()
+
+
+def _current(snap):
+    try:
+        with open(os.path.join(snap.file(FOLDER), "FORMAT")) as file:
+            info = json.load(file)
+    except (FileNotFoundError, ValueError):
+        info = {}
+    if info.get("format") != FORMAT or info.get("version") != snap.version:
+        raise FileNotFoundError(f"No topic models for snapshot {snap.version}, run topics.build() or update() first")
+    return snap.file(FOLDER)
+
+
+def load(snap):
+    """
+    Returns the best LdaModel of every speaker of a data snapshot. Unlike the other
+    artifacts the sweep is not run on demand: raises FileNotFoundError if build() or
+    update() was not run for this data version.
+    """
+    return load_models(_current(snap))
+
+
+def load_table(snap):
+    """
+    Returns the topic table of a data snapshot and the top terms of every topic (no gensim
+    needed). Raises FileNotFoundError like load().
+    """
+    folder = _current(snap)
+    with open(os.path.join(folder, TERMS), encoding = "utf-8") as file:
+        terms = json.load(file)
+    return pd.read_parquet(os.path.join(folder, TABLE)), terms
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description = "LDA model selection sweep")
+    parser.add_argument("--snapshot",   default = os.path.join("Data", "snapshot"))
+    parser.add_argument("--workers",    type = int, default = None)
+    parser.add_argument("--num-topics", type = int, nargs = "+", default = GRID["num_topics"])
+    parser.add_argument("--alpha",      nargs = "+", default = GRID["alpha"])
+    parser.add_argument("--passes",     type = int, nargs = "+", default = GRID["passes"])
+    args = parser.parse_args()
+
+    grid   = {"num_topics": args.num_topics, "alpha": args.alpha, "passes": args.passes}
+    report = build(snapshot.load(args.snapshot), grid = grid, workers = args.workers)
+    print(report.to_string(index = False))
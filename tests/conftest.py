@@ -0,0 +1,65 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Test fixtures
+Description:    Shared fixtures of the speechdb tests: small synthetic data snapshots (benchmarks/synthetic.py)
+                and a whitespace tokenizer standing in for NLTK's word_tokenize, so the tests need neither
+                the NLTK data nor spaCy.
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from benchmarks import synthetic
+from speechdb import columnar, snapshot
+
+
+def write_version(folder, data):
+    """
+    Writes speeches.parquet and tokens/ for a speech dataframe (speech_id is its row
+    position, as in speech_data.csv) and builds a new snapshot version in folder/snapshot.
+    Returns the snapshot.
+    """
+    os.makedirs(folder, exist_ok = True)
+    data = data.reset_index(drop = True)
+    columnar.write_speeches(data.assign(speech_id = data.index), os.path.join(folder, "speeches.parquet"))
+    columnar.write_tokens(os.path.join(folder, "tokens"), synthetic.make_tokens(data),
+                          data.assign(speech_id = data.index))
+    # Versions are ordered by the time of their manifest
+    time.sleep(0.05)
+    snapshot.build_snapshot(folder)
+    return snapshot.load(os.path.join(folder, "snapshot"))
+
+
+def prepend(data, n, seed = 7):
+    """
+    New speeches (with new URLs) followed by the speeches of data, so that every old
+    speech gets a new speech_id.
+    """
+    new = synthetic.make_speeches(n / synthetic.NSPEECHES, seed = seed)
+    new["url"] = [f"https://www.canal4.com.ni/new-speech-{i}/" for i in range(len(new))]
+    return pd.concat([new, data], ignore_index = True)
+
+
+@pytest.fixture(scope = "session")
+def speeches():
+    return synthetic.make_speeches(0.05, seed = 1)
+
+
+@pytest.fixture
+def snap(tmp_path, speeches):
+    return write_version(str(tmp_path), speeches)
+
+
+@pytest.fixture
+def whitespace_tokenizer(monkeypatch):
+    from speechdb import preprocess
+
+    monkeypatch.setattr(preprocess, "word_tokenize", lambda text, language = "spanish": text.split())
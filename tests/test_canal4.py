@@ -0,0 +1,30 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Canal 4 extraction tests
+Description:    A store added to an existing crawl is backfilled: finished pages missing from it are fetched
+                again, so replay() rebuilds the whole dataset.
+"""
+
+from local_server import LocalServer, load_fixtures
+from speechdb import canal4
+from speechdb.htmlstore import HtmlStore
+from speechdb.manifest import CrawlManifest
+
+
+def test_store_added_to_a_crawl_is_backfilled(tmp_path):
+    with LocalServer(load_fixtures("canal4"), latency = 0) as server, \
+            CrawlManifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        urls = [server.url(f"/speech-{i}/") for i in range(4)]
+        assert len(canal4.extract_content(urls[:2], manifest = manifest, rate = None)) == 2
+        assert server.hits == 2
+
+        with HtmlStore(str(tmp_path / "store")) as store:
+            data = canal4.extract_content(urls, manifest = manifest, store = store, rate = None)
+            assert server.hits == 6
+            assert store.missing(urls) == []
+            assert len(data) == 4
+
+            # Pages both finished and stored are not requested again
+            canal4.extract_content(urls, manifest = manifest, store = store, rate = None)
+            assert server.hits == 6
+            assert canal4.replay(store, urls, processes = 1).equals(data)
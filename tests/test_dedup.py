@@ -0,0 +1,73 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Near-duplicate detection tests
+Description:    Near-duplicates are dropped within a source whatever the order in which the sources are
+                deduplicated, matches across sources are only reported, and duplicates whose canonical
+                speech left the batch are kept until it comes back.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from speechdb import dedup
+
+RNG   = np.random.default_rng(0)
+WORDS = [f"palabra{i}" for i in range(3000)]
+TEXTS = [" ".join(RNG.choice(WORDS, 400)) for _ in range(4)]
+
+
+def _c4(rows):
+    return pd.DataFrame(rows, columns = ["url", "content"])
+
+
+def _rn(rows):
+    return pd.DataFrame(rows, columns = ["link", "speech"])
+
+
+def test_near_duplicates_are_found():
+    index   = dedup.DedupIndex()
+    edited  = TEXTS[0].replace(TEXTS[0].split()[5], "cambio", 1)
+    records = index.add(["a", "b", "c"], [TEXTS[0], edited, TEXTS[1]])
+    assert records["canonical"].tolist() == ["a", "a", "c"]
+    assert records["similarity"].iat[1] >= index.options["threshold"]
+    assert index.query([edited, TEXTS[2]])["match"].tolist() == ["a", None]
+
+
+@pytest.mark.parametrize("order", [["canal4", "radionicaragua"], ["radionicaragua", "canal4"]])
+def test_sources_keep_their_speeches_whatever_the_order(tmp_path, order):
+    folder  = str(tmp_path)
+    batches = {
+        "canal4"        : (_c4([("c0", TEXTS[0]), ("c1", TEXTS[1]), ("c1-bis", TEXTS[1] + " fin")]),
+                           {"key": "url", "text": "content"}),
+        "radionicaragua": (_rn([("r0", TEXTS[0]), ("r2", TEXTS[2])]), {"key": "link", "text": "speech"})
+    }
+    kept = {source: dedup.deduplicate(batches[source][0], folder, source, **batches[source][1])
+            for source in order}
+
+    assert kept["canal4"]["url"].tolist() == ["c0", "c1-bis"]
+    assert kept["radionicaragua"]["link"].tolist() == ["r0", "r2"]
+    # The shared transcript is reported by the source deduplicated last
+    matches = pd.read_csv(tmp_path / order[1] / "matches.csv")
+    assert matches[["source", "match"]].values.tolist() == [[order[0], "c0" if order[0] == "canal4" else "r0"]]
+
+
+def test_orphaned_duplicates_are_checked_again(tmp_path):
+    folder = str(tmp_path)
+    batch  = _c4([("short", TEXTS[1]), ("long", TEXTS[1] + " y otras palabras al final")])
+    assert dedup.deduplicate(batch, folder, "canal4")["url"].tolist() == ["long"]
+
+    # The canonical speech is gone: its duplicate is kept in its place
+    assert dedup.deduplicate(batch.iloc[:1], folder, "canal4")["url"].tolist() == ["short"]
+    # and is dropped again when the canonical speech comes back
+    assert dedup.deduplicate(batch, folder, "canal4")["url"].tolist() == ["long"]
+
+
+def test_index_is_saved_and_reopened(tmp_path):
+    index = dedup.DedupIndex()
+    index.add(["a", "b"], TEXTS[:2])
+    index.save(str(tmp_path / "index"))
+    opened = dedup.DedupIndex.open(str(tmp_path / "index"))
+    assert opened.records.equals(index.records)
+    assert opened.query([TEXTS[1]])["match"].tolist() == ["b"]
+    assert len(dedup.DedupIndex.open(str(tmp_path / "index"), threshold = 0.9).records) == 0
@@ -0,0 +1,97 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Link discovery tests
+Description:    The REST, sitemap and listing backends return the new links newest first and stop at the first
+                known link, and discover_links falls back to the next backend when one is not available.
+"""
+
+import json
+
+from speechdb import discovery
+from speechdb.fetch import FetchResult
+
+BASE  = discovery.BASE_URL
+POSTS = f"{BASE}/wp-json/wp/v2/posts?categories=7&per_page=100&_fields=link"
+
+
+class FakeFetcher:
+    """
+    Answers from a dictionary of URL: (status, text, headers), 404 for any other URL.
+    """
+
+    def __init__(self, pages):
+        self.pages     = pages
+        self.requested = []
+
+    def get(self, url, headers = None):
+        self.requested.append(url)
+        status, text, headers = self.pages.get(url, (404, "", {}))
+        return FetchResult(url, status, text, headers, 0.0, None)
+
+    def fetch_all(self, urls, headers_for = None):
+        return [self.get(url) for url in urls]
+
+
+def _posts(links):
+    return json.dumps([{"link": link} for link in links])
+
+
+def _sitemap(tag, locs):
+    entries = "".join(f"<{tag}><loc>{loc}</loc></{tag}>" for loc in locs)
+    root    = "sitemapindex" if tag == "sitemap" else "urlset"
+    return f'<?xml version="1.0"?><{root} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{root}>'
+
+
+def test_rest_backend_stops_at_known_links():
+    links   = [f"{BASE}/speech-{i}/" for i in range(9, 0, -1)]
+    fetcher = FakeFetcher({
+        f"{BASE}/wp-json/wp/v2/categories?slug=rosario-murillo&_fields=id": (200, '[{"id": 7}]', {}),
+        f"{POSTS}&page=1": (200, _posts(links[:3]), {"X-WP-TotalPages": "3"}),
+        f"{POSTS}&page=2": (200, _posts(links[3:6]), {}),
+        f"{POSTS}&page=3": (200, _posts(links[6:]), {})
+    })
+    assert discovery.discover_rest(fetcher, "romu", known = {links[4]}, batch = 1) == links[:4] + links[5:6]
+    # The first page, fetched for X-WP-TotalPages, is not requested again
+    assert fetcher.requested.count(f"{POSTS}&page=1") == 1
+    assert f"{POSTS}&page=3" not in fetcher.requested
+
+
+def test_rest_backend_errors():
+    category = f"{BASE}/wp-json/wp/v2/categories?slug=rosario-murillo&_fields=id"
+    assert discovery.discover_rest(FakeFetcher({}), "romu") is None
+    assert discovery.discover_rest(FakeFetcher({category: (200, '{"code": "rest_no_route"}', {})}), "romu") is None
+    assert discovery.discover_rest(FakeFetcher({category: (200, "<html>", {})}), "romu") is None
+
+
+def test_sitemap_backend_walks_newest_first():
+    children = [f"{BASE}/wp-sitemap-posts-post-{i}.xml" for i in (1, 2)]
+    fetcher  = FakeFetcher({
+        f"{BASE}/wp-sitemap.xml": (200, _sitemap("sitemap", children + [f"{BASE}/wp-sitemap-posts-page-1.xml"]), {}),
+        children[0]: (200, _sitemap("url", [f"{BASE}/mensaje-rosario-murillo-1/",
+                                            f"{BASE}/mensaje-rosario-murillo-2/"]), {}),
+        children[1]: (200, _sitemap("url", [f"{BASE}/mensaje-rosario-murillo-3/",
+                                            f"{BASE}/deportes/",
+                                            f"{BASE}/discurso-daniel-y-rosario-murillo/",
+                                            f"{BASE}/mensaje-rosario-murillo-4/"]), {})
+    })
+    assert discovery.discover_sitemap(fetcher, "romu", batch = 1) == [
+        f"{BASE}/mensaje-rosario-murillo-{i}/" for i in (4, 3, 2, 1)
+    ]
+    assert discovery.discover_sitemap(fetcher, "romu", known = {f"{BASE}/mensaje-rosario-murillo-2/"}, batch = 1) == [
+        f"{BASE}/mensaje-rosario-murillo-{i}/" for i in (4, 3)
+    ]
+    assert discovery.discover_sitemap(FakeFetcher({}), "romu") is None
+
+
+def test_listing_and_fallback():
+    listing = discovery.SOURCES["rmdo"]["listing"]
+    page    = """
+        <div class="tg-row"><div class="tg-col-control"><h3><a href="/discurso-1/">1</a></h3></div></div>
+        <div class="tg-row"><div class="tg-col-control"><h3><a href="/discurso-2/">2</a></h3></div></div>
+    """
+    assert discovery.parse_listing(page) == ["/discurso-1/", "/discurso-2/"]
+
+    # No REST API nor sitemaps: the listing pages are walked until the first empty page
+    fetcher = FakeFetcher({listing: (200, page, {})})
+    assert discovery.discover_links("rmdo", fetcher = fetcher) == ["/discurso-1/", "/discurso-2/"]
+    assert discovery.discover_links("rmdo", backends = ("rest", "sitemap"), fetcher = FakeFetcher({})) is None
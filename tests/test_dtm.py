@@ -0,0 +1,68 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Document-term matrix tests
+Description:    The document-term matrix counts the tokens of the token store, selects speakers and dates,
+                prunes low value terms and survives a save and open round trip.
+"""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from speechdb import dtm
+
+DOCS = [["paz", "amor", "paz"], ["amor", "patria"], ["paz", "patria", "patria", "victoria"]]
+META = pd.DataFrame({"speech_id"   : [0, 1, 2],
+                     "spoke_person": ["Daniel", "Rosario", "Rosario"],
+                     "date"        : pd.to_datetime(["2020-01-01", "2019-05-01", "2021-07-01"])})
+
+
+def test_counts_match_the_tokens(snap):
+    doc_term = dtm.load(snap)
+    tokens   = snap.tokens
+    assert len(doc_term) == len(tokens)
+    for i in [0, len(tokens) // 2, len(tokens) - 1]:
+        row = doc_term.matrix[i]
+        assert {doc_term.vocab[t]: n for t, n in zip(row.indices, row.data)} == Counter(tokens.doc(i))
+
+    counts = doc_term.counts("Daniel")
+    daniel = Counter(token for i in np.flatnonzero(tokens.docs["spoke_person"] == "Daniel") for token in tokens.doc(i))
+    assert {doc_term.vocab[t]: n for t, n in enumerate(counts) if n} == daniel
+
+
+def test_selections_and_round_trip(tmp_path):
+    doc_term = dtm.DTM.from_tokens(DOCS, META)
+    assert doc_term.frequencies(top = 2) == {"patria": 3, "paz": 3}
+    assert doc_term.frequencies("Rosario", start = "2021-01-01") == {"patria": 2, "paz": 1, "victoria": 1}
+    assert doc_term.document_frequencies()[doc_term.term_ids["paz"]] == 2
+
+    doc_term.save(str(tmp_path))
+    opened = dtm.DTM.open(str(tmp_path))
+    assert opened.vocab == doc_term.vocab
+    assert (opened.matrix != doc_term.matrix).nnz == 0
+    assert opened.docs["speech_id"].tolist() == [0, 1, 2]
+
+
+def test_prune_drops_low_value_terms():
+    doc_term = dtm.DTM.from_tokens(DOCS + [["paz", "amor", "patria", "victoria"]])
+    pruned   = doc_term.prune(low_value = None)
+    # No term is in every document, so nothing is dropped without a threshold
+    assert pruned.matrix.nnz == doc_term.matrix.nnz
+    top = doc_term.prune(low_value = None, top = 1)
+    assert np.diff(top.indptr).tolist() == [1, 1, 1, 1]
+    assert doc_term.prune(low_value = 1.0).matrix.nnz < doc_term.matrix.nnz
+
+
+def test_rows_are_ordered_by_speaker_and_date():
+    docs = META.iloc[[2, 0, 1]].reset_index(drop = True)
+    doc_term = dtm.DTM.from_tokens([DOCS[2], DOCS[0], DOCS[1]], docs)
+    # Speakers keep their first appearance, the rows of each speaker are sorted by date
+    assert doc_term.docs["speech_id"].tolist() == [1, 2, 0]
+    assert doc_term.rows("Rosario", start = "2021-01-01") == [(1, 2)]
+    assert doc_term.frequencies("Rosario", start = "2021-01-01") == {"patria": 2, "paz": 1, "victoria": 1}
+    assert doc_term.frequencies("Daniel") == {"paz": 2, "amor": 1}
+
+    with pytest.raises(ValueError):
+        dtm.DTM(doc_term.indptr, doc_term.indices, doc_term.data, doc_term.vocab, docs)
@@ -0,0 +1,75 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Data export tests
+Description:    Exports hold the selected speeches in every format, unknown speakers are rejected, and the
+                cache of filtered exports is kept within its limits without removing recently requested files.
+"""
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from speechdb import export
+
+
+@pytest.fixture
+def exporter(snap, tmp_path):
+    return export.Exporter(snap, folder = str(tmp_path / "exports"))
+
+
+def test_full_exports(snap, exporter):
+    paths = exporter.build_all()
+    assert set(paths) == set(export.FORMATS)
+    csv = pd.read_csv(paths["csv.gz"])
+    assert len(csv) == len(snap.speeches)
+    assert sorted(csv["url"]) == sorted(snap.speeches["url"])
+    assert len(pd.read_parquet(paths["parquet"])) == len(snap.speeches)
+    assert len(pd.read_json(paths["jsonl.gz"], lines = True)) == len(snap.speeches)
+
+
+def test_filtered_exports(snap, exporter):
+    path = exporter.path("csv.gz", speakers = ["Rosario"], start = "2018-01-01", end = "2019-12-31")
+    assert os.path.basename(path) == "speech_data_Rosario_2018-01-01_2019-12-31.csv.gz"
+
+    data     = pd.read_csv(path)
+    speeches = snap.speeches
+    expected = speeches.loc[(speeches["spoke_person"] == "Rosario")
+                            & speeches["date"].between("2018-01-01", "2019-12-31"), "url"]
+    assert sorted(data["url"]) == sorted(expected)
+
+    with pytest.raises(ValueError):
+        exporter.path("xlsx")
+    with pytest.raises(ValueError):
+        exporter.path("csv.gz", start = "not a date")
+
+    # "Rosario!" would be named speech_data_Rosario.csv.gz, the file of the speeches of Rosario
+    with pytest.raises(ValueError):
+        exporter.path("csv.gz", speakers = ["Rosario!"])
+    assert not os.path.exists(os.path.join(exporter.folder, "speech_data_Rosario.csv.gz"))
+
+
+def test_cache_limits_and_grace_period(snap, tmp_path):
+    def fill(exporter):
+        for year in range(2016, 2022):
+            exporter.path("csv.gz", start = f"{year}-01-01", end = f"{year}-12-31")
+            time.sleep(0.01)
+        return sorted(name for name in os.listdir(exporter.folder) if not name.startswith("speech_data.csv"))
+
+    kept = fill(export.Exporter(snap, folder = str(tmp_path / "count"), max_files = 2, grace = 0))
+    assert kept == ["speech_data_2020-01-01_2020-12-31.csv.gz", "speech_data_2021-01-01_2021-12-31.csv.gz"]
+
+    # Files requested within the grace period are never removed
+    assert len(fill(export.Exporter(snap, folder = str(tmp_path / "grace"), max_files = 2, grace = 600))) == 6
+
+    # The size limit keeps at least the export being returned
+    assert len(fill(export.Exporter(snap, folder = str(tmp_path / "bytes"), max_bytes = 1, grace = 0))) == 1
+
+
+def test_requests_refresh_cached_exports(snap, tmp_path):
+    exporter = export.Exporter(snap, folder = str(tmp_path), max_files = 1, grace = 0)
+    first    = exporter.path("csv.gz", start = "2016-01-01")
+    os.utime(first, (0, 0))
+    assert exporter.path("csv.gz", start = "2016-01-01") == first
+    assert os.path.getmtime(first) > 0
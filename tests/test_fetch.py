@@ -0,0 +1,68 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Fetch engine tests
+Description:    The token bucket spaces requests to its rate, every host keeps at most per_host requests in
+                flight, results come back in the order of the URLs with case-insensitive headers, and errors
+                are returned, not raised.
+"""
+
+import threading
+import time
+
+from local_server import LocalServer
+from speechdb.fetch import Fetcher, RateLimiter
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(20, burst = 2)
+    start   = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # Two requests of burst, then one every 1/20 s
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+    unlimited = RateLimiter(None)
+    start     = time.monotonic()
+    for _ in range(100):
+        unlimited.acquire()
+    assert time.monotonic() - start < 0.1
+
+
+def test_requests_in_flight_are_bounded_per_host():
+    in_flight, peaks = {}, {}
+    lock = threading.Lock()
+
+    class Response:
+        status_code = 200
+        content     = b"ok"
+        text        = "ok"
+        headers     = {}
+
+    def get(url, headers = None, timeout = None):
+        host = url.split("/")[2]
+        with lock:
+            in_flight[host] = in_flight.get(host, 0) + 1
+            peaks[host]     = max(peaks.get(host, 0), in_flight[host])
+        time.sleep(0.02)
+        with lock:
+            in_flight[host] -= 1
+        return Response()
+
+    urls = [f"https://{host}/{i}/" for i in range(12) for host in ("a.example", "b.example")]
+    with Fetcher(max_workers = 16, per_host = 3, rate = None) as fetcher:
+        fetcher.session.get = get
+        results = fetcher.fetch_all(urls)
+
+    assert [res.url for res in results] == urls
+    assert peaks == {"a.example": 3, "b.example": 3}
+
+
+def test_pages_and_errors():
+    with LocalServer([b"<html>uno</html>"], latency = 0) as server, Fetcher(rate = None, retries = 0) as fetcher:
+        urls    = [server.url(f"/page-{i}/") for i in range(5)] + ["http://127.0.0.1:9/refused/"]
+        results = fetcher.fetch_all(urls)
+
+    assert [res.url for res in results] == urls
+    assert all(res.status == 200 and res.text == "<html>uno</html>" for res in results[:-1])
+    assert results[0].headers["content-type"] == results[0].headers["Content-Type"] == "text/html; charset=UTF-8"
+    assert results[-1].status is None and results[-1].error
@@ -0,0 +1,37 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Raw HTML store tests
+Description:    Pages come back as they were stored, identical pages share a blob, every URL points to its
+                latest version and the store survives being reopened.
+"""
+
+import glob
+import os
+
+from speechdb.htmlstore import HtmlStore
+
+PAGE = "<html><body><p>Compañeros y compañeras, ¡buenas tardes!</p></body></html>"
+
+
+def test_pages_round_trip(tmp_path):
+    root = str(tmp_path / "store")
+    with HtmlStore(root) as store:
+        first = store.put("https://www.canal4.com.ni/a/", PAGE, source = "canal4")
+        assert store.put("https://www.canal4.com.ni/b/", PAGE, source = "canal4") == first
+        store.put("https://www.radionicaragua.com.ni/c/", "<html>c</html>", source = "radionicaragua")
+        assert len(glob.glob(os.path.join(root, "objects", "*", "*"))) == 2
+
+        store.put("https://www.canal4.com.ni/b/", "<html>b</html>", source = "canal4")
+        assert store.get("https://www.canal4.com.ni/b/") == "<html>b</html>"
+        assert store.get_blob(first) == PAGE
+        assert store.get("https://www.canal4.com.ni/missing/") is None
+
+    with HtmlStore(root) as store:
+        assert len(store) == 3
+        assert store.urls("canal4") == ["https://www.canal4.com.ni/a/", "https://www.canal4.com.ni/b/"]
+        assert store.get("https://www.canal4.com.ni/a/") == PAGE
+        assert store.missing(["https://www.canal4.com.ni/missing/", "https://www.canal4.com.ni/a/"]) == [
+            "https://www.canal4.com.ni/missing/"
+        ]
+        pages = store.iter_pages(urls = ["https://www.canal4.com.ni/missing/", "https://www.radionicaragua.com.ni/c/"])
+        assert list(pages) == [("https://www.radionicaragua.com.ni/c/", "<html>c</html>")]
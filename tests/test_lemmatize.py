@@ -0,0 +1,52 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Lemmatization tests
+Description:    Only the speeches missing from the cache go through the model, the cache is keyed by the
+                model version and the speaker stopwords are removed after the cache.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("spacy")
+
+from speechdb import lemmatize
+
+
+class FakeModel:
+    """
+    Stands in for a spaCy pipeline: every word is its own lemma, short words are stopwords.
+    """
+
+    def __init__(self, version = "3.7.0"):
+        self.meta = {"lang": "es", "name": "core_news_sm", "version": version}
+        self.seen = []
+
+    def pipe(self, texts, n_process = 1, batch_size = 64):
+        for text in texts:
+            self.seen.append(text)
+            yield [SimpleNamespace(lemma_ = word, is_stop = len(word) < 3, is_alpha = word.isalpha())
+                   for word in text.split()]
+
+
+def test_only_new_speeches_are_processed(tmp_path):
+    texts = ["Viva la Revolución", "El Pueblo Presidente 19", "Viva la Revolución"]
+    with lemmatize.LemmaCache(str(tmp_path / "lemmas.sqlite")) as cache:
+        model = FakeModel()
+        assert lemmatize.lemmatize(texts, model, cache = cache, batch_size = 1) == [
+            ["viva", "revolución"], ["pueblo", "presidente"], ["viva", "revolución"]
+        ]
+        assert model.seen == texts[:2]
+        assert len(cache) == 2
+
+        model = FakeModel()
+        assert lemmatize.lemmatize(texts + ["Nueva Nicaragua"], model, cache = cache, exclude = {"viva"}) == [
+            ["revolución"], ["pueblo", "presidente"], ["revolución"], ["nueva", "nicaragua"]
+        ]
+        assert model.seen == ["Nueva Nicaragua"]
+
+        # A new model version is a new cache key
+        model = FakeModel(version = "3.8.0")
+        lemmatize.lemmatize(texts, model, cache = cache)
+        assert model.seen == texts[:2]
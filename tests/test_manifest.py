@@ -0,0 +1,49 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Crawl manifest tests
+Description:    An interrupted crawl resumes from the manifest: finished URLs are not requested again,
+                failures are retried, finished records survive later failures and validators are read
+                whatever the case of the header names.
+"""
+
+from speechdb.manifest import CrawlManifest
+
+URLS = [f"https://www.canal4.com.ni/speech-{i}/" for i in range(5)]
+
+
+def test_crawl_resumes_where_it_stopped(tmp_path):
+    path = str(tmp_path / "manifest.sqlite")
+    with CrawlManifest(path) as manifest:
+        assert manifest.pending(URLS) == URLS
+        manifest.record_success(URLS[0], 200, {"ETag": '"a"'}, {"url": URLS[0], "content": "uno"})
+        manifest.record_success(URLS[1], 200, {}, {"url": URLS[1], "content": "dos"})
+        manifest.record_failure(URLS[2], 500, "Server error")
+
+    # A new run (new connection) only requests what is not finished
+    with CrawlManifest(path) as manifest:
+        assert manifest.pending(URLS) == URLS[2:]
+        assert manifest.pending(URLS, revalidate = True) == URLS
+        assert manifest.summary() == {"done": 2, "error": 1}
+        assert manifest.records(reversed(URLS)) == [{"url": URLS[1], "content": "dos"},
+                                                    {"url": URLS[0], "content": "uno"}]
+        assert manifest.conditional_headers(URLS[0]) == {"If-None-Match": '"a"'}
+        assert manifest.conditional_headers(URLS[2]) == {}
+
+
+def test_failures_do_not_overwrite_finished_records(tmp_path):
+    with CrawlManifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        manifest.record_success(URLS[0], 200, {}, {"url": URLS[0]})
+        manifest.record_failure(URLS[0], 503, "Unavailable")
+        manifest.record_not_modified(URLS[0])
+        entry = manifest.get(URLS[0])
+        assert entry["status"] == "done"
+        assert entry["http_status"] == 304
+        assert entry["record"] == {"url": URLS[0]}
+
+
+def test_validators_in_any_case(tmp_path):
+    with CrawlManifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        manifest.record_success(URLS[0], 200, {"etag": '"a"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"},
+                                {"url": URLS[0]})
+        assert manifest.conditional_headers(URLS[0]) == {"If-None-Match": '"a"',
+                                                         "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
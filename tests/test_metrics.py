@@ -0,0 +1,63 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Pipeline metrics tests
+Description:    The registry renders counters and cumulative histograms in the Prometheus text format, and
+                stages record their status, counts, rates and memory in the registry and in the JSON log.
+"""
+
+import json
+
+import pytest
+
+from speechdb import metrics
+
+
+def test_registry_renders_prometheus_text():
+    registry = metrics.Registry(buckets = (0.1, 1))
+    registry.inc("fetch_responses_total", host = "www.canal4.com.ni", status = 200)
+    registry.inc("fetch_responses_total", 2, host = "www.canal4.com.ni", status = 200)
+    registry.set("snapshot_speeches", 1750)
+    for value in (0.05, 0.5, 5):
+        registry.observe("fetch_seconds", value, host = "a")
+
+    lines = registry.render().splitlines()
+    assert 'speechdb_fetch_responses_total{host="www.canal4.com.ni",status="200"} 3' in lines
+    assert "speechdb_snapshot_speeches 1750" in lines
+    assert lines[-5:] == [
+        'speechdb_fetch_seconds_bucket{host="a",le="0.1"} 1',
+        'speechdb_fetch_seconds_bucket{host="a",le="1"} 2',
+        'speechdb_fetch_seconds_bucket{host="a",le="+Inf"} 3',
+        'speechdb_fetch_seconds_sum{host="a"} 5.55',
+        'speechdb_fetch_seconds_count{host="a"} 3'
+    ]
+
+
+def test_stages_are_logged(tmp_path, monkeypatch):
+    log = str(tmp_path / "metrics.jsonl")
+    monkeypatch.setattr(metrics, "LOG", log)
+
+    with metrics.stage("parse", source = "test") as stage:
+        stage.count(pages = 4)
+        stage.count(pages = 2)
+    with pytest.raises(KeyError):
+        with metrics.stage("parse", source = "broken"):
+            raise KeyError("url")
+
+    @metrics.timed("tokenize", counts = lambda docs: {"speeches": len(docs)})
+    def tokenize(texts):
+        return [text.split() for text in texts]
+
+    assert tokenize(["uno dos", "tres"]) == [["uno", "dos"], ["tres"]]
+
+    with open(log, encoding = "utf-8") as file:
+        entries = [json.loads(line) for line in file]
+    assert [(entry["stage"], entry.get("source"), entry["status"]) for entry in entries] == [
+        ("parse", "test", "ok"), ("parse", "broken", "KeyError"), ("tokenize", None, "ok")
+    ]
+    assert entries[0]["counts"] == {"pages": 6}
+    assert entries[2]["counts"] == {"speeches": 2}
+    assert set(entries[0]["rates"]) == {"pages_per_second"}
+    assert entries[0]["peak_rss"] > 0 and entries[0]["rss_delta"] >= 0
+
+    assert 'speechdb_stage_pages_total{source="test",stage="parse"} 6' in metrics.render().splitlines()
+    assert metrics.save() == str(tmp_path / "metrics.prom")
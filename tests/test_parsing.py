@@ -0,0 +1,41 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Parsing tests
+Description:    The lxml parsers return the same records as the original BeautifulSoup code on the recorded
+                pages, one page at a time and over a process pool.
+"""
+
+import pytest
+
+from local_server import load_fixtures
+from parse_throughput import REFERENCE
+from speechdb import parsing
+
+
+@pytest.mark.parametrize("source", sorted(REFERENCE))
+def test_parsers_match_the_original_code(source):
+    for i, page in enumerate(load_fixtures(source)):
+        url = f"https://example.org/{source}/{i}/"
+        assert parsing.PARSERS[source](page.decode("utf-8"), url) == REFERENCE[source](page.decode("utf-8"), url)
+
+
+@pytest.mark.parametrize("source", sorted(REFERENCE))
+def test_parse_batch_keeps_order_over_a_pool(source):
+    fixtures = load_fixtures(source)
+    pages    = [(f"https://example.org/{i}/", fixtures[i % len(fixtures)].decode("utf-8")) for i in range(12)]
+    expected = [REFERENCE[source](html, url) for url, html in pages]
+    assert parsing.parse_batch(pages, source, processes = 1) == expected
+    assert parsing.parse_batch(pages, source, processes = 2, chunksize = 2) == expected
+
+
+@pytest.mark.parametrize("source", sorted(REFERENCE))
+def test_unparseable_pages_are_left_out(source):
+    # A page without an article, an empty page and a page of blanks (lxml: "Document is empty")
+    pages = [(f"https://example.org/{i}/", html) for i, html in enumerate(["<html><body></body></html>", "", " \n "])]
+    for url, html in pages:
+        with pytest.raises(parsing.ParseError):
+            parsing.PARSERS[source](html, url)
+
+    page = load_fixtures(source)[0].decode("utf-8")
+    assert len(parsing.parse_batch(pages + [("https://example.org/ok/", page)], source, processes = 1)) == 1
+    assert len(parsing.parse_batch(pages + [("https://example.org/ok/", page)], source, processes = 2)) == 1
@@ -0,0 +1,36 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Preprocessing tests
+Description:    The pipeline lowercases the speeches before tokenizing them (unless asked to keep the case),
+                filters stopwords and non-alphabetic tokens, and gives the same documents over a process pool.
+"""
+
+from speechdb import preprocess
+
+TEXTS = ["Hola Nicaragua , 19 de Julio", "La Patria y la Revolución"]
+
+
+def test_pipeline_stages(monkeypatch):
+    calls = []
+    monkeypatch.setattr(preprocess, "word_tokenize", lambda text, language = "spanish": calls.append(text) or text.split())
+
+    assert list(preprocess.Pipeline(words = {"de", "la", "y"})(TEXTS)) == [["hola", "nicaragua", "julio"],
+                                                                          ["patria", "revolución"]]
+    # Texts are lowercased before tokenizing, as word_tokenize(speech.lower())
+    assert calls == [text.lower() for text in TEXTS]
+
+    assert list(preprocess.Pipeline(alpha = False, lower = False)(TEXTS[:1])) == [["Hola", "Nicaragua", ",", "19",
+                                                                                  "de", "Julio"]]
+
+
+def test_corpus_is_reiterable(whitespace_tokenizer):
+    corpus = preprocess.StreamedCorpus(TEXTS, preprocess.Pipeline())
+    assert list(corpus) == list(corpus) == [["hola", "nicaragua", "de", "julio"],
+                                            ["la", "patria", "y", "la", "revolución"]]
+
+
+def test_pool_gives_the_same_documents(whitespace_tokenizer):
+    texts    = [f"{text} {i}" for i in range(40) for text in TEXTS]
+    pipeline = preprocess.Pipeline(words = {"de", "la", "y"}, alpha = False)
+    assert list(pipeline.map(texts, processes = 2, chunksize = 3)) == list(pipeline(texts))
+    assert list(preprocess.StreamedCorpus(texts, pipeline, processes = 2)) == list(pipeline(texts))
@@ -0,0 +1,63 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Data publishing tests
+Description:    The derived artifacts built by publish are listed in the manifest of the snapshot, so a
+                downloaded snapshot comes with them and the app only opens them, while an artifact missing
+                from the snapshot is built on first use.
+"""
+
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from speechdb import dtm, export, publish, search, snapshot
+
+
+@pytest.fixture
+def served(tmp_path):
+    """
+    Serves tmp_path over HTTP, returns the base URL.
+    """
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    httpd  = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory = str(tmp_path)))
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_derived_artifacts_are_published(tmp_path, snap, served, monkeypatch):
+    publish.derive(snap)
+    files = snapshot.Snapshot(snap.path).manifest["files"]
+    assert {"speeches.parquet", "figures.json", f"exports/{export.export_name('csv.gz')}"} <= set(files)
+    assert {file.split("/")[0] for file in files} >= {"tokens", "search", "dtm", "sentiment"}
+    assert not os.path.exists(os.path.join(os.path.dirname(snap.path), ".lock"))
+
+    # A worker downloading the snapshot only opens the artifacts
+    root = str(tmp_path / "app")
+    assert snapshot.fetch_snapshot(served + "snapshot/", root) == snap.version
+    downloaded = snapshot.load(root)
+
+    def rebuild(snap):
+        raise AssertionError(f"Artifact rebuilt for {snap.version}")
+
+    word     = search.tokenize(snap.speeches["content"].iloc[0])[0]
+    expected = search.load(snap).search(word)
+    monkeypatch.setattr(search, "build", rebuild)
+    monkeypatch.setattr(dtm, "build", rebuild)
+    assert publish.open_artifact(downloaded, search.load).search(word) == expected
+    assert len(publish.open_artifact(downloaded, dtm.load)) == len(snap.tokens)
+
+
+def test_missing_artifacts_are_built_on_first_use(snap):
+    assert not snap.has(search.FOLDER)
+    index = publish.open_artifact(snap, search.load)
+    assert snap.has(search.FOLDER)
+    assert index.search(search.tokenize(snap.speeches["content"].iloc[0])[0])["nspeeches"] >= 1
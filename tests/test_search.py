@@ -0,0 +1,59 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Search tests
+Description:    Words, exact phrases, OR and exclusions return the speeches whose transcripts contain them,
+                with one hit per occurrence.
+"""
+
+from collections import Counter
+
+import pytest
+
+from speechdb import search
+
+
+@pytest.fixture
+def index(snap):
+    return search.load(snap)
+
+
+def _containing(speeches, word):
+    return {url for url, content in zip(speeches["url"], speeches["content"]) if word in search.tokenize(content)}
+
+
+def test_words_match_their_speeches(snap, index):
+    speeches = snap.speeches
+    words    = Counter(word for content in speeches["content"] for word in set(search.tokenize(content)))
+    rare     = min(words, key = lambda word: (words[word], word))
+
+    result = index.search(rare, page_size = 1000)
+    assert {row["url"] for row in result["results"]} == _containing(speeches, rare)
+    assert result["nhits"] == sum(search.tokenize(content).count(rare) for content in speeches["content"])
+    assert sum(result["speakers"].values()) == result["nhits"]
+    assert sum(row["hits"] for row in result["quarterly"]) == result["nhits"]
+
+
+def test_phrases_or_and_exclusions(snap, index):
+    speeches = snap.speeches
+    words    = search.tokenize(speeches["content"].iloc[0])
+    phrase   = " ".join(words[10:13])
+
+    found = {row["url"] for row in index.search(f'"{phrase}"', page_size = 1000)["results"]}
+    assert speeches["url"].iloc[0] in found
+    assert all(phrase in " ".join(search.tokenize(content))
+               for content in speeches.set_index("url").loc[sorted(found), "content"])
+
+    first, second = words[0], words[1]
+    either = {row["url"] for row in index.search(f"{first} OR {second}", page_size = 1000)["results"]}
+    assert either == _containing(speeches, first) | _containing(speeches, second)
+
+    without = {row["url"] for row in index.search(f"{first} -{second}", page_size = 1000)["results"]}
+    assert without == _containing(speeches, first) - _containing(speeches, second)
+
+
+def test_parse_groups_queries():
+    assert search.parse('uno "dos tres" OR cuatro NOT cinco') == [
+        [(False, "term", ("uno",))],
+        [(False, "phrase", ("dos", "tres")), (False, "term", ("cuatro",))],
+        [(True, "term", ("cinco",))]
+    ]
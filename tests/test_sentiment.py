@@ -0,0 +1,35 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Sentiment tests
+Description:    Scores reused from a previous data version stay attached to the same speeches when new
+                speeches shift the speech ids, and match a full scoring of the new version.
+"""
+
+import pandas as pd
+
+from conftest import prepend, write_version
+from speechdb import dtm, sentiment
+
+
+def test_reused_scores_follow_their_speeches(tmp_path, speeches):
+    old = write_version(str(tmp_path), speeches)
+    assert sentiment.build(old) == len(speeches)
+
+    new = write_version(str(tmp_path), prepend(speeches, 17))
+    assert sentiment.build(new) == 17
+
+    table, quarterly = sentiment.load(new)
+    full  = sentiment.score(dtm.load(new), sentiment.load_lexicon())
+    table = table.set_index("speech_id").sort_index()
+    full  = full.set_index("speech_id").sort_index()
+    pd.testing.assert_frame_equal(table[["spoke_person", "ntokens"] + sentiment.SCORES],
+                                  full[["spoke_person", "ntokens"] + sentiment.SCORES], check_dtype = False)
+    assert (table["key"] == new.speech_keys.reindex(table.index)).all()
+    assert quarterly["nspeeches"].sum() == len(speeches) + 17
+
+
+def test_edited_speeches_are_scored_again(tmp_path, speeches):
+    sentiment.build(write_version(str(tmp_path), speeches))
+    edited = speeches.copy()
+    edited.loc[3, "content"] += " cambio"
+    assert sentiment.build(write_version(str(tmp_path), edited)) == 1
@@ -0,0 +1,66 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Data snapshot tests
+Description:    Snapshot versions are named after their content, old versions are pruned, and a missing
+                snapshot is built by the fallback when the remote copy is not reachable.
+"""
+
+import os
+
+import pytest
+
+from conftest import write_version
+from speechdb import snapshot
+
+
+def test_versions_follow_the_content(tmp_path, speeches):
+    first = write_version(str(tmp_path), speeches)
+    again = write_version(str(tmp_path), speeches)
+    assert again.version == first.version
+
+    second = write_version(str(tmp_path), speeches.iloc[1:])
+    assert second.version != first.version
+    assert snapshot.load(str(tmp_path / "snapshot")).version == second.version
+    assert len(second.speeches) == len(speeches) - 1
+    assert "speeches.parquet" in second.manifest["files"]
+    assert any(file.startswith("tokens/") for file in second.manifest["files"])
+
+    third = write_version(str(tmp_path), speeches.iloc[2:])
+    assert sorted(snapshot._versions(str(tmp_path / "snapshot"))) == sorted([second.version, third.version])
+
+
+def test_missing_snapshot_is_built_by_the_fallback(tmp_path, speeches):
+    source = write_version(str(tmp_path / "source"), speeches)
+    root   = str(tmp_path / "app")
+    calls  = []
+
+    def fallback(folder):
+        calls.append(folder)
+        snapshot.build_snapshot(str(tmp_path / "source"), root = folder)
+
+    # Nothing listens on the discard port: the download fails and the fallback builds it
+    snap = snapshot.load(root, remote = "http://127.0.0.1:9/snapshot/", fallback = fallback)
+    assert calls == [root]
+    assert snap.version == source.version
+    assert not os.path.exists(os.path.join(root, ".lock"))
+
+    # Later boots are local
+    assert snapshot.load(root, remote = "http://127.0.0.1:9/snapshot/", fallback = fallback).version == snap.version
+    assert calls == [root]
+
+
+def test_missing_snapshot_without_remote_or_fallback(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        snapshot.load(str(tmp_path))
+
+
+def test_speech_keys_follow_url_and_text(tmp_path, speeches):
+    first  = write_version(str(tmp_path), speeches)
+    edited = speeches.copy()
+    edited.loc[0, "content"] += " cambio"
+    second = write_version(str(tmp_path), edited)
+
+    keys1, keys2 = first.speech_keys, second.speech_keys
+    assert keys1.is_unique
+    assert (keys1.drop(0) == keys2.drop(0)).all()
+    assert keys1[0] != keys2[0]
@@ -0,0 +1,42 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Speech index tests
+Description:    The aggregates of the speech index match those computed with pandas over the same selection.
+"""
+
+import pandas as pd
+import pytest
+
+from speechdb.speechindex import SpeechIndex
+
+
+@pytest.mark.parametrize("speakers, start, end", [
+    (None, None, None),
+    (["Rosario"], "2017-01-01", "2020-06-30"),
+    (["Daniel", "Rosario"], "2019-03-15", None),
+    (["Daniel"], "2030-01-01", None)
+])
+def test_aggregates_match_pandas(speeches, speakers, start, end):
+    data  = speeches.assign(date = pd.to_datetime(speeches["date"]))
+    index = SpeechIndex(data)
+    agg   = index.aggregate(speakers, start, end)
+
+    rows = data
+    if speakers is not None:
+        rows = rows.loc[rows["spoke_person"].isin(speakers)]
+    if start is not None:
+        rows = rows.loc[rows["date"] >= start]
+    if end is not None:
+        rows = rows.loc[rows["date"] <= end]
+
+    assert agg["nspeeches"] == len(rows)
+    if not len(rows):
+        assert agg["first_date"] is None and agg["speakers"] == {} and agg["quarterly"] == []
+        return
+    assert agg["first_date"] == str(rows["date"].min().date())
+    assert agg["last_date"] == str(rows["date"].max().date())
+    for speaker, group in rows.groupby("spoke_person"):
+        assert agg["speakers"][speaker]["count"] == len(group)
+        assert agg["speakers"][speaker]["mean_nwords"] == pytest.approx(group["nwords"].mean())
+    quarterly = rows.groupby([rows["date"].dt.to_period("Q").astype(str), "spoke_person"]).size()
+    assert {(row["quarter"], row["spoke_person"]): row["count"] for row in agg["quarterly"]} == quarterly.to_dict()
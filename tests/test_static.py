@@ -0,0 +1,47 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Static resources tests
+Description:    Files are served from their precompressed variant the client accepts, with long-lived cache
+                headers, and revalidations with the current ETag get a 304.
+"""
+
+import gzip
+
+from flask import Flask
+
+from speechdb import static
+
+PAGE = "<html><body>" + "LDAvis " * 2000 + "</body></html>"
+
+
+def test_precompressed_variants_are_served(tmp_path):
+    path  = tmp_path / "LDA_daniel.html"
+    cache = str(tmp_path / "cache")
+    path.write_text(PAGE, encoding = "utf-8")
+    assert "gzip" in static.precompress(str(path), cache)
+    # Variants are named after the content and never written next to the file
+    assert sorted(item.name for item in tmp_path.iterdir()) == ["LDA_daniel.html", "cache"]
+    assert all(name.startswith(f"LDA_daniel.{static.fingerprint(str(path))}.html")
+               for name in (item.name for item in (tmp_path / "cache").iterdir()))
+
+    app = Flask(__name__)
+    with app.test_request_context(headers = {"Accept-Encoding": "gzip;q=1, br;q=0"}):
+        response = static.send_static(str(path), cache = cache)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Type"] == "text/html; charset=utf-8"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert gzip.decompress(response.get_data()).decode("utf-8") == PAGE
+    etag = response.headers["ETag"]
+
+    with app.test_request_context():
+        response = static.send_static(str(path), cache = cache)
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data(as_text = True) == PAGE
+
+    with app.test_request_context(headers = {"If-None-Match": etag}):
+        assert static.send_static(str(path), cache = cache).status_code == 304
+
+    # A new version of the file gets a new ETag
+    path.write_text(PAGE + "\n", encoding = "utf-8")
+    with app.test_request_context(headers = {"If-None-Match": etag}):
+        assert static.send_static(str(path), cache = cache).status_code == 200
@@ -0,0 +1,38 @@
+"""
+Project:        Dictator's Speeches Database
+Module:         Topic model tests
+Description:    Topic mixtures reused from a previous data version stay attached to the same speeches when
+                new speeches shift the speech ids, and speeches whose text changed are inferred again.
+"""
+
+import pytest
+
+from conftest import prepend, write_version
+
+pytest.importorskip("gensim")
+
+from speechdb import topics
+
+GRID = {"num_topics": [3], "alpha": ["symmetric"], "passes": [1]}
+
+
+def test_reused_mixtures_follow_their_speeches(tmp_path, speeches):
+    old = write_version(str(tmp_path), speeches)
+    topics.build(old, speakers = (None,), grid = GRID, workers = 1)
+    before, _ = topics.load_table(old)
+
+    data = prepend(speeches, 17)
+    data.loc[17, "content"] += " cambio"
+    new  = write_version(str(tmp_path), data)
+    assert topics.update(new) == 18
+
+    after, terms = topics.load_table(new)
+    assert set(terms) == {"all"}
+    assert after["speech_id"].nunique() == len(data)
+    assert set(after["key"]) == set(new.speech_keys)
+
+    # Every reused mixture is attached to the same speech (same key), now 17 rows further
+    reused = after.merge(before, on = ["key", "topic"], suffixes = ("", "_old"))
+    assert reused["key"].nunique() == len(speeches) - 1
+    assert (reused["weight"] == reused["weight_old"]).all()
+    assert (reused["speech_id"] == reused["speech_id_old"] + 17).all()